@@ -0,0 +1,155 @@
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import partial
+from typing import Any, Callable, Dict, FrozenSet, Iterator, List, Optional, Tuple, Union
+from langchain.agents import AgentExecutor
+from langchain_core.agents import AgentAction, AgentFinish, AgentStep
+from langchain_core.callbacks import AsyncCallbackManagerForChainRun, CallbackManagerForChainRun
+from langchain_core.tools import BaseTool
+from pydantic import ValidationError
+from config import Config
+from main import RESPONSE_FIELDS, Response
+
+# Imported by main.build_agent_executor on first use: langchain.agents is the slowest import in the app
+
+_tool_executor: Optional[ThreadPoolExecutor] = None
+_tool_executor_lock = threading.Lock()
+
+def get_tool_executor() -> ThreadPoolExecutor:
+    """Shared thread pool for blocking tool calls, created on first use."""
+    global _tool_executor
+    if _tool_executor is None:
+        with _tool_executor_lock:
+            if _tool_executor is None:
+                _tool_executor = ThreadPoolExecutor(
+                    max_workers=Config.PARALLEL_TOOLS["max_workers"],
+                    thread_name_prefix="agent-tool"
+                )
+    return _tool_executor
+
+class _PendingStep:
+    """A tool call deferred by _perform_agent_action until the whole model turn can run together."""
+
+    __slots__ = ("action", "run")
+
+    def __init__(self, action: AgentAction, run: Callable[[], AgentStep]):
+        self.action = action
+        self.run = run
+
+class CRMAgentExecutor(AgentExecutor):
+    """
+    AgentExecutor with two shortcuts:
+
+    - Return direct: the run ends as soon as a single tool call returns a complete Response dict,
+      instead of spending another model round trip to re-emit it as JSON. Only tools in
+      `direct_tools` qualify; research tools (web_search, wikipedia) usually feed a later step.
+    - Parallel tools: when one model turn asks for several tools, `blocking_tools` run on a thread
+      pool while the pure CPU tools run inline, so wall time is the slowest call rather than the sum.
+      Observations are merged back in the original order. A timed-out or (with several calls)
+      failing tool becomes an error observation so the other results still reach the model.
+      A timed-out thread cannot be interrupted; it finishes in the background.
+    """
+
+    direct_tools: FrozenSet[str] = frozenset()
+    parallel_tools: bool = True
+    blocking_tools: FrozenSet[str] = frozenset()
+    tool_timeouts: Dict[str, float] = {}
+    default_tool_timeout: float = 30.0
+
+    def _timeout_for(self, tool_name: str) -> float:
+        return self.tool_timeouts.get(tool_name, self.default_tool_timeout)
+
+    def _perform_agent_action(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        agent_action: AgentAction,
+        run_manager: Optional[CallbackManagerForChainRun] = None
+    ) -> Any:
+        run = partial(super()._perform_agent_action, name_to_tool_map, color_mapping, agent_action, run_manager)
+        return _PendingStep(agent_action, run)
+
+    def _iter_next_step(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        inputs: Dict[str, str],
+        intermediate_steps: List[Tuple[AgentAction, str]],
+        run_manager: Optional[CallbackManagerForChainRun] = None
+    ) -> Iterator[Union[AgentFinish, AgentAction, AgentStep]]:
+        pending: List[_PendingStep] = []
+        for item in super()._iter_next_step(name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager):
+            if isinstance(item, _PendingStep):
+                pending.append(item)
+            else:
+                yield item
+        yield from self._run_tool_calls(pending)
+
+    def _failed_step(self, action: AgentAction, reason: str) -> AgentStep:
+        return AgentStep(action=action, observation=f"Error: tool '{action.tool}' {reason}")
+
+    def _run_tool_calls(self, pending: List[_PendingStep]) -> List[AgentStep]:
+        if not self.parallel_tools:
+            return [step.run() for step in pending]
+
+        tolerate_errors = len(pending) > 1
+        started = time.monotonic()
+        futures: Dict[int, Future] = {
+            i: get_tool_executor().submit(contextvars.copy_context().run, step.run)
+            for i, step in enumerate(pending) if step.action.tool in self.blocking_tools
+        }
+        results: Dict[int, AgentStep] = {}
+        for i, step in enumerate(pending):
+            if i in futures:
+                continue
+            try:
+                results[i] = step.run()
+            except Exception as e:
+                if not tolerate_errors:
+                    raise
+                results[i] = self._failed_step(step.action, f"failed: {e}")
+        for i, future in futures.items():
+            action = pending[i].action
+            timeout = self._timeout_for(action.tool)
+            try:
+                results[i] = future.result(timeout=max(0.0, started + timeout - time.monotonic()))
+            except FutureTimeoutError:
+                future.cancel()
+                results[i] = self._failed_step(action, f"timed out after {timeout:g} seconds")
+            except Exception as e:
+                if not tolerate_errors:
+                    raise
+                results[i] = self._failed_step(action, f"failed: {e}")
+        return [results[i] for i in range(len(pending))]
+
+    async def _aperform_agent_action(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        agent_action: AgentAction,
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None
+    ) -> AgentStep:
+        # The async executor already gathers tool calls concurrently; add the per-tool timeout
+        timeout = self._timeout_for(agent_action.tool)
+        try:
+            return await asyncio.wait_for(
+                super()._aperform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager),
+                timeout
+            )
+        except asyncio.TimeoutError:
+            return self._failed_step(agent_action, f"timed out after {timeout:g} seconds")
+
+    def _get_tool_return(self, next_step_output: Tuple[AgentAction, Any]) -> Optional[AgentFinish]:
+        agent_action, observation = next_step_output
+        if agent_action.tool in self.direct_tools and isinstance(observation, dict):
+            if all(field in observation for field in RESPONSE_FIELDS):
+                try:
+                    response = Response.model_validate({field: observation[field] for field in RESPONSE_FIELDS})
+                except ValidationError:
+                    response = None
+                if response is not None:
+                    return AgentFinish({"output": response.model_dump_json()}, "")
+        return super()._get_tool_return(next_step_output)
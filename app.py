@@ -1,30 +1,108 @@
-from flask import Flask, request, jsonify, send_from_directory
-from main import agent, tools, parser  # Import your agent setup
-
-from langchain.agents import AgentExecutor
+import json
+import queue
+from flask import Flask, Response as HTTPResponse, request, jsonify, send_from_directory, stream_with_context
+from main import parse_agent_output, Response, AgentExecutorPool, build_conversation_memory, start_warmup  # Import your agent setup
+from router import route_request, FAST_PATH, AGENT_PATH
+from batch import CACHE_PATH, run_batch
+from config import Config
+from cache import ResponseCache
+from compiled_config import start_config_watcher
+from followup_scheduler import start_followup_worker
+from tracing import trace_request, render_metrics, METRICS_CONTENT_TYPE
 
 app = Flask(__name__)
 
+# Built once at startup and shared by all request threads; agent executors are built on first use
+start_config_watcher()
+start_followup_worker()
+start_warmup()
+executor_pool = AgentExecutorPool(size=Config.AGENT_POOL_SIZE)
+response_cache = ResponseCache()
+conversation_memory = build_conversation_memory()
+
+def answer_with_agent(query, chat_history=()):
+    """Answer through the response cache or the agent pool. Returns (Response, route)."""
+    # Follow-up questions depend on the conversation, so only stateless turns use the cache
+    cached = response_cache.get(query) if not chat_history else None
+    if cached is not None:
+        return Response(**cached), CACHE_PATH
+    raw_response = executor_pool.invoke({"query": query, "chat_history": list(chat_history)})
+    structured_response = parse_agent_output(raw_response.get("output", ""))
+    if not chat_history:
+        response_cache.set(query, structured_response.model_dump())
+    return structured_response, AGENT_PATH
+
 @app.route('/api/ask', methods=['POST'])
 def ask():
     data = request.json
     query = data.get('message', '')
-    agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=False)
-    raw_response = agent_executor.invoke({"query": query})
+    session_id = data.get('session_id')
 
-    output_str = raw_response.get("output", "")
-    if output_str.startswith("```"):
-        output_str = output_str.strip("`")
-        if output_str.startswith("json"):
-            output_str = output_str[4:].strip()
-    structured_response = parser.parse(output_str)
+    with trace_request() as trace:
+        chat_history = conversation_memory.history(session_id)
+        # Structured CRM requests are answered by the tool directly, skipping the LLM
+        route = route_request(query)
+        route_path = route["path"]
+        if route_path == FAST_PATH:
+            structured_response = Response(**route["response"])
+        else:
+            try:
+                structured_response, route_path = answer_with_agent(query, chat_history)
+            except queue.Empty:
+                # Every agent executor stayed busy for Config.AGENT_POOL_TIMEOUT seconds
+                trace.route = "busy"
+                return jsonify({"error": "Server is at capacity, please retry"}), 503
+        conversation_memory.append(session_id, query, structured_response.summary)
+        trace.route = route_path
 
     # Return as JSON for your frontend
-    return jsonify({
+    payload = {
         "topic": structured_response.topic,
         "summary": structured_response.summary,
-        "tools_used": structured_response.tools_used
-    })
+        "tools_used": structured_response.tools_used,
+        "route": route_path
+    }
+    timings = trace.timings()
+    if timings is not None and data.get('include_timings', Config.TRACING["include_timings"]):
+        payload["timings"] = timings
+    return jsonify(payload)
+
+@app.route('/api/ask/batch', methods=['POST'])
+def ask_batch():
+    """
+    Answer many messages or structured payloads in one call.
+    Body: {"items": [...], "concurrency": n}. Streams one NDJSON line per item as it completes
+    ({"index", "status", ...}), then a final {"status": "done", ...} summary line.
+    """
+    data = request.json or {}
+    items = data.get('items')
+    settings = Config.BATCH
+    if not isinstance(items, list):
+        return jsonify({"error": "'items' must be a list of messages or payloads"}), 400
+    if len(items) > settings["max_items"]:
+        return jsonify({"error": f"A batch can contain at most {settings['max_items']} items"}), 400
+    try:
+        concurrency = int(data.get('concurrency', settings["max_concurrency"]))
+    except (TypeError, ValueError):
+        concurrency = 0
+    if concurrency < 1:
+        return jsonify({"error": "'concurrency' must be a positive integer"}), 400
+    concurrency = min(concurrency, settings["max_concurrency"])
+
+    def answer(query):
+        structured_response, route_path = answer_with_agent(query)
+        return structured_response.model_dump(), route_path
+
+    lines = (json.dumps(result) + "\n" for result in run_batch(items, answer, concurrency))
+    return HTTPResponse(stream_with_context(lines), mimetype='application/x-ndjson')
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(response_cache.stats())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return HTTPResponse(render_metrics(), content_type=METRICS_CONTENT_TYPE)
 
 @app.route('/')
 def index():
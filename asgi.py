@@ -0,0 +1,199 @@
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+from langchain_core.messages import BaseMessage
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+from main import parse_agent_output, Response, build_agent_executor, build_conversation_memory, start_warmup
+from router import route_request, FAST_PATH
+from cache import ResponseCache
+from config import Config
+from compiled_config import start_config_watcher
+from followup_scheduler import start_followup_worker
+from tracing import trace_request, render_metrics, run_config, span, METRICS_CONTENT_TYPE
+
+# Async serving mode: run with `python asgi.py` (or `uvicorn asgi:app`).
+# The agent runs through ainvoke/astream, so a slow model call only holds a coroutine, not a thread.
+
+settings = Config.ASYNC_SERVER
+
+start_config_watcher()
+start_followup_worker()
+start_warmup()
+response_cache = ResponseCache()
+conversation_memory = build_conversation_memory()
+request_slots = asyncio.Semaphore(settings["max_concurrency"])
+_agent_executor = None
+
+def get_agent_executor():
+    """AgentExecutor keeps no per-call state, so one instance, built on first use, serves every in-flight request."""
+    global _agent_executor
+    if _agent_executor is None:
+        _agent_executor = build_agent_executor()
+    return _agent_executor
+
+def _payload(structured_response: Response, route_path: str, timings: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    payload = {
+        "topic": structured_response.topic,
+        "summary": structured_response.summary,
+        "tools_used": structured_response.tools_used,
+        "route": route_path
+    }
+    if timings is not None:
+        payload["timings"] = timings
+    return payload
+
+def _wants_timings(data: Dict[str, Any]) -> bool:
+    return data.get("include_timings", Config.TRACING["include_timings"])
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _observation_text(observation: Any) -> str:
+    if isinstance(observation, dict) and "summary" in observation:
+        return str(observation["summary"])
+    return str(observation)
+
+def _answer_without_agent(query: str, chat_history: List[BaseMessage]):
+    """
+    Return (Response, route) from the fast path or the cache, or (None, 'agent'). Direct tools
+    may query the CRM store or API, render documents or schedule follow-ups, so callers run this
+    in a worker thread.
+    """
+    route = route_request(query)
+    if route["path"] == FAST_PATH:
+        return Response(**route["response"]), FAST_PATH
+    # Follow-up questions depend on the conversation, so only stateless turns use the cache
+    cached = response_cache.get(query) if not chat_history else None
+    if cached is not None:
+        return Response(**cached), "cache"
+    return None, route["path"]
+
+def _remember(query: str, chat_history: List[BaseMessage], structured_response: Response) -> None:
+    if not chat_history:
+        response_cache.set(query, structured_response.model_dump())
+
+# Conversation memory and the response cache may touch SQLite, embed the query or summarize
+# older turns with the model, so they run in a worker thread instead of on the event loop
+
+async def _history(session_id: Optional[str]) -> List[BaseMessage]:
+    return await asyncio.to_thread(conversation_memory.history, session_id)
+
+async def _append_turn(session_id: Optional[str], query: str, structured_response: Response) -> None:
+    await asyncio.to_thread(conversation_memory.append, session_id, query, structured_response.summary)
+
+async def _run_agent(query: str, chat_history: List[BaseMessage]) -> Response:
+    async with request_slots:
+        with span("agent", "executor"):
+            raw_response = await get_agent_executor().ainvoke({"query": query, "chat_history": chat_history}, config=run_config())
+    structured_response = parse_agent_output(raw_response.get("output", ""))
+    await asyncio.to_thread(_remember, query, chat_history, structured_response)
+    return structured_response
+
+async def ask(request: Request) -> JSONResponse:
+    data = await request.json()
+    query = data.get("message", "")
+    session_id = data.get("session_id")
+
+    with trace_request() as trace:
+        chat_history = await _history(session_id)
+        structured_response, route_path = await asyncio.to_thread(_answer_without_agent, query, chat_history)
+        if structured_response is None:
+            try:
+                structured_response = await asyncio.wait_for(_run_agent(query, chat_history), settings["request_timeout"])
+            except asyncio.TimeoutError:
+                trace.route = "timeout"
+                return JSONResponse({"error": f"Request timed out after {settings['request_timeout']} seconds"}, status_code=504)
+        await _append_turn(session_id, query, structured_response)
+        trace.route = route_path
+    timings = trace.timings() if _wants_timings(data) else None
+    return JSONResponse(_payload(structured_response, route_path, timings))
+
+async def _stream_events(query: str, session_id: Optional[str], include_timings: bool) -> AsyncIterator[str]:
+    with trace_request() as trace:
+        async for event in _stream_agent(query, session_id, trace, include_timings):
+            yield event
+
+async def _stream_agent(query: str, session_id: Optional[str], trace: Any, include_timings: bool) -> AsyncIterator[str]:
+    chat_history = await _history(session_id)
+    structured_response, route_path = await asyncio.to_thread(_answer_without_agent, query, chat_history)
+    yield _sse("route", {"path": route_path})
+    if structured_response is not None:
+        await _append_turn(session_id, query, structured_response)
+        trace.route = route_path
+        yield _sse("final", _payload(structured_response, route_path, trace.timings() if include_timings else None))
+        return
+
+    deadline = time.monotonic() + settings["request_timeout"]
+    try:
+        await asyncio.wait_for(request_slots.acquire(), settings["request_timeout"])
+    except asyncio.TimeoutError:
+        yield _sse("error", {"error": "Server is at capacity, please retry"})
+        return
+    try:
+        output = None
+        chunks = get_agent_executor().astream({"query": query, "chat_history": chat_history}, config=run_config()).__aiter__()
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), remaining)
+            except StopAsyncIteration:
+                break
+            for action in chunk.get("actions", []):
+                yield _sse("tool_start", {"tool": action.tool, "input": action.tool_input})
+            for step in chunk.get("steps", []):
+                yield _sse("tool_end", {"tool": step.action.tool, "output": _observation_text(step.observation)})
+            if "output" in chunk:
+                output = chunk["output"]
+    except asyncio.TimeoutError:
+        yield _sse("error", {"error": f"Request timed out after {settings['request_timeout']} seconds"})
+        return
+    except Exception as e:
+        yield _sse("error", {"error": str(e)})
+        return
+    finally:
+        request_slots.release()
+
+    try:
+        structured_response = parse_agent_output(output or "")
+    except Exception as e:
+        yield _sse("error", {"error": f"Could not parse the assistant response: {e}"})
+        return
+    await asyncio.to_thread(_remember, query, chat_history, structured_response)
+    await _append_turn(session_id, query, structured_response)
+    trace.route = route_path
+    yield _sse("final", _payload(structured_response, route_path, trace.timings() if include_timings else None))
+
+async def ask_stream(request: Request) -> StreamingResponse:
+    data = await request.json()
+    return StreamingResponse(
+        _stream_events(data.get("message", ""), data.get("session_id"), _wants_timings(data)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def cache_stats(request: Request) -> JSONResponse:
+    return JSONResponse(response_cache.stats())
+
+async def metrics(request: Request) -> PlainTextResponse:
+    return PlainTextResponse(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+async def index(request: Request) -> FileResponse:
+    return FileResponse("index.html")
+
+app = Starlette(routes=[
+    Route("/api/ask", ask, methods=["POST"]),
+    Route("/api/ask/stream", ask_stream, methods=["POST"]),
+    Route("/api/cache/stats", cache_stats, methods=["GET"]),
+    Route("/metrics", metrics, methods=["GET"]),
+    Route("/", index)
+])
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host=settings["host"], port=settings["port"])
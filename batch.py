@@ -0,0 +1,131 @@
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from llm_scheduler import BATCH, llm_priority
+from router import DIRECT_TOOLS, FAST_PATH, AGENT_PATH, match_direct_tool
+from tools import lead_qualifier_bulk
+
+# Tools with a vectorized implementation; the rest of DIRECT_TOOLS run per item, still without the LLM
+BULK_TOOLS: Dict[str, Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]] = {
+    "lead_qualifier": lead_qualifier_bulk
+}
+
+# Route reported for answers served from the response cache instead of the agent
+CACHE_PATH = "cache"
+
+# (Response dict, route) for one query answered by the agent (or the response cache)
+AgentAnswer = Callable[[str], Tuple[Dict[str, Any], str]]
+
+def item_message(item: Any) -> str:
+    """Turn a batch item (a message, {"message": ...}, or a structured tool payload) into a query string."""
+    if isinstance(item, str):
+        return item
+    if isinstance(item, dict):
+        if isinstance(item.get("message"), str):
+            return item["message"]
+        return json.dumps(item, sort_keys=True)
+    raise ValueError(f"Batch items must be strings or objects, got {type(item).__name__}")
+
+def _ok(response: Dict[str, Any], route: str) -> Dict[str, Any]:
+    return {
+        "status": "ok",
+        "route": route,
+        "topic": response["topic"],
+        "summary": response["summary"],
+        "tools_used": response["tools_used"]
+    }
+
+def _error(message: str) -> Dict[str, Any]:
+    return {"status": "error", "error": message}
+
+def _run_direct_group(tool_name: str, inputs: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+    """Run one tool over many inputs; None marks an input the tool rejected."""
+    bulk = BULK_TOOLS.get(tool_name)
+    if bulk is not None:
+        try:
+            return bulk(inputs)
+        except Exception:
+            pass  # One bad input fails the vectorized pass; retry item by item below
+    outputs: List[Optional[Dict[str, Any]]] = []
+    for tool_input in inputs:
+        try:
+            outputs.append(DIRECT_TOOLS[tool_name](tool_input))
+        except Exception:
+            outputs.append(None)
+    return outputs
+
+def run_batch(items: List[Any], answer_with_agent: AgentAnswer, concurrency: int) -> Iterator[Dict[str, Any]]:
+    """
+    Answer many requests, yielding one result per item as it completes (with its `index`).
+    Identical items are processed once. Items that resolve to a pure tool are grouped per tool and run
+    in bulk without the LLM; the rest go to `answer_with_agent` on at most `concurrency` threads,
+    which start first so they overlap with the bulk work. Ends with a summary record.
+    """
+    groups: Dict[str, List[int]] = {}
+    for index, item in enumerate(items):
+        try:
+            message = item_message(item)
+        except ValueError as e:
+            yield {"index": index, **_error(str(e))}
+            continue
+        groups.setdefault(message, []).append(index)
+
+    direct: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+    agent_messages: List[str] = []
+    for message in groups:
+        tool_name, tool_input, _ = match_direct_tool(message)
+        if tool_input is not None:
+            direct.setdefault(tool_name, []).append((message, tool_input))
+        else:
+            agent_messages.append(message)
+
+    # fast_path, cache and agent count unique messages answered each way; errors counts items
+    counts = {
+        "items": len(items),
+        "unique": len(groups),
+        FAST_PATH: 0,
+        CACHE_PATH: 0,
+        AGENT_PATH: 0,
+        "errors": len(items) - sum(map(len, groups.values()))
+    }
+
+    def emit(message: str, result: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        indices = groups[message]
+        if result["status"] == "error":
+            counts["errors"] += len(indices)
+        for n, index in enumerate(indices):
+            yield {"index": index, **result, **({"deduplicated": True} if n else {})}
+
+    def agent_result(message: str) -> Dict[str, Any]:
+        try:
+            # Batch items queue behind interactive requests for the model's rate limit
+            with llm_priority(BATCH):
+                response, route = answer_with_agent(message)
+        except Exception as e:
+            return _error(str(e))
+        return _ok(response, route)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch")
+    try:
+        futures = {executor.submit(agent_result, message): message for message in agent_messages}
+
+        for tool_name, calls in direct.items():
+            outputs = _run_direct_group(tool_name, [tool_input for _, tool_input in calls])
+            for (message, _), output in zip(calls, outputs):
+                if output is None:
+                    # Rejected by the tool: let the agent interpret it, like /api/ask does
+                    futures[executor.submit(agent_result, message)] = message
+                    continue
+                counts[FAST_PATH] += 1
+                yield from emit(message, _ok(output, FAST_PATH))
+
+        for future in as_completed(futures):
+            result = future.result()
+            if result["status"] == "ok":
+                counts[CACHE_PATH if result["route"] == CACHE_PATH else AGENT_PATH] += 1
+            yield from emit(futures[future], result)
+    finally:
+        # Stop queued agent work if the client goes away mid-stream
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    yield {"status": "done", **counts}
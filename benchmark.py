@@ -0,0 +1,384 @@
+"""
+Offline benchmark suite. Runs without network access or a Gemini key by swapping the
+chat model for fake_llm.FakeChatModel and stubbing the search backends.
+
+    python benchmark.py --latency 0.05 --concurrency 16 --requests 200 --output bench.json
+
+Reports throughput and p50/p95/p99 latency for every tool, the agent output
+parsing, and POST /api/ask under concurrent load, plus cold import times, as JSON.
+
+    python benchmark.py --suites imports --check
+
+fails (exit status 1) when an import exceeds IMPORT_BUDGETS_MS or loads a deferred module.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+# The Gemini client validates its key at import; it is never called here
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+# The benchmarks swap in their own agent, so don't build the Gemini one in the background
+os.environ.setdefault("AGENT_WARMUP", "off")
+os.environ.setdefault("FOLLOWUP_WORKER_ENABLED", "false")
+
+import numpy as np
+from fake_llm import FakeChatModel
+
+def summarize(latencies: List[float], wall_time: float, errors: int = 0) -> Dict[str, Any]:
+    """Throughput and latency percentiles (ms) for one benchmark case."""
+    samples = np.asarray(latencies, dtype=np.float64) * 1000
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "wall_time_s": round(wall_time, 4),
+        "throughput_per_s": round(len(latencies) / wall_time, 2) if wall_time else None,
+        "mean_ms": round(float(samples.mean()), 4),
+        "p50_ms": round(float(np.percentile(samples, 50)), 4),
+        "p95_ms": round(float(np.percentile(samples, 95)), 4),
+        "p99_ms": round(float(np.percentile(samples, 99)), 4),
+        "max_ms": round(float(samples.max()), 4)
+    }
+
+def measure(fn: Callable[[], Any], iterations: int, warmup: int = 5) -> Dict[str, Any]:
+    """Call `fn` sequentially and time each call."""
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - start)
+
+def measure_concurrent(fn: Callable[[int], Any], requests: int, concurrency: int) -> Dict[str, Any]:
+    """Call `fn(i)` for i in range(requests) from `concurrency` threads; failed calls count as errors."""
+    def timed(i: int) -> Optional[float]:
+        t0 = time.perf_counter()
+        try:
+            fn(i)
+        except Exception:
+            return None
+        return time.perf_counter() - t0
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed, range(requests)))
+    wall_time = time.perf_counter() - start
+    latencies = [r for r in results if r is not None]
+    if not latencies:
+        return {"count": 0, "errors": requests, "wall_time_s": round(wall_time, 4)}
+    return summarize(latencies, wall_time, errors=requests - len(latencies))
+
+# --- Tools ---
+
+def bench_tools(iterations: int, workdir: str) -> Dict[str, Any]:
+    import tools
+
+    # Stubs so the search tools measure formatting and caching, not the network
+    tools.SEARCH_BACKENDS["web_search"] = lambda query: f"Result snippet for {query}. " * 20
+    tools.SEARCH_BACKENDS["wikipedia"] = lambda query: f"Page: {query}\nSummary: " + "lorem ipsum " * 50
+    # Follow-ups are journaled; keep the benchmark's out of the real schedule
+    tools.Config.FOLLOWUP_SCHEDULER["path"] = os.path.join(workdir, "followups.db")
+    deals = [
+        {
+            "deal_id": i,
+            "stage": ("qualified", "proposal_sent", "negotiation")[i % 3],
+            "value": 1000 * (i % 97),
+            "inactive_days": i % 30,
+            "price_sensitivity": (i % 10) / 10,
+            "competitor_mentioned": i % 4 == 0,
+            "response_delay": i % 9
+        }
+        for i in range(1000)
+    ]
+    cases = {
+        "web_search": lambda: tools.search_summary("crane rental rates"),
+        "wikipedia": lambda: tools.wiki_summary("Tower crane"),
+        "save_text_to_file": lambda: tools.save_to_txt("benchmark record", os.path.join(workdir, "bench_output.txt")),
+        "lead_qualifier": lambda: tools.lead_qualifier_tool({"deal_size": 75000, "urgency": "high", "past_behavior": "positive"}),
+        "followup": lambda: tools.followup_tool({"lead_context": {"name": "Alex"}, "last_interaction": "site visit"}),
+        "quotation": lambda: tools.quotation_tool({"base_price": 50000, "urgency": "high", "customer_type": "vip"}),
+        "pipeline_manager": lambda: tools.pipeline_manager_tool({"stage": "negotiation", "inactive_days": 20, "competitor_mentioned": True}),
+        "pipeline_scanner_1k": lambda: tools.pipeline_scanner_tool({"source": deals}),
+        "sales_coach": lambda: tools.sales_coach_tool("We lost the deal on price")
+    }
+    results = {name: measure(fn, iterations) for name, fn in cases.items()}
+    for writer in tools._output_writers(os.path.join(workdir, "bench_output.txt")):
+        writer.flush()
+    return results
+
+# --- Output Post-processing ---
+
+SAMPLE_OUTPUTS = {
+    "fenced_json": '```json\n{"topic": "Quotation", "summary": "### Quotation\\n**Total:** $55,000", "source": [], "tools_used": ["quotation"]}\n```',
+    "plain_json": '{"topic": "Quotation", "summary": "### Quotation\\n**Total:** $55,000", "source": [], "tools_used": ["quotation"]}',
+    "single_quoted": "{'topic': 'Coaching', 'summary': 'Lead with value, don't discount', 'source': [], 'tools_used': ['sales_coach']}",
+    "missing_fields": '{"summary": "Follow up tomorrow"}',
+    "prose_prefixed": 'Here is the answer:\n{"topic": "Pipeline", "summary": "Deal is at risk", "tools_used": ["pipeline_manager"],}',
+    "truncated": '```json\n{"topic": "Lead", "summary": "### Lead Qualification Results\n**Score:** 82',
+    "plain_text": "I could not find anything about that customer."
+}
+
+def bench_postprocessing(iterations: int) -> Dict[str, Any]:
+    from main import parse_agent_output
+
+    return {name: measure(lambda: parse_agent_output(sample), iterations) for name, sample in SAMPLE_OUTPUTS.items()}
+
+# --- Tool Selection ---
+
+# Representative queries and the tool each needs (None: too vague to narrow, so every tool is bound)
+TOOL_SELECTION_QUERIES = [
+    ("Prepare a quotation for customer abc", "quotation"),
+    ("How much would a 50 ton crane rental cost for a vip with high urgency?", "quotation"),
+    ("Qualify this lead: deal size 75000, high urgency, positive behavior", "lead_qualifier"),
+    ("Which of Sam's leads should I call first?", "lead_qualifier"),
+    ("Write a follow-up email to Alex after the site visit", "followup"),
+    ("Remind John about the quotation we sent", "followup"),
+    ("The deal with Acme is stuck in negotiation for 20 days and they mentioned a competitor", "pipeline_manager"),
+    ("Scan the whole pipeline and show the riskiest deals", "pipeline_scanner"),
+    ("Why are we losing deals on price? Any coaching tips?", "sales_coach"),
+    ("What's our win rate over the last 90 days?", "sales_coach"),
+    ("Search the web for current crane rental rates in Texas", "web_search"),
+    ("Tell me about the history of tower cranes from wikipedia", "wikipedia"),
+    ("Research Liebherr and save the findings to a file", "save_text_to_file"),
+    ("hello there", None),
+    ("what about the other one?", None)
+]
+
+def select_uncached(selector: Any, queries: List[str]) -> None:
+    # select() memoizes per query; clearing it first times the ranking itself
+    selector.select.cache_clear()
+    for query in queries:
+        selector.select(query)
+
+def bench_tool_selection(iterations: int) -> Dict[str, Any]:
+    """Selection accuracy on TOOL_SELECTION_QUERIES, tools bound and schema tokens saved per model call."""
+    from tool_selection import get_tool_selector
+
+    selector = get_tool_selector()
+    selections = []
+    misses = []
+    for query, expected in TOOL_SELECTION_QUERIES:
+        selection = selector.select(query)
+        selections.append((selection, expected))
+        if (expected not in selection.names) if expected else not selection.fallback:
+            misses.append(query)
+    total_tokens = sum(selector.schema_tokens().values())
+    queries = [query for query, _ in TOOL_SELECTION_QUERIES]
+    return {
+        "queries": len(selections),
+        "accuracy": round(1 - len(misses) / len(selections), 3),
+        "misses": misses,
+        "fallback_rate": round(sum(selection.fallback for selection, _ in selections) / len(selections), 3),
+        "mean_tools_bound": round(sum(len(selection.names) for selection, _ in selections) / len(selections), 2),
+        "all_tools_schema_tokens": total_tokens,
+        "mean_tokens_saved": round(sum(selection.tokens_saved for selection, _ in selections) / len(selections), 1),
+        "select": measure(lambda: select_uncached(selector, queries), max(1, iterations // len(queries)))
+    }
+
+# --- /api/ask ---
+
+def bench_api(latency: float, requests: int, concurrency: int, pool_size: int) -> Dict[str, Any]:
+    from werkzeug.serving import make_server
+    import app as flask_app
+    from cache import ResponseCache
+    from main import AgentExecutorPool, build_agent
+
+    fake_agent = build_agent(FakeChatModel(latency=latency))
+    flask_app.executor_pool = AgentExecutorPool(size=pool_size, tool_agent=fake_agent)
+    flask_app.response_cache = ResponseCache()
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, flask_app.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_port}/api/ask"
+
+    def post(message: str) -> Dict[str, Any]:
+        body = json.dumps({"message": message}).encode("utf-8")
+        req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=120) as resp:
+            return json.loads(resp.read())
+
+    def customer(i: int) -> str:
+        # Spelled out so the router finds no amount and leaves the query to the agent
+        return "".join(chr(ord("a") + int(digit)) for digit in str(i))
+
+    scenarios = {
+        # Unique queries so every request goes through the agent (tool call + final answer)
+        "agent": lambda i: post(f"Prepare a quotation for customer {customer(i)}"),
+        "fast_path": lambda i: post(f"Quote $5{i % 10},000 for a vip customer with high urgency"),
+        "cache": lambda i: post(f"Prepare a quotation for customer {customer(0)}")
+    }
+    try:
+        return {name: measure_concurrent(fn, requests, concurrency) for name, fn in scenarios.items()}
+    finally:
+        server.shutdown()
+
+# --- LLM Scheduling ---
+
+def bench_llm_scheduler(requests: int, concurrency: int, quota_per_s: int = 20) -> Dict[str, Any]:
+    """
+    A burst of `requests` model calls, half of them in the batch lane, against a fake model that
+    rejects calls beyond `quota_per_s` per second: unscheduled, then through the LLMScheduler
+    with its rate limit set to the quota and to 2.5x the quota (so it has to adapt to 429s).
+    """
+    from langchain_core.messages import HumanMessage
+    from config import Config
+    from llm_scheduler import BATCH, INTERACTIVE, LLMScheduler, llm_priority
+    from rate_limited_llm import RateLimitedChatModel
+
+    def run_burst(model: Any, fake: FakeChatModel) -> Dict[str, Any]:
+        lanes = {INTERACTIVE: [], BATCH: []}
+
+        def call(i: int) -> None:
+            lane = BATCH if i % 2 else INTERACTIVE
+            t0 = time.perf_counter()
+            with llm_priority(lane):
+                model.invoke([HumanMessage(content=f"Summarize account {i}")])
+            lanes[lane].append(time.perf_counter() - t0)
+
+        result = measure_concurrent(call, requests, concurrency)
+        result["quota_errors"] = fake.rejected
+        result["lanes"] = {lane: summarize(latencies, result["wall_time_s"]) for lane, latencies in lanes.items() if latencies}
+        return result
+
+    fake = FakeChatModel(latency=0.02, rate_limit=quota_per_s)
+    report = {"unscheduled": run_burst(fake, fake)}
+    for name, per_minute in (("scheduled", quota_per_s * 60), ("scheduled_overestimated", quota_per_s * 150)):
+        fake = FakeChatModel(latency=0.02, rate_limit=quota_per_s)
+        scheduler = LLMScheduler(dict(
+            Config.LLM_SCHEDULER, requests_per_minute=per_minute, burst_seconds=1, max_concurrency=concurrency,
+            base_backoff=0.2, max_backoff=2.0, max_queue_wait=120
+        ))
+        report[name] = run_burst(RateLimitedChatModel(model=fake, scheduler=scheduler), fake)
+        report[name]["scheduler"] = scheduler.stats()
+    return report
+
+# --- Cold start ---
+
+# Cumulative import time budgets, in ms, for a fresh interpreter (see `python -X importtime`)
+IMPORT_BUDGETS_MS = {"tools": 1200, "main": 1400, "app": 1700}
+
+# Modules that must only load on first use (the agent runtime, the Gemini client and the search backends)
+DEFERRED_MODULES = (
+    "langchain.agents",
+    "langchain_google_genai",
+    "langchain_community.tools.ddg_search",
+    "langchain_community.tools.wikipedia",
+    "duckduckgo_search",
+    "wikipedia"
+)
+
+def _import_time(module: str) -> Dict[str, Any]:
+    """Import `module` in a fresh interpreter; return its cumulative import time and the deferred modules it loaded."""
+    env = dict(os.environ, AGENT_WARMUP="off", FOLLOWUP_WORKER_ENABLED="false")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env, check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    loaded = set()
+    cumulative_us = 0
+    # Lines look like "import time:  self [us] | cumulative | <indent>name"
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or line.rstrip().endswith("imported package"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        name = fields[2].strip()
+        loaded.add(name)
+        if name == module:
+            cumulative_us = int(fields[1])
+    return {"ms": cumulative_us / 1000, "deferred_loaded": [name for name in DEFERRED_MODULES if name in loaded]}
+
+def bench_imports(repeats: int) -> Dict[str, Any]:
+    results = {}
+    for module, budget_ms in IMPORT_BUDGETS_MS.items():
+        runs = [_import_time(module) for _ in range(repeats)]
+        best_ms = min(run["ms"] for run in runs)
+        deferred_loaded = runs[0]["deferred_loaded"]
+        results[module] = {
+            "best_ms": round(best_ms, 1),
+            "budget_ms": budget_ms,
+            "deferred_loaded": deferred_loaded,
+            "ok": best_ms <= budget_ms and not deferred_loaded
+        }
+    return results
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    report: Dict[str, Any] = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "settings": {
+            "iterations": args.iterations,
+            "llm_latency_s": args.latency,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "pool_size": args.pool_size
+        }
+    }
+    suites = set(args.suites)
+    with tempfile.TemporaryDirectory() as workdir:
+        if "tools" in suites:
+            report["tools"] = bench_tools(args.iterations, workdir)
+        if "postprocessing" in suites:
+            report["postprocessing"] = bench_postprocessing(args.iterations)
+        if "tool_selection" in suites:
+            report["tool_selection"] = bench_tool_selection(args.iterations)
+        if "llm_scheduler" in suites:
+            report["llm_scheduler"] = bench_llm_scheduler(args.requests, args.concurrency)
+        if "api" in suites:
+            report["api_ask"] = bench_api(args.latency, args.requests, args.concurrency, args.pool_size)
+    if "imports" in suites:
+        report["imports"] = bench_imports(args.import_repeats)
+    return report
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description="Offline CRM agent benchmarks with a fake LLM")
+    arg_parser.add_argument("--iterations", type=int, default=1000, help="Calls per tool/post-processing case")
+    arg_parser.add_argument("--latency", type=float, default=0.05, help="Simulated LLM latency per call, seconds")
+    arg_parser.add_argument("--requests", type=int, default=200, help="Requests per /api/ask scenario")
+    arg_parser.add_argument("--concurrency", type=int, default=16, help="Concurrent /api/ask clients")
+    arg_parser.add_argument("--pool-size", type=int, default=16, help="AgentExecutorPool size for /api/ask")
+    arg_parser.add_argument(
+        "--suites", nargs="+", choices=["tools", "postprocessing", "tool_selection", "llm_scheduler", "api", "imports"],
+        default=["tools", "postprocessing", "tool_selection", "llm_scheduler", "api", "imports"]
+    )
+    arg_parser.add_argument("--import-repeats", type=int, default=5, help="Fresh interpreters per import timing (best is reported)")
+    arg_parser.add_argument("--check", action="store_true", help="Exit with status 1 if an import misses its budget")
+    arg_parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = arg_parser.parse_args()
+
+    results = run(args)
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+    if args.check and not all(result["ok"] for result in results.get("imports", {}).values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
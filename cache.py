@@ -0,0 +1,385 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+import json
+import os
+import re
+import threading
+import time
+import zlib
+import numpy as np
+from config import Config
+from compiled_config import get_snapshot
+from crm_store import STORE_SOURCE_PREFIX
+from quotation_docs import DOCUMENT_FORMATS
+from tracing import record_cache_event
+
+# --- Generic LRU Cache With TTL ---
+
+class LRUTTLCache:
+    """Thread-safe, size-bounded LRU cache whose entries expire after a TTL (in seconds)."""
+
+    def __init__(self, max_entries: int = 1024, default_ttl: Optional[float] = None):
+        self.max_entries = max(1, max_entries)
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[Hashable, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None, record_stats: bool = True) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    if record_stats:
+                        self.hits += 1
+                    return value
+                del self._entries[key]
+            if record_stats:
+                self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl is not None and ttl <= 0:
+            return
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def keys(self) -> List[Hashable]:
+        with self._lock:
+            return list(self._entries)
+
+    def items(self) -> List[Tuple[Hashable, Any, Optional[float]]]:
+        """(key, value, seconds left or None) for every unexpired entry, least recently used first."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                (key, value, None if expires_at is None else expires_at - now)
+                for key, (value, expires_at) in self._entries.items()
+                if expires_at is None or expires_at > now
+            ]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+# --- Agent Response Cache ---
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9$.,]+")
+NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)*\s*[km]?\b")
+DOCUMENT_PATTERN = re.compile(r"\b(?:" + "|".join(DOCUMENT_FORMATS) + r"|documents?)\b", re.I)
+# parse_response's answer for output with no recoverable Response JSON
+FALLBACK_TOPIC = "General"
+EMBEDDING_DIMENSIONS = 512
+
+def normalize_query(query: str) -> str:
+    """Lowercase, strip punctuation noise and collapse whitespace so trivially different phrasings share a key."""
+    return " ".join(token.strip(".,") for token in TOKEN_PATTERN.findall(query.lower()) if token.strip(".,"))
+
+def embed_query(normalized: str) -> np.ndarray:
+    """Local hashed bag-of-words embedding (words and word bigrams), L2-normalized."""
+    vector = np.zeros(EMBEDDING_DIMENSIONS, dtype=np.float32)
+    words = normalized.split()
+    for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+        vector[zlib.crc32(feature.encode("utf-8")) % EMBEDDING_DIMENSIONS] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class ResponseCache:
+    """
+    Cache of structured agent answers keyed on normalized query text.
+
+    Entry lifetime is the shortest TTL of the tools used to produce the answer (capped at the
+    crm_store TTL for answers built from stored records), and the whole cache is dropped when a new config snapshot is published.
+    Parse fallbacks and answers that rendered quotation documents are never cached.
+    In similarity mode, a miss on the exact key falls back to the most similar cached
+    query above a cosine threshold, provided both queries mention the same numbers.
+    """
+
+    def __init__(self, settings: Optional[Dict[str, Any]] = None):
+        settings = settings or Config.RESPONSE_CACHE
+        self.enabled = settings.get("enabled", True)
+        self.default_ttl = settings.get("default_ttl", 3600)
+        self.tool_ttls = settings.get("tool_ttls", {})
+        self.similarity_mode = settings.get("similarity_mode", False)
+        self.similarity_threshold = settings.get("similarity_threshold", 0.9)
+        self._entries = LRUTTLCache(settings.get("max_entries", 1024), self.default_ttl)
+        self._embeddings: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+        self._config_version = get_snapshot().version
+        self.similar_hits = 0
+        self.invalidations = 0
+
+    def _check_config_version(self) -> None:
+        version = get_snapshot().version
+        if version != self._config_version:
+            with self._lock:
+                self._entries.clear()
+                self._embeddings.clear()
+                self._config_version = version
+                self.invalidations += 1
+
+    def ttl_for(self, tools_used: List[str]) -> float:
+        return min((self.tool_ttls.get(tool, self.default_ttl) for tool in tools_used), default=self.default_ttl)
+
+    def _find_similar(self, normalized: str) -> Optional[str]:
+        with self._lock:
+            keys = [key for key in self._entries.keys() if key in self._embeddings]
+            if not keys:
+                return None
+            matrix = np.stack([self._embeddings[key] for key in keys])
+        similarities = matrix @ embed_query(normalized)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None
+        # Answers to "quote 50k" and "quote 75k" differ even though the text is nearly identical
+        if NUMBER_PATTERN.findall(keys[best]) != NUMBER_PATTERN.findall(normalized):
+            return None
+        return keys[best]
+
+    def get(self, query: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        self._check_config_version()
+        normalized = normalize_query(query)
+        response = self._entries.get(normalized)
+        outcome = "hit"
+        if response is None and self.similarity_mode:
+            similar_key = self._find_similar(normalized)
+            if similar_key is not None:
+                response = self._entries.get(similar_key, record_stats=False)
+                if response is not None:
+                    self.similar_hits += 1
+                    outcome = "similar_hit"
+        record_cache_event("response", outcome if response is not None else "miss")
+        return dict(response) if response is not None else None
+
+    @staticmethod
+    def cacheable(query: str, response: Dict[str, Any]) -> bool:
+        """Whether replaying `response` for `query` is safe, regardless of TTL."""
+        tools_used = response.get("tools_used", [])
+        sources = response.get("source", [])
+        # Raw model text that failed to parse is not an answer worth replaying
+        if response.get("topic") == FALLBACK_TOPIC and not tools_used and not sources:
+            return False
+        # Rendered quotation documents are written per request and may since have been replaced
+        if "quotation" in tools_used and (
+            DOCUMENT_PATTERN.search(query)
+            or any(not str(source).startswith(STORE_SOURCE_PREFIX) for source in sources)
+        ):
+            return False
+        return True
+
+    def set(self, query: str, response: Dict[str, Any]) -> None:
+        if not self.enabled or not self.cacheable(query, response):
+            return
+        self._check_config_version()
+        ttl = self.ttl_for(response.get("tools_used", []))
+        if any(str(source).startswith(STORE_SOURCE_PREFIX) for source in response.get("source", [])):
+            ttl = min(ttl, self.tool_ttls.get("crm_store", self.default_ttl))
+        if ttl <= 0:
+            return
+        normalized = normalize_query(query)
+        self._entries.set(normalized, dict(response), ttl=ttl)
+        if self.similarity_mode:
+            with self._lock:
+                self._embeddings[normalized] = embed_query(normalized)
+                if len(self._embeddings) > 2 * self._entries.max_entries:
+                    live = set(self._entries.keys())
+                    self._embeddings = {k: v for k, v in self._embeddings.items() if k in live}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._embeddings.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._entries.stats()
+        stats.update({
+            "similar_hits": self.similar_hits,
+            "invalidations": self.invalidations,
+            "config_version": self._config_version
+        })
+        return stats
+
+# --- Search Tool Cache With Request Coalescing ---
+
+class _InFlightCall:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key so only one of them runs the function."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _InFlightCall] = {}
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _InFlightCall()
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+class ToolResultCache:
+    """
+    TTL/LRU cache for slow lookup tools (web search, Wikipedia) with single-flight
+    coalescing, so N simultaneous identical queries make one upstream call.
+    When `persist_path` is set, entries are journaled to a JSON Lines file with
+    wall-clock expiry and reloaded on startup. The journal is rewritten with only the live
+    entries on startup and whenever it grows to `compact_factor` times their number.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        max_entries: int = 512,
+        persist_path: Optional[str] = None,
+        compact_factor: int = 4
+    ):
+        self.name = name
+        self.ttl = ttl
+        self._cache = LRUTTLCache(max_entries, ttl)
+        self._flight = SingleFlight()
+        self._persist_path = persist_path
+        self._journal_lock = threading.Lock()
+        self._journal_records = 0
+        self.compact_factor = max(2, compact_factor)
+        self.upstream_calls = 0
+        if persist_path:
+            os.makedirs(os.path.dirname(persist_path) or ".", exist_ok=True)
+            self._load()
+
+    @staticmethod
+    def _key(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def _load(self) -> None:
+        if not os.path.exists(self._persist_path):
+            return
+        entries: Dict[str, Tuple[Any, float]] = {}
+        with open(self._persist_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    entries[record["key"]] = (record["value"], record["expires_at"])
+                except (ValueError, KeyError):
+                    continue
+        now = time.time()
+        for key, (value, expires_at) in entries.items():
+            if expires_at > now:
+                self._cache.set(key, value, ttl=expires_at - now)
+        with self._journal_lock:
+            self._compact()
+
+    def _compact(self) -> None:
+        # Rewrite the journal with only the live entries; callers hold _journal_lock
+        now = time.time()
+        live = self._cache.items()
+        temp_path = f"{self._persist_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for key, value, ttl_left in live:
+                f.write(json.dumps({"key": key, "value": value, "expires_at": now + ttl_left}) + "\n")
+        os.replace(temp_path, self._persist_path)
+        self._journal_records = len(live)
+
+    def _persist(self, key: str, value: Any) -> None:
+        record = json.dumps({"key": key, "value": value, "expires_at": time.time() + self.ttl})
+        with self._journal_lock:
+            with open(self._persist_path, "a", encoding="utf-8") as f:
+                f.write(record + "\n")
+            self._journal_records += 1
+            # Superseded, evicted and expired records pile up; rewriting costs O(live entries),
+            # so doing it once the journal is compact_factor times that size keeps appends O(1) amortized
+            if self._journal_records >= self.compact_factor * max(1, len(self._cache)):
+                self._compact()
+
+    def get_or_call(self, query: str, backend: Callable[[str], Any]) -> Any:
+        """Return the cached result for `query`, calling `backend(query)` at most once per miss."""
+        key = self._key(query)
+        value = self._cache.get(key)
+        if value is not None:
+            record_cache_event(self.name, "hit")
+            return value
+
+        def load() -> Any:
+            # Another caller may have filled the entry while we waited for the flight slot
+            value = self._cache.get(key, record_stats=False)
+            if value is not None:
+                record_cache_event(self.name, "hit")
+                return value
+            record_cache_event(self.name, "miss")
+            self.upstream_calls += 1
+            value = backend(query)
+            self._cache.set(key, value)
+            if self._persist_path:
+                self._persist(key, value)
+            return value
+
+        return self._flight.do(key, load)
+
+    def clear(self) -> None:
+        self._cache.clear()
+        if self._persist_path and os.path.exists(self._persist_path):
+            with self._journal_lock:
+                os.remove(self._persist_path)
+                self._journal_records = 0
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._cache.stats()
+        stats.update({
+            "upstream_calls": self.upstream_calls,
+            "coalesced": self._flight.coalesced
+        })
+        return stats
@@ -0,0 +1,191 @@
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Tuple
+from config import Config, VERSIONED_SETTINGS
+from templating import FOLLOWUP_FIELDS, CompiledTemplate
+
+logger = logging.getLogger(__name__)
+
+def _freeze(value: Any) -> Any:
+    """Recursively turn dicts into read-only mappings and lists into tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+def _merge(base: Any, override: Any) -> Any:
+    if isinstance(base, dict) and isinstance(override, dict):
+        merged = dict(base)
+        for key, value in override.items():
+            merged[key] = _merge(base.get(key), value) if key in base else value
+        return merged
+    return copy.deepcopy(override)
+
+def _fingerprint(settings: Mapping[str, Any]) -> str:
+    payload = json.dumps(settings, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+class ConfigSnapshot:
+    """
+    Immutable, precompiled view of the CRM rule tables.
+    Nested dicts are read-only mappings, stage lookups are O(1) maps, follow-up templates
+    are compiled, and pricing factors are flattened so tools avoid walking nested config
+    dicts per call.
+    """
+
+    __slots__ = (
+        "version",
+        "fingerprint",
+        "lead_scoring",
+        "lead_segments",
+        "followup_templates",
+        "followup_messages",
+        "quotation_templates",
+        "urgency_multipliers",
+        "customer_discounts",
+        "pipeline_stages",
+        "stage_index",
+        "next_stage",
+        "risk_factors",
+        "sales_coaching",
+        "lost_reason_tips",
+        "win_patterns"
+    )
+
+    def __init__(self, version: int, settings: Mapping[str, Any]):
+        frozen = {name: _freeze(value) for name, value in settings.items()}
+        stages: Tuple[str, ...] = frozen["PIPELINE_STAGES"]
+        pricing = frozen["QUOTATION_SETTINGS"]["pricing_factors"]
+        values = {
+            "version": version,
+            "fingerprint": _fingerprint(settings),
+            "lead_scoring": frozen["LEAD_SCORING"],
+            "lead_segments": frozen["LEAD_SEGMENTS"],
+            "followup_templates": frozen["FOLLOWUP_TEMPLATES"],
+            "followup_messages": MappingProxyType({
+                key: CompiledTemplate(template["template"], FOLLOWUP_FIELDS, {"delay_days": template["delay_days"]})
+                for key, template in frozen["FOLLOWUP_TEMPLATES"].items()
+            }),
+            "quotation_templates": frozen["QUOTATION_SETTINGS"]["templates"],
+            "urgency_multipliers": pricing["urgency_multiplier"],
+            "customer_discounts": pricing["customer_type_discount"],
+            "pipeline_stages": stages,
+            "stage_index": MappingProxyType({stage: i for i, stage in enumerate(stages)}),
+            "next_stage": MappingProxyType({
+                stage: stages[i + 1] if i < len(stages) - 1 else None for i, stage in enumerate(stages)
+            }),
+            "risk_factors": frozen["RISK_FACTORS"],
+            "sales_coaching": frozen["SALES_COACHING"],
+            "lost_reason_tips": frozen["SALES_COACHING"]["lost_reasons"],
+            "win_patterns": frozen["SALES_COACHING"]["win_patterns"]
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("ConfigSnapshot is immutable; use reload_config() to publish a new one")
+
+    def __repr__(self) -> str:
+        return f"ConfigSnapshot(version={self.version}, fingerprint='{self.fingerprint}')"
+
+_snapshot: Optional[ConfigSnapshot] = None
+_reload_lock = threading.Lock()
+
+def _load_overrides(path: Optional[str]) -> Dict[str, Any]:
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        overrides = json.load(f)
+    if not isinstance(overrides, dict):
+        raise ValueError(f"Config overrides in '{path}' must be a JSON object")
+    unknown = set(overrides) - set(VERSIONED_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown config sections in '{path}': {sorted(unknown)}")
+    return overrides
+
+def build_settings(overrides: Optional[Mapping[str, Any]] = None) -> Dict[str, Any]:
+    """Merge overrides onto the Config tables."""
+    settings = {name: copy.deepcopy(getattr(Config, name)) for name in VERSIONED_SETTINGS}
+    for name, value in (overrides or {}).items():
+        settings[name] = _merge(settings[name], value)
+    return settings
+
+def reload_config(overrides_path: Optional[str] = None) -> ConfigSnapshot:
+    """
+    Rebuild the snapshot from Config plus the JSON overrides file and publish it atomically.
+    The version only changes when the effective settings do, so caches keyed on it survive no-op reloads.
+    """
+    global _snapshot
+    path = overrides_path if overrides_path is not None else Config.CONFIG_OVERRIDES_PATH
+    with _reload_lock:
+        settings = build_settings(_load_overrides(path))
+        current = _snapshot
+        if current is not None and current.fingerprint == _fingerprint(settings):
+            return current
+        _snapshot = ConfigSnapshot((current.version + 1) if current else 1, settings)
+        return _snapshot
+
+def get_snapshot() -> ConfigSnapshot:
+    """Return the current config snapshot, building it on first use."""
+    snapshot = _snapshot
+    return snapshot if snapshot is not None else reload_config()
+
+# --- Hot Reload ---
+
+class ConfigWatcher:
+    """Polls the overrides file and republishes the snapshot when it changes on disk."""
+
+    def __init__(self, path: str, interval: float = 2.0):
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_stat: Optional[Tuple[float, int]] = self._stat()
+
+    def _stat(self) -> Optional[Tuple[float, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime, stat.st_size)
+
+    def check(self) -> bool:
+        """Reload if the file changed since the last check. Returns True when a new snapshot was published."""
+        current = self._stat()
+        if current == self._last_stat:
+            return False
+        self._last_stat = current
+        previous = get_snapshot()
+        try:
+            snapshot = reload_config(self.path)
+        except (OSError, ValueError) as e:
+            # Keep serving the last good snapshot when the file is mid-write or invalid
+            logger.warning("Ignoring invalid config overrides in %s: %s", self.path, e)
+            return False
+        return snapshot is not previous
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self) -> "ConfigWatcher":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="config-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+def start_config_watcher() -> Optional[ConfigWatcher]:
+    """Load the configured overrides and watch them for changes; no-op when no overrides path is set."""
+    reload_config()
+    if not Config.CONFIG_OVERRIDES_PATH:
+        return None
+    return ConfigWatcher(Config.CONFIG_OVERRIDES_PATH, Config.CONFIG_RELOAD_INTERVAL).start()
@@ -12,6 +12,196 @@ class Config:
     CRM_BASE_URL = os.getenv("CRM_BASE_URL", "http://localhost:3000")
     CRM_API_KEY = os.getenv("CRM_API_KEY")
     
+    # Local CRM Store (SQLite) that the CRM tools query by lead_id / deal_id / filter (see crm_store.py)
+    CRM_STORE = {
+        "path": os.getenv("CRM_STORE_DB", "crm.db"),
+        "default_limit": 10,
+        "max_limit": 500,
+        "import_chunk_size": 50000,
+        "cache_mb": 64
+    }
+    
+    # Incremental sales analytics over closed deals (see sales_analytics.py). Deals imported into the
+    # CRM store or upserted through the CRM API are counted as they close; windows are in days.
+    SALES_ANALYTICS = {
+        "enabled": os.getenv("SALES_ANALYTICS_ENABLED", "true").lower() == "true",
+        "path": os.getenv("SALES_ANALYTICS_DB", "sales_analytics.db"),
+        "windows": [30, 90],
+        "relative_accuracy": 0.01,
+        "value_quantiles": [0.5, 0.9],
+        "days_to_close_buckets": [7, 14, 30, 60, 90, 180]
+    }
+    
+    # CRM REST Client Settings (crm_client.py). When enabled, the CRM tools read leads and deals
+    # from the API at CRM_BASE_URL instead of the local store; cache_ttl and batch_window are in seconds.
+    CRM_CLIENT = {
+        "enabled": os.getenv("CRM_API_ENABLED", "false").lower() == "true",
+        "timeout": float(os.getenv("CRM_API_TIMEOUT", "10")),
+        "pool_size": int(os.getenv("CRM_API_POOL_SIZE", "16")),
+        "retries": 3,
+        "backoff_factor": 0.2,
+        "max_batch_size": 100,
+        "batch_window": 0.005,
+        "cache_ttl": 30,
+        "cache_max_entries": 4096
+    }
+    
+    # Hot-reloadable JSON overrides for the rule tables below (see compiled_config.py)
+    CONFIG_OVERRIDES_PATH = os.getenv("CRM_CONFIG_PATH")
+    CONFIG_RELOAD_INTERVAL = float(os.getenv("CRM_CONFIG_RELOAD_INTERVAL", "2"))
+    
+    # Agent Execution Settings
+    AGENT_POOL_SIZE = int(os.getenv("AGENT_POOL_SIZE", "4"))
+    # Seconds a request waits for a free agent executor before the server answers 503
+    AGENT_POOL_TIMEOUT = float(os.getenv("AGENT_POOL_TIMEOUT", "30"))
+    # When to import and build the agent: "background" (after startup, in a thread), "startup" or "off"
+    AGENT_WARMUP = os.getenv("AGENT_WARMUP", "background").lower()
+    
+    # Model Call Scheduling (see llm_scheduler.py). Every Gemini call is admitted within these rate limits,
+    # lower lane priorities first; quota errors halve the concurrency limit and are retried here,
+    # so the Gemini client itself makes only `provider_retries` attempts. Times are in seconds.
+    LLM_SCHEDULER = {
+        "enabled": os.getenv("LLM_SCHEDULER_ENABLED", "true").lower() == "true",
+        "requests_per_minute": float(os.getenv("LLM_REQUESTS_PER_MINUTE", "30")),
+        "tokens_per_minute": float(os.getenv("LLM_TOKENS_PER_MINUTE", "1000000")),
+        "burst_seconds": 10,
+        "max_concurrency": int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+        "min_concurrency": 1,
+        "max_queue_wait": float(os.getenv("LLM_MAX_QUEUE_WAIT", "60")),
+        "max_retries": 4,
+        "base_backoff": 2.0,
+        "max_backoff": 60.0,
+        "lanes": {"interactive": 0, "batch": 10},
+        "provider_retries": 1
+    }
+    
+    # Concurrent execution of the tool calls from one model turn. Blocking (I/O) tools run on a
+    # thread pool with per-tool timeouts in seconds; the async server applies the timeouts to every tool.
+    PARALLEL_TOOLS = {
+        "enabled": os.getenv("PARALLEL_TOOLS_ENABLED", "true").lower() == "true",
+        "max_workers": int(os.getenv("PARALLEL_TOOLS_MAX_WORKERS", "8")),
+        "blocking_tools": ["web_search", "wikipedia"],
+        "default_timeout": 30,
+        "timeouts": {
+            "web_search": 15,
+            "wikipedia": 15,
+            "pipeline_scanner": 300
+        }
+    }
+    
+    # Tool Selection (see tool_selection.py). Each model call is bound to the 1-max_tools tools whose
+    # descriptions and keywords best match the query; ambiguous or weak matches bind every tool.
+    TOOL_SELECTION = {
+        "enabled": os.getenv("TOOL_SELECTION_ENABLED", "true").lower() == "true",
+        "max_tools": int(os.getenv("TOOL_SELECTION_MAX_TOOLS", "3")),
+        "min_score": float(os.getenv("TOOL_SELECTION_MIN_SCORE", "1.5")),
+        "cache_size": 1024,
+        # Bound alongside the key's tool whenever it is selected
+        "companions": {"save_text_to_file": ["web_search", "wikipedia"]},
+        "keywords": {
+            "web_search": "internet online news latest current search look up find research company competitor market rates",
+            "wikipedia": "wiki encyclopedia history definition define explain background fact",
+            "save_text_to_file": "save file store export",
+            "lead_qualifier": "lead leads qualify qualification score scoring prospect prospects rank priority hot cold",
+            "followup": "follow up followup email message remind reminder reach out check in contact send schedule thank",
+            "quotation": "quote quotes quotation price pricing cost estimate proposal discount offer pdf invoice rental",
+            "pipeline_manager": "deal opportunity stage risk stalled inactive negotiation competitor next step status",
+            "pipeline_scanner": "pipeline scan bulk whole book all deals portfolio at risk csv report",
+            "sales_coach": "coach coaching advice tips improve lost win rate why losing objection pattern history trend performance"
+        }
+    }
+    
+    # Tools whose complete Response-shaped output is returned as the answer without a final LLM turn
+    RETURN_DIRECT = {
+        "enabled": os.getenv("RETURN_DIRECT_ENABLED", "true").lower() == "true",
+        "tools": [
+            "lead_qualifier",
+            "followup",
+            "quotation",
+            "pipeline_manager",
+            "pipeline_scanner",
+            "sales_coach",
+            "save_text_to_file"
+        ]
+    }
+    
+    # Research Output Writer Settings (fsync_every: 0 = never fsync, N = fsync after every N records)
+    OUTPUT_WRITER = {
+        "batch_size": 100,
+        "flush_interval": 1.0,
+        "max_bytes": int(os.getenv("OUTPUT_MAX_BYTES", str(10 * 1024 * 1024))),
+        "backup_count": 5,
+        "fsync_every": int(os.getenv("OUTPUT_FSYNC_EVERY", "0")),
+        "write_jsonl": os.getenv("OUTPUT_WRITE_JSONL", "false").lower() == "true"
+    }
+    
+    # Search Tool Cache Settings (TTL in seconds; set TOOL_CACHE_DIR to persist across restarts).
+    # A journal is compacted once it holds compact_factor times as many records as live entries.
+    TOOL_CACHE = {
+        "web_search": {"ttl": 300, "max_entries": 512},
+        "wikipedia": {"ttl": 86400, "max_entries": 512},
+        "persist_dir": os.getenv("TOOL_CACHE_DIR"),
+        "compact_factor": 4
+    }
+    
+    # Async Server Settings (asgi.py)
+    ASYNC_SERVER = {
+        "host": os.getenv("ASYNC_HOST", "127.0.0.1"),
+        "port": int(os.getenv("ASYNC_PORT", "8000")),
+        "max_concurrency": int(os.getenv("ASYNC_MAX_CONCURRENCY", "200")),
+        "request_timeout": float(os.getenv("ASYNC_REQUEST_TIMEOUT", "60"))
+    }
+    
+    # Batch Endpoint Settings (/api/ask/batch)
+    BATCH = {
+        "max_items": int(os.getenv("BATCH_MAX_ITEMS", "1000")),
+        "max_concurrency": int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+    }
+    
+    # Conversation Memory Settings (token counts are estimates; backend is "memory" or "sqlite")
+    CONVERSATION_MEMORY = {
+        "enabled": os.getenv("CONVERSATION_MEMORY_ENABLED", "true").lower() == "true",
+        "backend": os.getenv("CONVERSATION_MEMORY_BACKEND", "memory"),
+        "sqlite_path": os.getenv("CONVERSATION_MEMORY_DB", "conversations.db"),
+        "max_history_tokens": 1500,
+        "window_turns": 6,
+        "summary_max_tokens": 300,
+        "summarizer": os.getenv("CONVERSATION_SUMMARIZER", "extractive"),
+        "max_sessions": int(os.getenv("CONVERSATION_MAX_SESSIONS", "1000")),
+        "idle_ttl": int(os.getenv("CONVERSATION_IDLE_TTL", "3600"))
+    }
+    
+    # Tracing and Metrics Settings (/metrics; include_timings adds a per-request breakdown to /api/ask)
+    TRACING = {
+        "enabled": os.getenv("TRACING_ENABLED", "false").lower() == "true",
+        "include_timings": os.getenv("TRACING_INCLUDE_TIMINGS", "false").lower() == "true",
+        "latency_buckets": [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+    }
+    
+    # Response Cache Settings (TTL in seconds; 0 means never cache answers that used the tool)
+    RESPONSE_CACHE = {
+        "enabled": os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true",
+        "max_entries": int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024")),
+        "default_ttl": 3600,
+        "similarity_mode": os.getenv("RESPONSE_CACHE_SIMILARITY", "false").lower() == "true",
+        "similarity_threshold": 0.9,
+        "tool_ttls": {
+            "web_search": 300,
+            "wikipedia": 86400,
+            "save_text_to_file": 0,
+            # Replaying a follow-up answer would skip scheduling the follow-up
+            "followup": 0,
+            "lead_qualifier": 86400,
+            "quotation": 86400,
+            "pipeline_manager": 86400,
+            # Scans read deal files that can be re-exported between requests
+            "pipeline_scanner": 300,
+            "sales_coach": 86400,
+            # Answers built from stored leads/deals, which can change after an import
+            "crm_store": 60
+        }
+    }
+    
     # Lead Scoring Weights
     LEAD_SCORING: Dict[str, Dict[str, Any]] = {
         "deal_size": {
@@ -40,6 +230,35 @@ class Config:
         }
     }
     
+    # Lead Segments (minimum score for each segment, highest first)
+    LEAD_SEGMENTS = {
+        "hot": 70,
+        "warm": 40,
+        "cold": 0
+    }
+    
+    # Follow-up Scheduler (see followup_scheduler.py). followup schedules a plan when asked to; the worker
+    # in each server process claims and sends due follow-ups through the channel's sender. Delays are in seconds.
+    FOLLOWUP_SCHEDULER = {
+        "enabled": os.getenv("FOLLOWUP_SCHEDULER_ENABLED", "true").lower() == "true",
+        "run_worker": os.getenv("FOLLOWUP_WORKER_ENABLED", "true").lower() == "true",
+        "path": os.getenv("FOLLOWUP_SCHEDULER_DB", "followups.db"),
+        "default_channel": "email",
+        "channels": {
+            "email": (
+                {"type": "webhook", "url": os.getenv("FOLLOWUP_WEBHOOK_URL")} if os.getenv("FOLLOWUP_WEBHOOK_URL")
+                else {"type": "outbox", "path": os.getenv("FOLLOWUP_OUTBOX", "followup_outbox.jsonl")}
+            ),
+            "log": {"type": "log"}
+        },
+        "batch_size": 200,
+        "poll_interval": 1.0,
+        "max_attempts": 5,
+        "retry_delay": 60,
+        # A claimed follow-up not marked sent or failed within this long (a crashed worker) is sent again
+        "claim_timeout": 300
+    }
+    
     # Follow-up Templates
     FOLLOWUP_TEMPLATES = {
         "site_visit": {
@@ -92,6 +311,16 @@ class Config:
         }
     }
     
+    # Quotation Documents (see quotation_docs.py). Batches render on a process pool; workers 0 means one per CPU.
+    QUOTATION_DOCS = {
+        "company": os.getenv("QUOTATION_COMPANY", "ASP Crane Services"),
+        "output_dir": os.getenv("QUOTATION_OUTPUT_DIR", "quotes"),
+        "formats": ["html", "pdf"],
+        "workers": int(os.getenv("QUOTATION_WORKERS", "0")),
+        "chunk_size": int(os.getenv("QUOTATION_CHUNK_SIZE", "200")),
+        "start_method": os.getenv("QUOTATION_START_METHOD", "spawn")
+    }
+    
     # Pipeline Stages and Risk Factors
     PIPELINE_STAGES = [
         "lead",
@@ -139,4 +368,15 @@ class Config:
                 "key_factors": ["roi_discussion", "multiple_stakeholders", "pilot_program"]
             }
         }
-    } 
\ No newline at end of file
+    }
+
+# Rule tables compiled into ConfigSnapshot; caches are keyed on the snapshot version
+VERSIONED_SETTINGS = (
+    "LEAD_SCORING",
+    "LEAD_SEGMENTS",
+    "FOLLOWUP_TEMPLATES",
+    "QUOTATION_SETTINGS",
+    "PIPELINE_STAGES",
+    "RISK_FACTORS",
+    "SALES_COACHING"
+)
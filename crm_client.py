@@ -0,0 +1,221 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import Config
+from cache import LRUTTLCache
+from crm_store import TABLES
+from sales_analytics import record_closed_deals
+from tracing import record_cache_event, span
+
+# Transient statuses retried with exponential backoff (Retry-After is honored for 429/503)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class _BatchLoader:
+    """
+    Coalesces concurrent single-record lookups into one bulk request.
+    The first id starts a `window`-second timer; the batch is sent when the timer fires
+    or `max_batch` distinct ids are waiting, whichever comes first.
+    """
+
+    def __init__(self, fetch_many: Callable[[List[str]], Dict[str, Dict[str, Any]]], max_batch: int, window: float):
+        self.fetch_many = fetch_many
+        self.max_batch = max(1, max_batch)
+        self.window = window
+        self._pending: Dict[str, Future] = {}
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def load(self, record_id: str) -> "Future[Optional[Dict[str, Any]]]":
+        batch = None
+        with self._lock:
+            future = self._pending.get(record_id)
+            if future is None:
+                future = self._pending[record_id] = Future()
+            if len(self._pending) >= self.max_batch or self.window <= 0:
+                batch = self._take()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.window, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if batch:
+            self._run(batch)
+        return future
+
+    def _take(self) -> Dict[str, Future]:
+        batch, self._pending = self._pending, {}
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _flush(self) -> None:
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self._run(batch)
+
+    def _run(self, batch: Dict[str, Future]) -> None:
+        try:
+            records = self.fetch_many(list(batch))
+        except Exception as e:
+            for future in batch.values():
+                future.set_exception(e)
+            return
+        for record_id, future in batch.items():
+            future.set_result(records.get(record_id))
+
+class CRMClient:
+    """
+    Client for the CRM REST API at `base_url`, shared by every tool and request thread.
+
+    One keep-alive connection pool serves all calls; transient failures (connection errors
+    and 429/5xx responses) are retried with exponential backoff. Record lookups are
+    read-through cached for `cache_ttl` seconds, and concurrent lookups of one table are
+    coalesced into a single bulk request.
+
+    Endpoints, per table ("leads" or "deals"):
+      GET  /api/<table>/<id>           -> record, or 404
+      POST /api/<table>/bulk-get       {"ids": [...]}     -> {"records": [...]}
+      POST /api/<table>/bulk-upsert    {"records": [...]} -> {"upserted": n}
+    """
+
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None, settings: Optional[Dict[str, Any]] = None):
+        settings = settings or Config.CRM_CLIENT
+        self.base_url = (base_url or Config.CRM_BASE_URL).rstrip("/")
+        self.timeout = settings["timeout"]
+        self.max_batch_size = settings["max_batch_size"]
+        self.session = requests.Session()
+        retry = Retry(
+            total=settings["retries"],
+            backoff_factor=settings["backoff_factor"],
+            status_forcelist=RETRY_STATUSES,
+            # Bulk endpoints are keyed by record id, so repeating a POST is safe
+            allowed_methods=frozenset({"GET", "POST"}),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings["pool_size"], max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Accept"] = "application/json"
+        api_key = api_key if api_key is not None else Config.CRM_API_KEY
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+        self._cache = LRUTTLCache(settings["cache_max_entries"], settings["cache_ttl"])
+        self._loaders = {
+            table: _BatchLoader(lambda ids, table=table: self._fetch(table, ids), self.max_batch_size, settings["batch_window"])
+            for table in TABLES
+        }
+
+    @staticmethod
+    def _key_field(table: str) -> str:
+        if table not in TABLES:
+            raise ValueError(f"Unknown table '{table}'. Expected one of {list(TABLES)}")
+        return TABLES[table][0][0]
+
+    def _request(self, method: str, path: str, **kwargs: Any) -> requests.Response:
+        with span("crm", f"{method} {path.split('/')[2]}"):
+            response = self.session.request(method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+        if response.status_code != 404:
+            response.raise_for_status()
+        return response
+
+    def _fetch(self, table: str, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch records from the API (one GET for a single id, bulk-get otherwise) and cache them."""
+        key_field = self._key_field(table)
+        if len(ids) == 1:
+            response = self._request("GET", f"/api/{table}/{requests.utils.quote(ids[0], safe='')}")
+            records = [response.json()] if response.status_code != 404 else []
+        else:
+            records = self._request("POST", f"/api/{table}/bulk-get", json={"ids": ids}).json()["records"]
+        found = {}
+        for record in records:
+            record_id = str(record[key_field])
+            found[record_id] = record
+            self._cache.set((table, record_id), record)
+        return found
+
+    def get_record(self, table: str, record_id: Any) -> Optional[Dict[str, Any]]:
+        """One lead or deal by id, or None if the CRM has no such record."""
+        self._key_field(table)
+        record_id = str(record_id)
+        record = self._cache.get((table, record_id))
+        record_cache_event("crm_client", "hit" if record is not None else "miss")
+        if record is None:
+            record = self._loaders[table].load(record_id).result()
+        return dict(record) if record is not None else None
+
+    def get_records(self, table: str, record_ids: Iterable[Any]) -> Dict[str, Dict[str, Any]]:
+        """Many records by id in as few bulk requests as possible; ids the CRM does not know are left out."""
+        self._key_field(table)
+        found: Dict[str, Dict[str, Any]] = {}
+        missing: List[str] = []
+        for record_id in dict.fromkeys(str(record_id) for record_id in record_ids):
+            record = self._cache.get((table, record_id))
+            if record is not None:
+                found[record_id] = dict(record)
+            else:
+                missing.append(record_id)
+        for start in range(0, len(missing), self.max_batch_size):
+            found.update(self._fetch(table, missing[start:start + self.max_batch_size]))
+        return found
+
+    def upsert_records(self, table: str, records: List[Dict[str, Any]]) -> int:
+        """Create or update records in batches of `max_batch_size`. Returns the number upserted."""
+        key_field = self._key_field(table)
+        upserted = 0
+        for start in range(0, len(records), self.max_batch_size):
+            batch = records[start:start + self.max_batch_size]
+            upserted += self._request("POST", f"/api/{table}/bulk-upsert", json={"records": batch}).json()["upserted"]
+            # Drop cached copies rather than trusting our version of what the CRM stored
+            for record in batch:
+                self._cache.delete((table, str(record[key_field])))
+            if table == "deals":
+                record_closed_deals(batch)
+        return upserted
+
+    def get_lead(self, lead_id: Any) -> Optional[Dict[str, Any]]:
+        return self.get_record("leads", lead_id)
+
+    def get_deal(self, deal_id: Any) -> Optional[Dict[str, Any]]:
+        return self.get_record("deals", deal_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"base_url": self.base_url, "cache": self._cache.stats()}
+
+    def close(self) -> None:
+        self.session.close()
+
+class AsyncCRMClient:
+    """
+    asyncio facade over CRMClient for the async server. Calls run in worker threads, so the
+    event loop never blocks on HTTP, and share the client's pool, cache and batching:
+    concurrent awaits of get_record still go out as one bulk request.
+    """
+
+    def __init__(self, client: Optional[CRMClient] = None):
+        self.client = client or get_crm_client()
+
+    async def get_record(self, table: str, record_id: Any) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.client.get_record, table, record_id)
+
+    async def get_records(self, table: str, record_ids: Iterable[Any]) -> Dict[str, Dict[str, Any]]:
+        return await asyncio.to_thread(self.client.get_records, table, list(record_ids))
+
+    async def upsert_records(self, table: str, records: List[Dict[str, Any]]) -> int:
+        return await asyncio.to_thread(self.client.upsert_records, table, records)
+
+_client: Optional[CRMClient] = None
+_client_lock = threading.Lock()
+
+def get_crm_client() -> CRMClient:
+    """Shared client for Config.CRM_BASE_URL, created on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = CRMClient()
+    return _client
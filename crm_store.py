@@ -0,0 +1,292 @@
+import argparse
+import sqlite3
+import threading
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+from config import Config
+from records import RecordSource, iter_record_chunks
+from sales_analytics import CLOSED_STATUSES, record_closed_deals
+
+TRUE_STRINGS = {"true", "1", "yes", "y"}
+
+# Prefix of Response.source entries for answers built from stored records (see ResponseCache.set)
+STORE_SOURCE_PREFIX = "crm_store:"
+
+# (column, SQLite type) per table; the first column is the record id. NUMERIC affinity stores
+# whole numbers as integers, so a CSV "75000" reads back as 75000 rather than "75000" or 75000.0.
+TABLES: Dict[str, Tuple[Tuple[str, str], ...]] = {
+    "leads": (
+        ("lead_id", "TEXT PRIMARY KEY"),
+        ("name", "TEXT"),
+        ("owner", "TEXT"),
+        ("deal_size", "NUMERIC"),
+        ("urgency", "TEXT"),
+        ("past_behavior", "TEXT")
+    ),
+    "deals": (
+        ("deal_id", "TEXT PRIMARY KEY"),
+        ("name", "TEXT"),
+        ("owner", "TEXT"),
+        ("stage", "TEXT"),
+        ("value", "NUMERIC"),
+        ("inactive_days", "NUMERIC"),
+        ("price_sensitivity", "NUMERIC"),
+        ("competitor_mentioned", "INTEGER"),
+        ("response_delay", "NUMERIC"),
+        ("status", "TEXT"),
+        ("days_to_close", "NUMERIC"),
+        ("lost_reason", "TEXT"),
+        ("closed_at", "TEXT")
+    )
+}
+
+# Composite indexes that also carry the other common filter columns, so filtered counts and
+# top-N queries are answered from the index and only the returned rows touch the table
+INDEXES: Dict[str, Tuple[str, str]] = {
+    "idx_leads_owner": ("leads", "owner, deal_size, urgency, past_behavior"),
+    "idx_leads_deal_size": ("leads", "deal_size, urgency, past_behavior"),
+    "idx_deals_stage": ("deals", "stage, inactive_days, value, competitor_mentioned"),
+    "idx_deals_inactive": ("deals", "inactive_days, value, stage"),
+    "idx_deals_value": ("deals", "value, inactive_days, stage"),
+    "idx_deals_owner": ("deals", "owner, stage, value, inactive_days"),
+    "idx_deals_status": ("deals", "status, owner")
+}
+
+FLAG_COLUMNS = {"competitor_mentioned"}
+
+def _columns(table: str) -> List[str]:
+    return [name for name, _ in TABLES[table]]
+
+def _to_flag(value: Any) -> Optional[int]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return int(value.strip().lower() in TRUE_STRINGS)
+    return int(bool(value))
+
+class CRMStore:
+    """
+    Leads and deals in a local SQLite database, for CRM tools that look records up by id
+    or filter instead of relying on whatever fields the model extracted from the message.
+
+    Filters are dicts of column conditions: `{"stage": "negotiation"}` (a list means any of),
+    and `min_`/`max_` prefixes for numeric ranges, e.g. `{"min_inactive_days": 14}`.
+    Stage, inactivity, value and owner are indexed, so id lookups, counts and limited
+    filtered queries stay fast on large books.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(f"PRAGMA cache_size=-{Config.CRM_STORE['cache_mb'] * 1024}")
+            for table, columns in TABLES.items():
+                self._conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(f'{name} {kind}' for name, kind in columns)})")
+                # Databases created before a column was added get it as NULL for existing rows
+                existing = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+                for name, kind in columns:
+                    if name not in existing:
+                        self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {kind}")
+            for table in TABLES:
+                self._create_indexes(table)
+
+    def _create_indexes(self, table: str) -> None:
+        for name, (indexed_table, columns) in INDEXES.items():
+            if indexed_table == table:
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+
+    @staticmethod
+    def _row_dict(table: str, row: Sequence[Any]) -> Dict[str, Any]:
+        # Missing fields are left out so the tools' .get() defaults still apply
+        record = {}
+        for name, value in zip(_columns(table), row):
+            if value is None:
+                continue
+            record[name] = bool(value) if name in FLAG_COLUMNS else value
+        return record
+
+    @staticmethod
+    def _where(table: str, filters: Optional[Mapping[str, Any]]) -> Tuple[str, List[Any]]:
+        columns = set(_columns(table))
+        clauses: List[str] = []
+        params: List[Any] = []
+        for key, value in (filters or {}).items():
+            operator = "="
+            column = key
+            if key.startswith(("min_", "max_")) and key[4:] in columns:
+                operator = ">=" if key.startswith("min_") else "<="
+                column = key[4:]
+            if column not in columns:
+                raise ValueError(f"Unknown {table} filter '{key}'. Expected one of {sorted(columns)} or min_/max_ ranges")
+            if column in FLAG_COLUMNS:
+                value = _to_flag(value)
+            if isinstance(value, (list, tuple)):
+                if not value:
+                    clauses.append("0")
+                    continue
+                clauses.append(f"{column} IN ({', '.join('?' * len(value))})")
+                params.extend(value)
+            elif value is None:
+                clauses.append(f"{column} IS NULL")
+            else:
+                clauses.append(f"{column} {operator} ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    @staticmethod
+    def _order(table: str, order_by: Optional[str]) -> str:
+        if not order_by:
+            return ""
+        column = order_by.lstrip("-")
+        if column not in _columns(table):
+            raise ValueError(f"Cannot order {table} by '{order_by}'")
+        return f" ORDER BY {column} {'DESC' if order_by.startswith('-') else 'ASC'}"
+
+    def get(self, table: str, record_id: Any) -> Optional[Dict[str, Any]]:
+        key = _columns(table)[0]
+        with self._lock:
+            row = self._conn.execute(f"SELECT * FROM {table} WHERE {key} = ?", (str(record_id),)).fetchone()
+        return self._row_dict(table, row) if row is not None else None
+
+    def find(
+        self,
+        table: str,
+        filters: Optional[Mapping[str, Any]] = None,
+        order_by: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Records matching `filters`; `order_by` is a column name, prefixed with '-' for descending."""
+        where, params = self._where(table, filters)
+        order = self._order(table, order_by)
+        if limit is not None:
+            # Select and sort rowids from a covering index first, then read just those rows
+            sql = f"SELECT * FROM {table} WHERE rowid IN (SELECT rowid FROM {table}{where}{order} LIMIT ?){order}"
+            params.append(int(limit))
+        else:
+            sql = f"SELECT * FROM {table}{where}{order}"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._row_dict(table, row) for row in rows]
+
+    def count(self, table: str, filters: Optional[Mapping[str, Any]] = None) -> int:
+        where, params = self._where(table, filters)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {table}{where}", params).fetchone()[0]
+
+    def iter_records(self, table: str, filters: Optional[Mapping[str, Any]] = None, chunk_size: int = 20000) -> Iterator[Dict[str, Any]]:
+        """Stream every matching record in insertion order, holding the lock for one chunk at a time."""
+        where, params = self._where(table, filters)
+        condition = f"{where} AND rowid > ?" if where else " WHERE rowid > ?"
+        last_rowid = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT rowid, * FROM {table}{condition} ORDER BY rowid LIMIT ?",
+                    params + [last_rowid, chunk_size]
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield self._row_dict(table, row[1:])
+            last_rowid = rows[-1][0]
+
+    def get_lead(self, lead_id: Any) -> Optional[Dict[str, Any]]:
+        return self.get("leads", lead_id)
+
+    def get_deal(self, deal_id: Any) -> Optional[Dict[str, Any]]:
+        return self.get("deals", deal_id)
+
+    def find_leads(self, filters: Optional[Mapping[str, Any]] = None, order_by: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self.find("leads", filters, order_by, limit)
+
+    def find_deals(self, filters: Optional[Mapping[str, Any]] = None, order_by: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self.find("deals", filters, order_by, limit)
+
+    def import_records(self, table: str, source: RecordSource, chunk_size: Optional[int] = None) -> int:
+        """
+        Upsert records from an iterable of dicts, a dict of columns, or a CSV/JSONL path.
+        Records are written in chunks of `chunk_size` per transaction. Returns the number imported.
+        """
+        if table not in TABLES:
+            raise ValueError(f"Unknown table '{table}'. Expected one of {list(TABLES)}")
+        columns = _columns(table)
+        key = columns[0]
+        sql = (
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT({key}) DO UPDATE SET " + ", ".join(f"{name} = excluded.{name}" for name in columns[1:])
+        )
+        with self._lock:
+            bulk_load = self._conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() is None
+        if bulk_load:
+            # Building the indexes once after loading an empty table is much faster than updating them per row
+            with self._lock, self._conn:
+                for name, (indexed_table, _) in INDEXES.items():
+                    if indexed_table == table:
+                        self._conn.execute(f"DROP INDEX IF EXISTS {name}")
+        try:
+            imported = self._import_chunks(table, sql, source, chunk_size)
+        finally:
+            with self._lock, self._conn:
+                self._create_indexes(table)
+                # Refresh planner statistics so filters pick the selective index
+                self._conn.execute("PRAGMA optimize")
+        return imported
+
+    def _import_chunks(self, table: str, sql: str, source: RecordSource, chunk_size: Optional[int]) -> int:
+        columns = _columns(table)
+        key = columns[0]
+        status = columns.index("status") if "status" in columns else None
+        imported = 0
+        for chunk in iter_record_chunks(source, columns, chunk_size or Config.CRM_STORE["import_chunk_size"]):
+            values = [list(chunk[name]) for name in columns]
+            for i, record_id in enumerate(values[0]):
+                if record_id is None:
+                    raise ValueError(f"Record {imported + i} has no {key}")
+                values[0][i] = str(record_id)
+            for position, name in enumerate(columns):
+                if name in FLAG_COLUMNS:
+                    values[position] = [_to_flag(value) for value in values[position]]
+            with self._lock, self._conn:
+                self._conn.executemany(sql, zip(*values))
+            if table == "deals":
+                # Deals that arrive closed update the running sales analytics
+                record_closed_deals(dict(zip(columns, row)) for row in zip(*values) if row[status] in CLOSED_STATUSES)
+            imported += len(values[0])
+        return imported
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = {table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in TABLES}
+        return {"path": self.path, **counts}
+
+_store: Optional[CRMStore] = None
+_store_lock = threading.Lock()
+
+def get_crm_store() -> CRMStore:
+    """Shared store at Config.CRM_STORE["path"], opened on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CRMStore(Config.CRM_STORE["path"])
+    return _store
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description="Manage the local CRM store")
+    subcommands = arg_parser.add_subparsers(dest="command", required=True)
+    import_parser = subcommands.add_parser("import", help="Upsert leads or deals from a CSV/JSONL file")
+    import_parser.add_argument("table", choices=list(TABLES))
+    import_parser.add_argument("path")
+    subcommands.add_parser("stats", help="Show record counts")
+    args = arg_parser.parse_args()
+
+    store = get_crm_store()
+    if args.command == "import":
+        print(f"Imported {store.import_records(args.table, args.path):,} {args.table} into {store.path}")
+    else:
+        print(store.stats())
+
+if __name__ == "__main__":
+    main()
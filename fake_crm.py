@@ -0,0 +1,87 @@
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+from crm_store import TABLES
+
+class FakeCRMServer:
+    """
+    Local stand-in for the CRM REST API, for offline tests and benchmarks of CRMClient.
+    Records live in memory. `fail_next(n)` makes the next n requests answer 503, and every
+    request sleeps `latency` seconds; `requests` counts calls per endpoint.
+    """
+
+    def __init__(self, records: Optional[Dict[str, List[Dict[str, Any]]]] = None, latency: float = 0.0):
+        self.latency = latency
+        self.tables: Dict[str, Dict[str, Dict[str, Any]]] = {table: {} for table in TABLES}
+        for table, rows in (records or {}).items():
+            self._upsert(table, rows)
+        self.requests: Dict[str, int] = {}
+        self._failures = 0
+        self._lock = threading.Lock()
+        self.app = self._build_app()
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+
+    def _upsert(self, table: str, rows: List[Dict[str, Any]]) -> int:
+        key_field = TABLES[table][0][0]
+        for row in rows:
+            self.tables[table][str(row[key_field])] = dict(row)
+        return len(rows)
+
+    def fail_next(self, count: int) -> None:
+        with self._lock:
+            self._failures = count
+
+    def _build_app(self) -> Flask:
+        app = Flask("fake_crm")
+
+        @app.before_request
+        def count_and_fail():
+            if self.latency:
+                time.sleep(self.latency)
+            endpoint = request.path.rsplit("/", 1)[-1] if request.method == "POST" else "get"
+            with self._lock:
+                self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+                if self._failures > 0:
+                    self._failures -= 1
+                    return jsonify({"error": "Service unavailable"}), 503
+            if request.view_args and request.view_args.get("table") not in self.tables:
+                return jsonify({"error": "Unknown table"}), 404
+            return None
+
+        @app.route("/api/<table>/<record_id>", methods=["GET"])
+        def get_record(table, record_id):
+            record = self.tables[table].get(record_id)
+            if record is None:
+                return jsonify({"error": "Not found"}), 404
+            return jsonify(record)
+
+        @app.route("/api/<table>/bulk-get", methods=["POST"])
+        def bulk_get(table):
+            ids = request.json.get("ids", [])
+            return jsonify({"records": [self.tables[table][str(i)] for i in ids if str(i) in self.tables[table]]})
+
+        @app.route("/api/<table>/bulk-upsert", methods=["POST"])
+        def bulk_upsert(table):
+            return jsonify({"upserted": self._upsert(table, request.json.get("records", []))})
+
+        return app
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self) -> "FakeCRMServer":
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+        self._server = make_server("127.0.0.1", 0, self.app, threaded=True)
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-crm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
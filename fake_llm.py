@@ -0,0 +1,146 @@
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+# (keyword, tool, tool input) entries the fake model uses to pick tool calls for a query
+DEFAULT_SCRIPT: List[Tuple[str, str, Dict[str, Any]]] = [
+    ("quot", "quotation", {"base_price": 50000, "urgency": "high", "customer_type": "vip"}),
+    ("lead", "lead_qualifier", {"deal_size": 75000, "urgency": "high", "past_behavior": "positive"}),
+    ("deal", "pipeline_manager", {"stage": "proposal_sent", "inactive_days": 20, "competitor_mentioned": True}),
+    ("follow", "followup", {"lead_context": {"name": "Alex"}, "last_interaction": "site visit"}),
+    ("coach", "sales_coach", "We lost the deal on price"),
+    ("search", "web_search", "crane rental rates"),
+    ("wiki", "wikipedia", "Tower crane")
+]
+
+class FakeQuotaError(Exception):
+    """What the fake model raises past its rate limit, shaped like a provider's HTTP 429."""
+
+    code = 429
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"429 RESOURCE_EXHAUSTED: quota exceeded, retry after {retry_after:.2f}s")
+        self.retry_after = retry_after
+
+# Estimated schema tokens per bound tool name, computed once
+_SCHEMA_TOKENS: Dict[str, int] = {}
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic stand-in for the Gemini chat model, for offline benchmarks and tests.
+    The first turn calls the tool whose keyword appears in the query (or answers directly);
+    once a tool result is in the conversation it returns a fenced Response JSON built from it.
+    Every call sleeps for `latency` seconds to simulate the model round trip.
+    With `rate_limit` set, calls beyond that many per `rate_window` seconds fail with a
+    FakeQuotaError (counted in `rejected`), like a provider enforcing a quota.
+    """
+
+    latency: float = 0.0
+    script: List[Tuple[str, str, Any]] = DEFAULT_SCRIPT
+    calls: int = 0
+    rate_limit: int = 0
+    rate_window: float = 1.0
+    rejected: int = 0
+    _accepted: Any = PrivateAttr(default_factory=deque)
+    _quota_lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def _check_quota(self) -> None:
+        if not self.rate_limit:
+            return
+        with self._quota_lock:
+            now = time.monotonic()
+            while self._accepted and self._accepted[0] <= now - self.rate_window:
+                self._accepted.popleft()
+            if len(self._accepted) >= self.rate_limit:
+                self.rejected += 1
+                raise FakeQuotaError(self._accepted[0] + self.rate_window - now)
+            self._accepted.append(now)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def bind_tools(self, tools: Any, **kwargs: Any):
+        return self.bind(tools=tools, **kwargs)
+
+    def _reply(self, messages: List[BaseMessage], tools: Optional[List[Any]] = None) -> AIMessage:
+        self.calls += 1
+        last = messages[-1]
+        if isinstance(last, ToolMessage):
+            # Follow the system prompt: use the tool's summary verbatim
+            tool_names = [call["name"] for m in messages if isinstance(m, AIMessage) for call in m.tool_calls]
+            answer = {"topic": "CRM", "summary": str(last.content), "source": [], "tools_used": tool_names}
+            try:
+                observation = json.loads(last.content)
+            except (TypeError, ValueError):
+                observation = None
+            if isinstance(observation, dict) and "summary" in observation:
+                answer["topic"] = observation.get("topic", answer["topic"])
+                answer["summary"] = observation["summary"]
+            return AIMessage(content=f"```json\n{json.dumps(answer)}\n```")
+
+        query = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+        # Every matching keyword becomes a tool call, so one turn can request several tools; like a real
+        # model, it can only call the tools bound to it
+        bound = {tool.name for tool in tools} if tools is not None else None
+        tool_calls = [
+            {"name": tool_name, "args": {"tool_input": tool_input}, "id": f"call_{self.calls}_{i}"}
+            for i, (keyword, tool_name, tool_input) in enumerate(self.script)
+            if keyword in str(query).lower() and (bound is None or tool_name in bound)
+        ]
+        if tool_calls:
+            return AIMessage(content="", tool_calls=tool_calls)
+        answer = {"topic": "General", "summary": f"Answer to: {query}", "source": [], "tools_used": []}
+        return AIMessage(content=json.dumps(answer))
+
+    def _with_usage(self, messages: List[BaseMessage], reply: AIMessage, tools: Optional[List[Any]] = None) -> AIMessage:
+        # Rough 4-characters-per-token estimate so token accounting has something to count;
+        # bound tool schemas are part of the prompt too
+        input_tokens = sum(len(str(m.content)) for m in messages) // 4
+        if tools:
+            from tool_selection import tool_schema_tokens
+
+            for tool in tools:
+                if tool.name not in _SCHEMA_TOKENS:
+                    _SCHEMA_TOKENS[tool.name] = tool_schema_tokens(tool)
+                input_tokens += _SCHEMA_TOKENS[tool.name]
+        output_tokens = (len(str(reply.content)) + len(json.dumps(reply.tool_calls))) // 4
+        reply.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens
+        }
+        return reply
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        self._check_quota()
+        if self.latency:
+            time.sleep(self.latency)
+        tools = kwargs.get("tools")
+        return ChatResult(generations=[ChatGeneration(message=self._with_usage(messages, self._reply(messages, tools), tools))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        self._check_quota()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        tools = kwargs.get("tools")
+        return ChatResult(generations=[ChatGeneration(message=self._with_usage(messages, self._reply(messages, tools), tools))])
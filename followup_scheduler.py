@@ -0,0 +1,416 @@
+import argparse
+import hashlib
+import heapq
+import json
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+from config import Config
+from record_writer import get_writer
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Follow-up lifecycle in the journal: pending -> sending (claimed by one worker) -> sent, back to
+# pending for a retry, or failed after max_attempts; cancelled is terminal
+PENDING, SENDING, SENT, FAILED, CANCELLED = "pending", "sending", "sent", "failed", "cancelled"
+
+FOLLOWUP_COLUMNS = ("id", "key", "channel", "recipient", "subject", "message", "payload", "due_at", "attempts")
+
+class FollowUpSender:
+    """
+    Delivers due follow-ups for one channel. Subclasses implement send(); override
+    send_batch() when the channel can deliver many follow-ups in one call.
+    """
+
+    def send(self, followup: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def send_batch(self, followups: List[Dict[str, Any]]) -> Dict[int, str]:
+        """Deliver follow-ups; returns {id: error} for the ones that failed."""
+        failures = {}
+        for followup in followups:
+            try:
+                self.send(followup)
+            except Exception as e:
+                failures[followup["id"]] = str(e)
+        return failures
+
+class LogSender(FollowUpSender):
+    """Logs each follow-up instead of delivering it, for development."""
+
+    def send(self, followup: Dict[str, Any]) -> None:
+        logger.info("Follow-up #%s to %s: %s", followup["id"], followup["recipient"], followup["subject"])
+
+class OutboxSender(FollowUpSender):
+    """Appends follow-ups to a JSON Lines outbox that an external mailer drains."""
+
+    def __init__(self, path: str):
+        settings = dict(Config.OUTPUT_WRITER)
+        settings.pop("write_jsonl")
+        self.writer = get_writer(path, "jsonl", **settings)
+
+    def send_batch(self, followups: List[Dict[str, Any]]) -> Dict[int, str]:
+        sent_at = datetime.now().isoformat(timespec="seconds")
+        for followup in followups:
+            self.writer.write({**followup, "sent_at": sent_at})
+        return {}
+
+class WebhookSender(FollowUpSender):
+    """POSTs each batch as {"followups": [...]} to `url`; a non-2xx response fails the whole batch."""
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        import requests
+
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def send_batch(self, followups: List[Dict[str, Any]]) -> Dict[int, str]:
+        response = self.session.post(self.url, json={"followups": followups}, timeout=self.timeout)
+        response.raise_for_status()
+        return {}
+
+def recipient_for(lead_context: Mapping[str, Any]) -> Optional[str]:
+    """Where a lead's follow-ups go: its email, else its lead_id, else None (a name is not an address)."""
+    recipient = lead_context.get("email") or lead_context.get("lead_id")
+    return str(recipient) if recipient else None
+
+def followup_key(channel: str, recipient: str, template_key: str, send_on: str, message: str = "") -> str:
+    """
+    Idempotency key allowing one follow-up per recipient, template, day and message on a
+    channel: asking again for the same message is a no-op, while a different one is scheduled.
+    """
+    digest = hashlib.sha1(message.encode("utf-8")).hexdigest()[:12]
+    return f"{channel}:{recipient}:{template_key}:{send_on}:{digest}"
+
+SENDER_TYPES = {
+    "log": LogSender,
+    "outbox": OutboxSender,
+    "webhook": WebhookSender
+}
+
+def build_senders(channels: Dict[str, Dict[str, Any]]) -> Dict[str, FollowUpSender]:
+    """Senders per channel from config, e.g. {"email": {"type": "outbox", "path": "outbox.jsonl"}}."""
+    senders = {}
+    for channel, spec in channels.items():
+        spec = dict(spec)
+        sender_type = spec.pop("type")
+        if sender_type not in SENDER_TYPES:
+            raise ValueError(f"Unknown follow-up sender '{sender_type}' for channel '{channel}'. Expected one of {list(SENDER_TYPES)}")
+        senders[channel] = SENDER_TYPES[sender_type](**spec)
+    return senders
+
+class FollowUpScheduler:
+    """
+    Pending follow-ups in a min-heap ordered by due time, journaled to SQLite.
+
+    Scheduling is one journal insert plus an O(log n) heap push; next_due() reads the top of
+    the heap and due() is an index range scan over the journal. A worker thread (start()) wakes when the earliest follow-up
+    is due, pops due ones in batches of `batch_size` and hands them to the sender for their
+    channel. Failed deliveries are retried with exponential backoff up to `max_attempts`.
+
+    Workers in several processes may share a journal (the Flask reloader, multi-worker
+    servers): each batch is claimed with one UPDATE from pending to sending before it is sent,
+    so only the worker that claimed a follow-up sends it. Once its heap has nothing due, a
+    worker also checks the journal (an index range scan) for follow-ups scheduled elsewhere.
+
+    The heap is rebuilt from the journal on startup, so nothing pending is lost across
+    restarts. Delivery is at-least-once: a follow-up claimed just before a crash, but not yet
+    marked sent, is sent again once its claim is `claim_timeout` seconds old.
+    """
+
+    def __init__(self, path: str, senders: Optional[Dict[str, FollowUpSender]] = None, settings: Optional[Dict[str, Any]] = None):
+        self.settings = settings or Config.FOLLOWUP_SCHEDULER
+        self.path = path
+        self.senders = senders if senders is not None else build_senders(self.settings["channels"])
+        self.batch_size = max(1, self.settings["batch_size"])
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS followups ("
+                "id INTEGER PRIMARY KEY, key TEXT UNIQUE, channel TEXT NOT NULL, recipient TEXT NOT NULL, "
+                "subject TEXT NOT NULL, message TEXT NOT NULL, payload TEXT, due_at REAL NOT NULL, "
+                "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT, "
+                "created_at REAL NOT NULL, sent_at REAL, claimed_at REAL)"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(followups)")}
+            if "claimed_at" not in columns:
+                # Journals written before claims were added
+                self._conn.execute("ALTER TABLE followups ADD COLUMN claimed_at REAL")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_followups_status_due ON followups (status, due_at)")
+            # Follow-ups claimed by a worker that never finished come due again when the claim expires
+            self._heap: List[Tuple[float, int]] = self._conn.execute(
+                "SELECT CASE WHEN status = ? THEN claimed_at + ? ELSE due_at END, id FROM followups WHERE status IN (?, ?)",
+                (SENDING, self.settings["claim_timeout"], PENDING, SENDING)
+            ).fetchall()
+        heapq.heapify(self._heap)
+
+    def _check_channel(self, channel: str) -> None:
+        if channel not in self.senders:
+            raise ValueError(f"Unknown follow-up channel '{channel}'. Expected one of {list(self.senders)}")
+
+    def _push(self, due_at: float, followup_id: int) -> None:
+        heapq.heappush(self._heap, (due_at, followup_id))
+        if self._heap[0][1] == followup_id:
+            # New earliest follow-up: let the worker shorten its sleep
+            self._wakeup.set()
+
+    def schedule(
+        self,
+        recipient: str,
+        subject: str,
+        message: str,
+        due_at: float,
+        channel: Optional[str] = None,
+        key: Optional[str] = None,
+        payload: Optional[Dict[str, Any]] = None
+    ) -> Tuple[int, bool]:
+        """
+        Schedule a follow-up at `due_at` (a Unix timestamp) and return (id, created). A `key`
+        makes scheduling idempotent: scheduling the same key again returns the existing id
+        with created False.
+        """
+        return self.schedule_many([{
+            "recipient": recipient,
+            "subject": subject,
+            "message": message,
+            "due_at": due_at,
+            "channel": channel,
+            "key": key,
+            "payload": payload
+        }])[0]
+
+    def schedule_many(self, followups: Iterable[Dict[str, Any]]) -> List[Tuple[int, bool]]:
+        """
+        Schedule many follow-ups (dicts with schedule()'s arguments) in one journal transaction.
+        Returns (id, created) per follow-up, in order.
+        """
+        ids = []
+        added = []
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                for followup in followups:
+                    channel = followup.get("channel") or self.settings["default_channel"]
+                    self._check_channel(channel)
+                    key = followup.get("key")
+                    if key is not None:
+                        row = self._conn.execute("SELECT id FROM followups WHERE key = ?", (key,)).fetchone()
+                        if row is not None:
+                            ids.append((row[0], False))
+                            continue
+                    due_at = float(followup["due_at"])
+                    payload = followup.get("payload")
+                    followup_id = self._conn.execute(
+                        "INSERT INTO followups (key, channel, recipient, subject, message, payload, due_at, status, created_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            key, channel, str(followup["recipient"]), followup["subject"], followup["message"],
+                            json.dumps(payload) if payload is not None else None, due_at, PENDING, now
+                        )
+                    ).lastrowid
+                    added.append((due_at, followup_id))
+                    ids.append((followup_id, True))
+            # Only committed follow-ups enter the heap
+            for due_at, followup_id in added:
+                self._push(due_at, followup_id)
+        return ids
+
+    def cancel(self, followup_id: int) -> bool:
+        """Cancel a pending follow-up. Its heap entry is dropped lazily when it comes due."""
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "UPDATE followups SET status = ? WHERE id = ? AND status = ?", (CANCELLED, followup_id, PENDING)
+            ).rowcount > 0
+
+    def next_due(self) -> Optional[float]:
+        """Due time of the earliest pending follow-up, or None."""
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def due(self, now: Optional[float] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Pending follow-ups due at `now` (default: now), earliest first, without sending them."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(FOLLOWUP_COLUMNS)} FROM followups WHERE status = ? AND due_at <= ? ORDER BY due_at LIMIT ?",
+                (PENDING, time.time() if now is None else now, limit)
+            ).fetchall()
+        return [self._row_dict(row) for row in rows]
+
+    @staticmethod
+    def _row_dict(row: Tuple[Any, ...]) -> Dict[str, Any]:
+        followup = dict(zip(FOLLOWUP_COLUMNS, row))
+        followup["payload"] = json.loads(followup["payload"]) if followup["payload"] else None
+        return followup
+
+    def _pop_due(self, now: float) -> List[int]:
+        with self._lock:
+            ids: Dict[int, None] = {}
+            while self._heap and self._heap[0][0] <= now and len(ids) < self.batch_size:
+                ids[heapq.heappop(self._heap)[1]] = None
+            return list(ids)
+
+    def _refill(self, now: float) -> int:
+        """
+        Push follow-ups that are due in the journal but not in this process's heap: those
+        scheduled by other processes (other server workers, mail_merge) and expired claims.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT due_at, id FROM followups WHERE (status = ? AND due_at <= ?) "
+                "OR (status = ? AND claimed_at <= ?) LIMIT ?",
+                (PENDING, now, SENDING, now - self.settings["claim_timeout"], self.batch_size)
+            ).fetchall()
+            for due_at, followup_id in rows:
+                heapq.heappush(self._heap, (due_at, followup_id))
+        return len(rows)
+
+    def run_due(self, now: Optional[float] = None) -> int:
+        """Send every follow-up due at `now` (default: now), batch by batch. Returns the number sent."""
+        now = time.time() if now is None else now
+        sent = 0
+        while True:
+            ids = self._pop_due(now)
+            if not ids:
+                # The heap only holds what this process scheduled or loaded; check the journal too
+                if not self._refill(now):
+                    return sent
+                continue
+            sent += self._fire(ids)
+
+    def _fire(self, ids: List[int]) -> int:
+        claimed_at = time.time()
+        with self._lock, self._conn:
+            # The claim is a single UPDATE, so when several processes pop the same ids from their
+            # own heaps, each row goes to exactly one of them; the others drop it here
+            rows = self._conn.execute(
+                f"UPDATE followups SET status = ?, claimed_at = ? WHERE id IN ({', '.join('?' * len(ids))}) "
+                f"AND (status = ? OR (status = ? AND claimed_at <= ?)) RETURNING {', '.join(FOLLOWUP_COLUMNS)}",
+                [SENDING, claimed_at] + ids + [PENDING, SENDING, claimed_at - self.settings["claim_timeout"]]
+            ).fetchall()
+        by_channel: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            followup = self._row_dict(row)
+            by_channel.setdefault(followup["channel"], []).append(followup)
+
+        failures: Dict[int, str] = {}
+        for channel, followups in by_channel.items():
+            sender = self.senders.get(channel)
+            try:
+                if sender is None:
+                    raise ValueError(f"No sender configured for channel '{channel}'")
+                with span("followup", channel):
+                    failures.update(sender.send_batch(followups))
+            except Exception as e:
+                logger.warning("Sending %d follow-ups via %s failed: %s", len(followups), channel, e)
+                failures.update((followup["id"], str(e)) for followup in followups)
+
+        now = time.time()
+        attempts = {followup["id"]: followup["attempts"] + 1 for followups in by_channel.values() for followup in followups}
+        sent_ids = [(now, followup_id) for followup_id in attempts if followup_id not in failures]
+        retries = []
+        failed = []
+        for followup_id, error in failures.items():
+            if attempts[followup_id] >= self.settings["max_attempts"]:
+                failed.append((FAILED, error, followup_id))
+            else:
+                retry_at = now + self.settings["retry_delay"] * 2 ** (attempts[followup_id] - 1)
+                retries.append((retry_at, error, followup_id))
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(f"UPDATE followups SET status = '{SENT}', sent_at = ?, attempts = attempts + 1 WHERE id = ?", sent_ids)
+                self._conn.executemany("UPDATE followups SET status = ?, last_error = ?, attempts = attempts + 1 WHERE id = ?", failed)
+                self._conn.executemany(f"UPDATE followups SET status = '{PENDING}', due_at = ?, last_error = ?, attempts = attempts + 1 WHERE id = ?", retries)
+            for retry_at, _, followup_id in retries:
+                self._push(retry_at, followup_id)
+        return len(sent_ids)
+
+    def start(self) -> "FollowUpScheduler":
+        """Send due follow-ups from a background thread until stop()."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="followup-scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_due()
+            except Exception:
+                logger.exception("Follow-up scheduler pass failed")
+            next_due = self.next_due()
+            delay = self.settings["poll_interval"]
+            if next_due is not None:
+                delay = min(delay, max(0.0, next_due - time.time()))
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM followups GROUP BY status").fetchall())
+            next_due = self._heap[0][0] if self._heap else None
+        return {"path": self.path, **{status: counts.get(status, 0) for status in (PENDING, SENDING, SENT, FAILED, CANCELLED)}, "next_due": next_due}
+
+_scheduler: Optional[FollowUpScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def get_followup_scheduler() -> FollowUpScheduler:
+    """Shared scheduler at Config.FOLLOWUP_SCHEDULER["path"], loaded from its journal on first use."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = FollowUpScheduler(Config.FOLLOWUP_SCHEDULER["path"])
+    return _scheduler
+
+def start_followup_worker() -> Optional[FollowUpScheduler]:
+    """Start sending due follow-ups in this process, if the scheduler and its worker are enabled."""
+    settings = Config.FOLLOWUP_SCHEDULER
+    if not (settings["enabled"] and settings["run_worker"]):
+        return None
+    return get_followup_scheduler().start()
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description="Follow-up scheduler")
+    subcommands = arg_parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("run", help="Send follow-ups as they come due (runs until interrupted)")
+    subcommands.add_parser("stats", help="Show follow-up counts by status")
+    due_parser = subcommands.add_parser("due", help="List follow-ups that are due now")
+    due_parser.add_argument("--limit", type=int, default=20)
+    args = arg_parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    scheduler = get_followup_scheduler()
+    if args.command == "run":
+        scheduler.start()
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            scheduler.stop()
+    elif args.command == "stats":
+        print(scheduler.stats())
+    else:
+        for followup in scheduler.due(limit=args.limit):
+            print(json.dumps(followup))
+
+if __name__ == "__main__":
+    main()
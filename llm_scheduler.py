@@ -0,0 +1,341 @@
+import asyncio
+import heapq
+import itertools
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, TypeVar
+from config import Config
+import tracing
+
+# Client-side admission control for model calls: token buckets for requests and tokens per minute,
+# strict priority lanes, and a concurrency limit that halves on quota errors and creeps back up.
+
+T = TypeVar("T")
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+_lane: ContextVar[str] = ContextVar("crm_llm_lane", default=INTERACTIVE)
+
+@contextmanager
+def llm_priority(lane: str) -> Iterator[None]:
+    """Run the model calls made inside the block in `lane`, e.g. `with llm_priority(BATCH): ...`."""
+    token = _lane.set(lane)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+def current_lane() -> str:
+    return _lane.get()
+
+class LLMQueueTimeout(TimeoutError):
+    """A model call waited longer than `max_queue_wait` for admission."""
+
+_RETRY_AFTER = re.compile(r"retry[_ -]?(?:after|delay)[^0-9]{0,20}(\d+(?:\.\d+)?)", re.IGNORECASE)
+
+RATE_LIMIT_ERRORS = ("ResourceExhausted", "RateLimitError", "TooManyRequests")
+
+def is_rate_limit_error(error: Optional[BaseException]) -> bool:
+    """Quota errors: Gemini's ResourceExhausted, or an exception (or its cause) carrying HTTP status 429."""
+    while error is not None:
+        if type(error).__name__ in RATE_LIMIT_ERRORS:
+            return True
+        for attribute in ("code", "status_code"):
+            if getattr(error, attribute, None) == 429:
+                return True
+        error = error.__cause__
+    return False
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """The server's suggested delay in seconds, when the error carries one."""
+    value = getattr(error, "retry_after", None)
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _RETRY_AFTER.search(str(error))
+    return float(match.group(1)) if match else None
+
+class TokenBucket:
+    """Refills at `per_minute / 60` per second up to `capacity`. Balances may go negative after
+    a call uses more than estimated; later calls then wait for the debt to refill."""
+
+    __slots__ = ("rate", "capacity", "level", "updated")
+
+    def __init__(self, per_minute: float, capacity: float):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, capacity)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        # A call larger than the whole bucket only waits for a full bucket
+        needed = min(amount, self.capacity)
+        return 0.0 if self.level >= needed else (needed - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.level -= amount
+
+    def drain(self, now: float) -> None:
+        self._refill(now)
+        self.level = min(self.level, 0.0)
+
+class _Ticket:
+    __slots__ = ("priority", "seq", "lane", "tokens", "admitted", "cancelled", "wake")
+
+    def __init__(self, priority: int, seq: int, lane: str, tokens: int, wake: Callable[[], None]):
+        self.priority = priority
+        self.seq = seq
+        self.lane = lane
+        self.tokens = tokens
+        self.admitted = False
+        self.cancelled = False
+        self.wake = wake
+
+    def __lt__(self, other: "_Ticket") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+class LLMScheduler:
+    """
+    Admits model calls in priority order (then arrival order) when the concurrency limit,
+    the requests-per-minute bucket and the tokens-per-minute bucket all allow. Lower lane
+    priorities go first, so interactive calls never wait behind queued batch work.
+
+    The concurrency limit is adaptive (AIMD): a quota error halves it, pauses admissions for
+    the server's retry delay (or an exponential backoff) and empties the request bucket; every
+    success raises it by 1/limit, back up to `max_concurrency`. Calls that hit a quota error
+    are retried up to `max_retries` times, keeping their place at the front of their lane.
+    """
+
+    def __init__(self, settings: Dict[str, Any]):
+        self.settings = settings
+        self.lanes: Dict[str, int] = dict(settings["lanes"])
+        self.max_concurrency = settings["max_concurrency"]
+        self.min_concurrency = settings["min_concurrency"]
+        self.max_queue_wait = settings["max_queue_wait"]
+        self.max_retries = settings["max_retries"]
+        burst = settings["burst_seconds"] / 60.0
+        self._requests = TokenBucket(settings["requests_per_minute"], settings["requests_per_minute"] * burst)
+        self._tokens = TokenBucket(settings["tokens_per_minute"], settings["tokens_per_minute"] * burst)
+        self._limit = float(self.max_concurrency)
+        self._in_flight = 0
+        self._cooldown_until = 0.0
+        self._backoff = 0
+        self._queue: List[_Ticket] = []
+        self._depth: Dict[str, int] = {lane: 0 for lane in self.lanes}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._counts = {"admitted": 0, "rate_limited": 0, "retried": 0, "timed_out": 0, "cancelled": 0}
+        self._publish()
+
+    # --- Admission ---
+
+    def _publish(self) -> None:
+        # Lock held
+        if not tracing.enabled():
+            return
+        for lane, depth in self._depth.items():
+            tracing.LLM_QUEUE_DEPTH.set(depth, lane=lane)
+        tracing.LLM_CONCURRENCY_LIMIT.set(int(self._limit))
+        tracing.LLM_IN_FLIGHT.set(self._in_flight)
+
+    def _dispatch(self, now: float) -> Optional[float]:
+        """Admit queued tickets while limits allow; returns how long until the head could be admitted,
+        or None when only a finishing call can make room. Lock held."""
+        while self._queue:
+            ticket = self._queue[0]
+            if ticket.cancelled:
+                heapq.heappop(self._queue)
+                continue
+            if now < self._cooldown_until:
+                return self._cooldown_until - now
+            if self._in_flight >= int(self._limit):
+                return None
+            wait = max(self._requests.wait_time(1, now), self._tokens.wait_time(ticket.tokens, now))
+            if wait > 0:
+                return wait
+            heapq.heappop(self._queue)
+            self._requests.take(1)
+            self._tokens.take(ticket.tokens)
+            self._in_flight += 1
+            self._depth[ticket.lane] -= 1
+            self._counts["admitted"] += 1
+            ticket.admitted = True
+            ticket.wake()
+        return None
+
+    def _enqueue(self, lane: str, tokens: int, seq: Optional[int], wake: Callable[[], None]) -> _Ticket:
+        if lane not in self.lanes:
+            raise ValueError(f"Unknown LLM lane '{lane}'. Expected one of {list(self.lanes)}")
+        ticket = _Ticket(self.lanes[lane], next(self._seq) if seq is None else seq, lane, max(1, tokens), wake)
+        with self._lock:
+            heapq.heappush(self._queue, ticket)
+            self._depth[lane] += 1
+            self._dispatch(time.monotonic())
+            self._publish()
+        return ticket
+
+    def _poll(self, ticket: _Ticket) -> Optional[float]:
+        with self._lock:
+            if ticket.admitted:
+                return 0.0
+            delay = self._dispatch(time.monotonic())
+            self._publish()
+            return 0.0 if ticket.admitted else delay
+
+    def _cancel(self, ticket: _Ticket, outcome: str) -> None:
+        # The waiter gave up (timed out or was cancelled): drop its ticket, or hand back the slot
+        # if it was admitted just as the wait ended, so no slot is held by a call that never runs
+        with self._lock:
+            if ticket.admitted:
+                self._in_flight -= 1
+                self._dispatch(time.monotonic())
+            else:
+                ticket.cancelled = True
+                self._depth[ticket.lane] -= 1
+            self._counts[outcome] += 1
+            self._publish()
+
+    def _timeout(self, lane: str, waited: float) -> LLMQueueTimeout:
+        return LLMQueueTimeout(f"Model call in lane '{lane}' was not admitted within {waited:.1f} seconds")
+
+    def acquire(self, tokens: int, lane: Optional[str] = None, seq: Optional[int] = None) -> _Ticket:
+        """Block until a call of about `tokens` tokens may start; pair with release()."""
+        lane = lane or current_lane()
+        event = threading.Event()
+        ticket = self._enqueue(lane, tokens, seq, event.set)
+        deadline = time.monotonic() + self.max_queue_wait
+        with tracing.span("llm_queue", lane):
+            try:
+                while True:
+                    delay = self._poll(ticket)
+                    if delay == 0.0:
+                        return ticket
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self._timeout(lane, self.max_queue_wait)
+                    event.wait(remaining if delay is None else min(delay, remaining))
+                    event.clear()
+            except BaseException as e:
+                self._cancel(ticket, "timed_out" if isinstance(e, LLMQueueTimeout) else "cancelled")
+                raise
+
+    async def aacquire(self, tokens: int, lane: Optional[str] = None, seq: Optional[int] = None) -> _Ticket:
+        """acquire() for coroutines: waits on the event loop rather than blocking a thread."""
+        lane = lane or current_lane()
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        ticket = self._enqueue(lane, tokens, seq, lambda: loop.call_soon_threadsafe(event.set))
+        deadline = time.monotonic() + self.max_queue_wait
+        with tracing.span("llm_queue", lane):
+            try:
+                while True:
+                    delay = self._poll(ticket)
+                    if delay == 0.0:
+                        return ticket
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self._timeout(lane, self.max_queue_wait)
+                    try:
+                        await asyncio.wait_for(event.wait(), remaining if delay is None else min(delay, remaining))
+                    except asyncio.TimeoutError:
+                        pass
+                    event.clear()
+            except BaseException as e:
+                # Includes CancelledError, e.g. from asyncio.wait_for around the whole request
+                self._cancel(ticket, "timed_out" if isinstance(e, LLMQueueTimeout) else "cancelled")
+                raise
+
+    def release(self, ticket: _Ticket, used_tokens: Optional[int] = None, error: Optional[BaseException] = None) -> None:
+        """Finish an admitted call: reconcile its token estimate and adapt to how it went."""
+        with self._lock:
+            now = time.monotonic()
+            self._in_flight -= 1
+            if used_tokens is not None:
+                self._tokens.take(used_tokens - ticket.tokens)
+            if error is not None and is_rate_limit_error(error):
+                self._counts["rate_limited"] += 1
+                self._limit = max(float(self.min_concurrency), self._limit / 2)
+                self._backoff += 1
+                delay = retry_after(error)
+                if delay is None:
+                    delay = min(self.settings["max_backoff"], self.settings["base_backoff"] * 2 ** (self._backoff - 1))
+                self._cooldown_until = max(self._cooldown_until, now + delay)
+                self._requests.drain(now)
+                if tracing.enabled():
+                    tracing.LLM_RATE_LIMITED.inc(lane=ticket.lane)
+            elif error is None:
+                self._backoff = 0
+                self._limit = min(float(self.max_concurrency), self._limit + 1 / self._limit)
+            self._dispatch(now)
+            self._publish()
+
+    # --- Calls ---
+
+    def _should_retry(self, error: BaseException, attempt: int) -> bool:
+        if attempt < self.max_retries and is_rate_limit_error(error):
+            with self._lock:
+                self._counts["retried"] += 1
+            return True
+        return False
+
+    def call(self, fn: Callable[[], T], tokens: int, used_tokens: Callable[[T], Optional[int]] = lambda result: None) -> T:
+        """Run `fn` once admitted, retrying quota errors ahead of later arrivals in the same lane."""
+        lane = current_lane()
+        seq = next(self._seq)
+        for attempt in itertools.count():
+            ticket = self.acquire(tokens, lane, seq)
+            try:
+                result = fn()
+            except BaseException as e:
+                self.release(ticket, error=e)
+                if not self._should_retry(e, attempt):
+                    raise
+                continue
+            self.release(ticket, used_tokens(result))
+            return result
+
+    async def acall(self, fn: Callable[[], Awaitable[T]], tokens: int, used_tokens: Callable[[T], Optional[int]] = lambda result: None) -> T:
+        lane = current_lane()
+        seq = next(self._seq)
+        for attempt in itertools.count():
+            ticket = await self.aacquire(tokens, lane, seq)
+            try:
+                result = await fn()
+            except BaseException as e:
+                self.release(ticket, error=e)
+                if not self._should_retry(e, attempt):
+                    raise
+                continue
+            self.release(ticket, used_tokens(result))
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "queued": dict(self._depth),
+                "in_flight": self._in_flight,
+                "concurrency_limit": int(self._limit),
+                "cooldown_s": round(max(0.0, self._cooldown_until - now), 3),
+                **self._counts
+            }
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def get_llm_scheduler() -> LLMScheduler:
+    """Process-wide scheduler shared by every rate-limited model, created on first use."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler(Config.LLM_SCHEDULER)
+    return _scheduler
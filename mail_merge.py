@@ -0,0 +1,198 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, Mapping, Optional, Tuple
+from config import Config
+from compiled_config import get_snapshot
+from followup_scheduler import followup_key, get_followup_scheduler, recipient_for
+from records import iter_records
+from templating import CompiledTemplate
+
+# Columns of the CSV output (and keys of each JSONL record)
+OUTPUT_FIELDS = ("index", "recipient", "subject", "message", "send_on")
+
+OUTPUT_FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+class _BlankDefaults(dict):
+    # Ad-hoc campaign templates may name any contact column; missing ones render empty
+    def __missing__(self, key: str) -> str:
+        return ""
+
+def compile_campaign(
+    template_key: str = "general",
+    template: Optional[str] = None,
+    subject: Optional[str] = None,
+    delay_days: Optional[int] = None
+) -> Tuple[CompiledTemplate, str, int]:
+    """
+    The compiled message template, subject and delay for a campaign: a configured follow-up
+    template by key, or an ad-hoc `template` string that may use any contact field.
+    """
+    if template is not None:
+        delay_days = delay_days if delay_days is not None else 0
+        return CompiledTemplate(template, constants={"delay_days": delay_days}), subject or "Following up", delay_days
+    snapshot = get_snapshot()
+    if template_key not in snapshot.followup_templates:
+        raise ValueError(f"Unknown follow-up template '{template_key}'. Expected one of {list(snapshot.followup_templates)}")
+    template_config = snapshot.followup_templates[template_key]
+    compiled = snapshot.followup_messages[template_key]
+    if delay_days is not None and delay_days != template_config["delay_days"]:
+        compiled = CompiledTemplate(compiled.source, compiled.fields, {"delay_days": delay_days})
+    return compiled, subject or template_config["subject"], template_config["delay_days"] if delay_days is None else delay_days
+
+def render_messages(
+    contacts: Iterable[Mapping[str, Any]],
+    template_key: str = "general",
+    template: Optional[str] = None,
+    subject: Optional[str] = None,
+    interaction_type: str = "last interaction",
+    delay_days: Optional[int] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily render one follow-up per contact (a lead context dict with name, custom_message,
+    email, ...). The template is compiled once for the whole campaign; no LLM is involved.
+    """
+    compiled, subject, delay_days = compile_campaign(template_key, template, subject, delay_days)
+    send_on = (datetime.now() + timedelta(days=delay_days)).strftime("%Y-%m-%d")
+    render = compiled.render
+    for index, contact in enumerate(contacts):
+        if template is not None:
+            values = _BlankDefaults(interaction_type=interaction_type, custom_message="", name="Valued Customer")
+            values.update((key, value) for key, value in contact.items() if value is not None)
+        else:
+            values = {
+                "name": contact.get("name") or "Valued Customer",
+                "custom_message": contact.get("custom_message") or "",
+                "interaction_type": contact.get("interaction_type") or interaction_type
+            }
+        yield {
+            "index": index,
+            "recipient": recipient_for(contact),
+            "subject": subject,
+            "message": render(values),
+            "send_on": send_on
+        }
+
+def campaign_template_key(template_key: str, template: Optional[str] = None) -> str:
+    """The template part of follow-up keys: the configured key, or a digest of ad-hoc template text."""
+    if template is None:
+        return template_key
+    return "custom-" + hashlib.sha1(template.encode("utf-8")).hexdigest()[:12]
+
+def schedule_messages(
+    messages: Iterable[Dict[str, Any]],
+    template_key: str,
+    channel: Optional[str] = None,
+    chunk_size: int = 1000,
+    counts: Optional[Dict[str, int]] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Pass messages through while scheduling them with the follow-up scheduler, `chunk_size` per
+    transaction. Messages without a recipient (no email or lead_id) are passed through unscheduled.
+    `counts`, if given, is updated with how many were scheduled, already scheduled or skipped.
+    """
+    counts = counts if counts is not None else {}
+    for name in ("scheduled", "already_scheduled", "no_recipient"):
+        counts.setdefault(name, 0)
+    scheduler = get_followup_scheduler()
+    channel = channel or Config.FOLLOWUP_SCHEDULER["default_channel"]
+    # Due at the current time of day on each message's send_on date, like followup_tool
+    due_at: Dict[str, float] = {}
+    messages = iter(messages)
+    while True:
+        chunk = list(islice(messages, chunk_size))
+        if not chunk:
+            return
+        addressed = [message for message in chunk if message["recipient"] is not None]
+        counts["no_recipient"] += len(chunk) - len(addressed)
+        for message in addressed:
+            if message["send_on"] not in due_at:
+                day = date.fromisoformat(message["send_on"])
+                due_at[message["send_on"]] = datetime.combine(day, datetime.now().time()).timestamp()
+        results = scheduler.schedule_many(
+            {
+                "recipient": message["recipient"],
+                "subject": message["subject"],
+                "message": message["message"],
+                "due_at": due_at[message["send_on"]],
+                "channel": channel,
+                "key": followup_key(channel, message["recipient"], template_key, message["send_on"], message["message"])
+            }
+            for message in addressed
+        )
+        created = sum(1 for _, is_new in results if is_new)
+        counts["scheduled"] += created
+        counts["already_scheduled"] += len(results) - created
+        yield from chunk
+
+def write_messages(messages: Iterable[Dict[str, Any]], path: str) -> int:
+    """Stream messages to a .csv or .jsonl file, one row at a time. Returns the number written."""
+    output_format = OUTPUT_FORMATS.get(os.path.splitext(path)[1].lower())
+    if output_format is None:
+        raise ValueError(f"Unsupported output file '{path}'. Expected one of {sorted(OUTPUT_FORMATS)}")
+    written = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if output_format == "csv":
+            writer = csv.writer(f)
+            writer.writerow(OUTPUT_FIELDS)
+            for message in messages:
+                writer.writerow([message[field] for field in OUTPUT_FIELDS])
+                written += 1
+        else:
+            for message in messages:
+                f.write(json.dumps(message, ensure_ascii=False) + "\n")
+                written += 1
+    return written
+
+def run_campaign(
+    contacts: Any,
+    output_path: str,
+    template_key: str = "general",
+    template: Optional[str] = None,
+    subject: Optional[str] = None,
+    interaction_type: str = "last interaction",
+    schedule: bool = False,
+    channel: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Mail-merge a campaign: contacts (an iterable of dicts or a CSV/JSONL path) are streamed
+    through rendering (and optionally scheduling) into `output_path`, so memory stays flat
+    however many contacts there are.
+    """
+    start = time.perf_counter()
+    messages = render_messages(iter_records(contacts), template_key, template, subject, interaction_type)
+    counts = {"scheduled": 0, "already_scheduled": 0, "no_recipient": 0}
+    if schedule:
+        messages = schedule_messages(messages, campaign_template_key(template_key, template), channel, counts=counts)
+    written = write_messages(messages, output_path)
+    return {
+        "messages": written,
+        "output": output_path,
+        **counts,
+        "seconds": round(time.perf_counter() - start, 3)
+    }
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description="Render a follow-up campaign for a list of contacts")
+    arg_parser.add_argument("contacts", help="CSV or JSONL file of contacts (name, email, custom_message, ...)")
+    arg_parser.add_argument("output", help="Where to write the messages (.csv or .jsonl)")
+    arg_parser.add_argument("--template", default="general", help="Follow-up template key from Config.FOLLOWUP_TEMPLATES")
+    arg_parser.add_argument("--text", help="Ad-hoc template text instead, e.g. 'Hi {name}, ...' (any contact column)")
+    arg_parser.add_argument("--subject", help="Subject line (defaults to the template's)")
+    arg_parser.add_argument("--interaction", default="last interaction", help="Value for {interaction_type}")
+    arg_parser.add_argument("--schedule", action="store_true", help="Also schedule every message with the follow-up scheduler")
+    arg_parser.add_argument("--channel", help="Channel to schedule on (defaults to FOLLOWUP_SCHEDULER['default_channel'])")
+    args = arg_parser.parse_args()
+
+    result = run_campaign(
+        args.contacts, args.output, args.template, args.text, args.subject, args.interaction, args.schedule, args.channel
+    )
+    print(json.dumps(result))
+
+if __name__ == "__main__":
+    main()
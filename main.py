@@ -1,18 +1,18 @@
 from dotenv import load_dotenv
-from langchain_core.prompts.chat import ChatPromptTemplate
 from pydantic import BaseModel
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage
 import os
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import PydanticOutputParser, StrOutputParser
-from langchain.agents import create_tool_calling_agent, AgentExecutor
-from tools import search_tool, wiki_tool, save_tool, lead_qualifier, followup, quotation, pipeline_manager, sales_coach
-from typing import List
+from tools import TOOLS
+from typing import List, Dict, Any, Iterator, Optional
+from contextlib import contextmanager
+from functools import lru_cache
+from config import Config
+from cache import ResponseCache
+from memory import ConversationMemory, make_llm_summarizer
+from response_parsing import parse_response
+from tracing import instrument_tool, record_tool_selection, run_config, span
 import json
-import re
-
-tools = [search_tool, wiki_tool, save_tool, lead_qualifier, followup, quotation, pipeline_manager, sales_coach]
+import queue
+import threading
 
 load_dotenv()
 
@@ -22,16 +22,7 @@ class Response(BaseModel):
     source: List[str]
     tools_used: List[str]
 
-#llm2 = ChatOpenAI(model = "gpt-40-min")
-#llm = ChatAnthropic(model="claude-3-5-sonnet-20241022")
-llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash-lite")
-parser = PydanticOutputParser(pydantic_object=Response)
-
-prompt = ChatPromptTemplate.from_messages(
-  [
-      (
-          "system",
-          """
+SYSTEM_PROMPT = """
 You are Project Pro, the AI assistant for ASP Crane Services.
 Your primary role is to provide excellent and professional customer service, manage service requests using the information and tools available to you, and never reveal details about your internal processes or tools.
 
@@ -50,75 +41,223 @@ If the tool returns a dictionary with a 'summary' key, always use the value of '
 Never say you cannot access the internet if the tool returns any output.
 Wrap the output in this format and provide no other text:
 {format_instructions}
-          """,
-      ),
-      ("placeholder", "{chat_history}"),
-      ("human", "{query}"),
-      ("placeholder", "{agent_scratchpad}"),
-  ]
-).partial(format_instructions=parser.get_format_instructions())
-
-tools = [search_tool, wiki_tool, save_tool, lead_qualifier, followup, quotation, pipeline_manager, sales_coach]
-agent = create_tool_calling_agent(
-  llm=llm,
-  prompt=prompt,
-  tools=tools
-)
-
-def clean_json_output(output_str):
-    # Remove Markdown code block if present
-    output_str = re.sub(r"^```(?:json)?\s*([\s\S]*?)\s*```$", r"\1", output_str.strip(), flags=re.MULTILINE)
-    # Replace single quotes with double quotes (be careful: this is naive)
-    if output_str and output_str[0] in ["'", "{"] and "'" in output_str:
-        output_str = output_str.replace("'", '"')
-    return output_str
-
-def ensure_response_schema(output_str):
+"""
+
+for tool in TOOLS:
+    instrument_tool(tool)
+
+RESPONSE_FIELDS = tuple(Response.model_fields)
+
+# The Gemini client, the prompt template and the agent runtime are the slowest imports in the app,
+# so they are imported and built on first use; importing main (or app) stays cheap for cold starts.
+
+@lru_cache(maxsize=None)
+def get_llm() -> Any:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    #llm2 = ChatOpenAI(model = "gpt-40-min")
+    #llm = ChatAnthropic(model="claude-3-5-sonnet-20241022")
+    if not Config.LLM_SCHEDULER["enabled"]:
+        return ChatGoogleGenerativeAI(model="gemini-2.0-flash-lite")
+
+    from rate_limited_llm import rate_limited
+
+    # Quota errors are retried by the scheduler, which also slows everyone else down, instead of per call
+    return rate_limited(ChatGoogleGenerativeAI(model="gemini-2.0-flash-lite", max_retries=Config.LLM_SCHEDULER["provider_retries"]))
+
+@lru_cache(maxsize=None)
+def get_prompt() -> Any:
+    from langchain_core.messages import SystemMessage
+    from langchain_core.output_parsers import PydanticOutputParser
+    from langchain_core.prompts.chat import ChatPromptTemplate
+
+    # Rendered once so the format instructions are not regenerated per request
+    format_instructions = PydanticOutputParser(pydantic_object=Response).get_format_instructions()
+    system_message = SystemMessage(content=SYSTEM_PROMPT.format(format_instructions=format_instructions))
+    return ChatPromptTemplate.from_messages(
+      [
+          system_message,
+          ("placeholder", "{chat_history}"),
+          ("human", "{query}"),
+          ("placeholder", "{agent_scratchpad}"),
+      ]
+    )
+
+def build_agent(chat_model: Any, tools: Optional[List[Any]] = None):
+    """
+    Build the tool-calling agent around any chat model (e.g. a fake model for offline benchmarks).
+    Without explicit `tools`, and with Config.TOOL_SELECTION enabled, each model call is bound
+    only to the tools selected for its query rather than to all of TOOLS.
+    """
+    from langchain.agents import create_tool_calling_agent
+
+    if tools is None and Config.TOOL_SELECTION["enabled"]:
+        return build_tool_selecting_agent(chat_model)
+    return create_tool_calling_agent(
+      llm=chat_model,
+      prompt=get_prompt(),
+      tools=TOOLS if tools is None else tools
+    )
+
+def build_tool_selecting_agent(chat_model: Any) -> Any:
+    """An agent that routes each call to an agent bound to the query's tool subset, built once per subset."""
+    from langchain_core.runnables import RunnableLambda
+    from tool_selection import get_tool_selector
+
+    selector = get_tool_selector()
+    agents: Dict[Any, Any] = {}
+    lock = threading.Lock()
+
+    def agent_for(inputs: Dict[str, Any]) -> Any:
+        selection = selector.select(str(inputs.get("query", "")))
+        record_tool_selection(list(selection.names), selection.fallback, selection.tokens_saved)
+        agent = agents.get(selection.names)
+        if agent is None:
+            with lock:
+                agent = agents.get(selection.names)
+                if agent is None:
+                    agent = agents[selection.names] = build_agent(chat_model, selector.tools_for(selection))
+        # A Runnable returned from a RunnableLambda is invoked (or streamed) with the same inputs
+        return agent
+
+    return RunnableLambda(agent_for, name="tool_selecting_agent")
+
+@lru_cache(maxsize=None)
+def get_agent() -> Any:
+    """The Gemini-backed agent, built on first use."""
+    return build_agent(get_llm())
+
+_LAZY_ATTRIBUTES = {"llm": get_llm, "prompt": get_prompt, "agent": get_agent}
+
+def __getattr__(name: str) -> Any:
+    # `main.llm`, `main.prompt` and `main.agent` still work, but are only built when first accessed
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def build_agent_executor(verbose: bool = False, tool_agent: Any = None) -> Any:
+    from agent_executor import CRMAgentExecutor
+
+    return_direct = Config.RETURN_DIRECT
+    parallel = Config.PARALLEL_TOOLS
+    return CRMAgentExecutor(
+        agent=tool_agent or get_agent(),
+        tools=TOOLS,
+        verbose=verbose,
+        direct_tools=frozenset(return_direct["tools"]) if return_direct["enabled"] else frozenset(),
+        parallel_tools=parallel["enabled"],
+        blocking_tools=frozenset(parallel["blocking_tools"]),
+        tool_timeouts=parallel["timeouts"],
+        default_tool_timeout=parallel["default_timeout"]
+    )
+
+class AgentExecutorPool:
+    """
+    Pool of up to `size` long-lived AgentExecutors shared across threads.
+    Executors are built on demand, the first time every pooled one is busy, so an idle
+    server never pays for them; each request borrows one for the duration of its call
+    and gets its own copy of the inputs, so no state leaks between requests. When all `size`
+    are busy, a request waits up to `timeout` seconds for one and then raises queue.Empty.
+    """
+
+    def __init__(
+        self,
+        size: int = Config.AGENT_POOL_SIZE,
+        verbose: bool = False,
+        tool_agent: Any = None,
+        timeout: Optional[float] = Config.AGENT_POOL_TIMEOUT
+    ):
+        self.size = max(1, size)
+        self.verbose = verbose
+        self.tool_agent = tool_agent
+        self.timeout = timeout
+        self._executors: "queue.Queue[Any]" = queue.Queue(maxsize=self.size)
+        self._built = 0
+        self._lock = threading.Lock()
+
+    def _checkout(self, timeout: Optional[float]) -> Any:
+        try:
+            return self._executors.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            build = self._built < self.size
+            if build:
+                self._built += 1
+        if not build:
+            return self._executors.get(timeout=timeout)
+        try:
+            return build_agent_executor(verbose=self.verbose, tool_agent=self.tool_agent)
+        except Exception:
+            with self._lock:
+                self._built -= 1
+            raise
+
+    @contextmanager
+    def acquire(self, timeout: Optional[float] = None) -> Iterator[Any]:
+        """Borrow an executor, waiting up to `timeout` (default: the pool's) seconds; raises queue.Empty."""
+        executor = self._checkout(self.timeout if timeout is None else timeout)
+        try:
+            yield executor
+        finally:
+            self._executors.put(executor)
+
+    def invoke(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        with self.acquire() as executor, span("agent", "executor"):
+            return executor.invoke(dict(inputs), config=run_config())
+
+def build_conversation_memory() -> ConversationMemory:
+    """Session history store for the prompt's {chat_history} slot, summarizing with the LLM if configured."""
+    summarizer = make_llm_summarizer(get_llm()) if Config.CONVERSATION_MEMORY["summarizer"] == "llm" else None
+    return ConversationMemory(summarizer=summarizer)
+
+def warmup() -> None:
+    """Import and build the agent and render the prompt once, so the first request does not pay for it."""
+    get_agent()
+    get_prompt().invoke({"query": "warmup", "chat_history": [], "agent_scratchpad": []})
+
+def start_warmup(mode: str = Config.AGENT_WARMUP) -> Optional[threading.Thread]:
     """
-    Ensures the output string is a JSON object with all required fields for the Response schema.
-    If fields are missing, fills them with sensible defaults.
+    Warm up per Config.AGENT_WARMUP: "startup" blocks until done, "background" (the default)
+    warms up in a daemon thread so the server starts accepting requests immediately, "off" skips it.
     """
-    try:
-        data = json.loads(output_str)
-        if not isinstance(data, dict):
-            raise ValueError("Output is not a dict")
-    except Exception:
-        # If not valid JSON, treat the whole output as summary
-        data = {}
-
-    # Fill missing fields with defaults
-    data.setdefault("topic", "General")
-    data.setdefault("summary", output_str if "summary" not in data else data["summary"])
-    data.setdefault("source", [])
-    data.setdefault("tools_used", [])
-
-    # Ensure correct types
-    if not isinstance(data["source"], list):
-        data["source"] = [str(data["source"])]
-    if not isinstance(data["tools_used"], list):
-        data["tools_used"] = [str(data["tools_used"])]
-
-    return json.dumps(data)
+    if mode == "startup":
+        warmup()
+    elif mode == "background":
+        thread = threading.Thread(target=warmup, name="agent-warmup", daemon=True)
+        thread.start()
+        return thread
+    elif mode != "off":
+        raise ValueError(f"Unknown AGENT_WARMUP mode '{mode}'. Expected 'background', 'startup' or 'off'")
+    return None
+
+def parse_agent_output(output_str: str) -> Response:
+    """Extract the Response JSON from agent output, repairing common model formatting errors."""
+    with span("parse", "agent_output"):
+        return parse_response(output_str, Response)
 
 if __name__ == "__main__":
+    warmup()
+    executor_pool = AgentExecutorPool(size=1, verbose=True)
+    response_cache = ResponseCache()
+    conversation_memory = build_conversation_memory()
+    session_id = "cli"
     i = -1
     while i < 0:
-        agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
         query = input("What can i help you with? ")
-        raw_response = agent_executor.invoke({"query": query})
+        chat_history = conversation_memory.history(session_id)
+        # Follow-up questions depend on the conversation, so only stateless turns use the cache
+        cached = response_cache.get(query) if not chat_history else None
+        if cached is not None:
+            raw_response = {"output": json.dumps(cached)}
+        else:
+            raw_response = executor_pool.invoke({"query": query, "chat_history": chat_history})
 
         try:
-            output_str = raw_response.get("output", "")
-            if output_str.startswith("```"):
-                output_str = output_str.strip("`")
-                if output_str.startswith("json"):
-                    output_str = output_str[4:].strip()
-
-            # Clean and ensure output matches schema
-            output_str = clean_json_output(output_str)
-            output_str = ensure_response_schema(output_str)
-
-            structured_response = parser.parse(output_str)
+            structured_response = parse_agent_output(raw_response.get("output", ""))
+            if cached is None and not chat_history:
+                response_cache.set(query, structured_response.model_dump())
+            conversation_memory.append(session_id, query, structured_response.summary)
 
             # Professional formatted output with clear sections
             print("\n" + "═"*70)
@@ -0,0 +1,231 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from config import Config
+from cache import LRUTTLCache
+
+# A session is {"summary": str, "turns": [{"query": str, "answer": str}, ...]}
+Session = Dict[str, Any]
+Summarizer = Callable[[str, List[Dict[str, str]]], str]
+
+MAX_SESSION_ID_LENGTH = 128
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token); good enough for budgeting prompt size."""
+    return (len(text) + 3) // 4
+
+def _first_line(text: str, limit: int = 160) -> str:
+    line = next((line.strip() for line in text.splitlines() if line.strip()), "")
+    line = re.sub(r"[#*`_]+", "", line).strip()
+    return line if len(line) <= limit else line[:limit - 3].rstrip() + "..."
+
+def extractive_summarizer(summary: str, turns: List[Dict[str, str]]) -> str:
+    """Fold turns into the summary as one line each, without calling the model."""
+    lines = [summary] if summary else []
+    lines.extend(
+        f"- User asked: {_first_line(turn['query'])} | Answer: {_first_line(turn['answer'])}"
+        for turn in turns
+    )
+    return "\n".join(lines)
+
+def make_llm_summarizer(chat_model: Any) -> Summarizer:
+    """Summarize folded turns with the chat model, falling back to the extractive summary on errors."""
+    def summarize(summary: str, turns: List[Dict[str, str]]) -> str:
+        transcript = "\n".join(f"User: {turn['query']}\nAssistant: {turn['answer']}" for turn in turns)
+        try:
+            reply = chat_model.invoke([
+                SystemMessage(content=(
+                    "Condense this CRM assistant conversation into a short factual summary. "
+                    "Keep customer names, amounts, stages and decisions; drop pleasantries."
+                )),
+                HumanMessage(content=f"Existing summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}")
+            ])
+            return str(reply.content).strip()
+        except Exception:
+            return extractive_summarizer(summary, turns)
+    return summarize
+
+# --- Session Stores ---
+
+class InMemorySessionStore:
+    """Process-local sessions; least recently used and idle sessions are evicted."""
+
+    def __init__(self, max_sessions: int, idle_ttl: float):
+        self._sessions = LRUTTLCache(max_sessions, idle_ttl)
+
+    def load(self, session_id: str) -> Optional[Session]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        return {"summary": session["summary"], "turns": list(session["turns"])}
+
+    def save(self, session_id: str, session: Session) -> None:
+        self._sessions.set(session_id, session)
+
+    def delete(self, session_id: str) -> None:
+        self._sessions.delete(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", "sessions": len(self._sessions)}
+
+class SQLiteSessionStore:
+    """
+    Sessions persisted in SQLite so history survives restarts and is shared by worker processes.
+    Idle sessions and those beyond `max_sessions` (least recently updated first) are pruned
+    every `evict_every` writes.
+    """
+
+    def __init__(self, path: str, max_sessions: int, idle_ttl: float, evict_every: int = 100):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.evict_every = evict_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chat_sessions ("
+                "session_id TEXT PRIMARY KEY, summary TEXT NOT NULL, turns TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_sessions_updated_at ON chat_sessions (updated_at)")
+
+    def load(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, turns FROM chat_sessions WHERE session_id = ? AND updated_at >= ?",
+                (session_id, time.time() - self.idle_ttl)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"summary": row[0], "turns": json.loads(row[1])}
+
+    def save(self, session_id: str, session: Session) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO chat_sessions (session_id, summary, turns, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET summary = excluded.summary, turns = excluded.turns, "
+                "updated_at = excluded.updated_at",
+                (session_id, session["summary"], json.dumps(session["turns"]), time.time())
+            )
+            self._writes += 1
+            if self._writes % self.evict_every == 0:
+                self._evict()
+
+    def _evict(self) -> None:
+        self._conn.execute("DELETE FROM chat_sessions WHERE updated_at < ?", (time.time() - self.idle_ttl,))
+        self._conn.execute(
+            "DELETE FROM chat_sessions WHERE session_id NOT IN "
+            "(SELECT session_id FROM chat_sessions ORDER BY updated_at DESC LIMIT ?)",
+            (self.max_sessions,)
+        )
+
+    def delete(self, session_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chat_sessions WHERE session_id = ?", (session_id,))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM chat_sessions").fetchone()[0]
+        return {"backend": "sqlite", "sessions": count}
+
+def build_session_store(settings: Dict[str, Any]) -> Any:
+    if settings["backend"] == "sqlite":
+        return SQLiteSessionStore(settings["sqlite_path"], settings["max_sessions"], settings["idle_ttl"])
+    if settings["backend"] == "memory":
+        return InMemorySessionStore(settings["max_sessions"], settings["idle_ttl"])
+    raise ValueError(f"Unknown conversation memory backend '{settings['backend']}'. Expected 'memory' or 'sqlite'")
+
+# --- Conversation Memory ---
+
+class ConversationMemory:
+    """
+    Session-scoped chat history for the prompt's {chat_history} slot.
+
+    The most recent `window_turns` turns are kept verbatim; older turns, and any turns that
+    push the history past `max_history_tokens`, are folded into a running summary capped at
+    `summary_max_tokens`, so prompt size stays bounded however long the conversation runs.
+    """
+
+    def __init__(
+        self,
+        settings: Optional[Dict[str, Any]] = None,
+        store: Any = None,
+        summarizer: Optional[Summarizer] = None
+    ):
+        settings = settings or Config.CONVERSATION_MEMORY
+        self.enabled = settings.get("enabled", True)
+        self.max_history_tokens = settings["max_history_tokens"]
+        self.window_turns = settings["window_turns"]
+        self.summary_max_tokens = settings["summary_max_tokens"]
+        self.store = store or build_session_store(settings)
+        self.summarizer = summarizer or extractive_summarizer
+        # Striped locks serialize updates to one session without a global lock
+        self._locks = [threading.Lock() for _ in range(64)]
+
+    @staticmethod
+    def valid_session_id(session_id: Any) -> bool:
+        return isinstance(session_id, str) and 0 < len(session_id) <= MAX_SESSION_ID_LENGTH
+
+    def _lock_for(self, session_id: str) -> threading.Lock:
+        return self._locks[zlib.crc32(session_id.encode("utf-8")) % len(self._locks)]
+
+    def _history_tokens(self, session: Session) -> int:
+        return estimate_tokens(session["summary"]) + sum(
+            estimate_tokens(turn["query"]) + estimate_tokens(turn["answer"]) for turn in session["turns"]
+        )
+
+    def _trim_summary(self, summary: str) -> str:
+        max_chars = self.summary_max_tokens * 4
+        if len(summary) <= max_chars:
+            return summary
+        # Drop the oldest lines first; the newest context matters most
+        lines = summary.splitlines()
+        while len(lines) > 1 and len("\n".join(lines)) > max_chars:
+            lines.pop(0)
+        return "\n".join(lines)[-max_chars:]
+
+    def _compact(self, session: Session) -> Session:
+        turns = session["turns"]
+        folded = []
+        while turns and (len(turns) > self.window_turns or self._history_tokens(session) > self.max_history_tokens):
+            folded.append(turns.pop(0))
+        if folded:
+            session["summary"] = self._trim_summary(self.summarizer(session["summary"], folded))
+        return session
+
+    def history(self, session_id: Optional[str]) -> List[BaseMessage]:
+        """Messages for the {chat_history} placeholder; empty for unknown or missing sessions."""
+        if not self.enabled or not self.valid_session_id(session_id):
+            return []
+        session = self.store.load(session_id)
+        if session is None:
+            return []
+        messages: List[BaseMessage] = []
+        if session["summary"]:
+            messages.append(HumanMessage(content=f"Summary of our earlier conversation:\n{session['summary']}"))
+            messages.append(AIMessage(content="Noted."))
+        for turn in session["turns"]:
+            messages.append(HumanMessage(content=turn["query"]))
+            messages.append(AIMessage(content=turn["answer"]))
+        return messages
+
+    def append(self, session_id: Optional[str], query: str, answer: str) -> None:
+        """Record a completed turn and compact the session to its budget."""
+        if not self.enabled or not self.valid_session_id(session_id):
+            return
+        with self._lock_for(session_id):
+            session = self.store.load(session_id) or {"summary": "", "turns": []}
+            session["turns"].append({"query": query, "answer": answer})
+            self.store.save(session_id, self._compact(session))
+
+    def clear(self, session_id: str) -> None:
+        self.store.delete(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.store.stats()
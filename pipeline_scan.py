@@ -0,0 +1,161 @@
+import heapq
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+import numpy as np
+from compiled_config import get_snapshot
+from records import RecordSource, iter_record_chunks
+
+DEAL_FIELDS = (
+    "deal_id",
+    "name",
+    "owner",
+    "stage",
+    "value",
+    "inactive_days",
+    "price_sensitivity",
+    "competitor_mentioned",
+    "response_delay"
+)
+NUMERIC_FIELDS = ("value", "inactive_days", "price_sensitivity", "response_delay")
+TRUE_STRINGS = {"true", "1", "yes", "y"}
+
+def _risk_table() -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Score every combination of the four risk checks with calculate_deal_risk itself,
+    so the vectorized scanner can never drift from the per-deal tool.
+    Index bits: 1 = inactive, 2 = price sensitive, 4 = competitor, 8 = delayed response.
+    """
+    from tools import calculate_deal_risk
+
+    risk_factors = get_snapshot().risk_factors
+    scores = np.zeros(16, dtype=np.float64)
+    at_risk = np.zeros(16, dtype=bool)
+    for mask in range(16):
+        assessment = calculate_deal_risk({
+            "inactive_days": risk_factors["inactive_days"] if mask & 1 else float("-inf"),
+            "price_sensitivity": risk_factors["price_sensitivity_threshold"] if mask & 2 else float("-inf"),
+            "competitor_mentioned": bool(mask & 4),
+            "response_delay": risk_factors["delayed_response"] if mask & 8 else float("-inf")
+        })
+        scores[mask] = assessment["risk_score"]
+        at_risk[mask] = assessment["is_at_risk"]
+    return scores, at_risk
+
+def _numeric(values: Sequence[Any]) -> np.ndarray:
+    # Missing values behave like the tools' .get(key, 0) default
+    return np.nan_to_num(np.asarray(values, dtype=np.float64), nan=0.0)
+
+def _flag(values: Sequence[Any]) -> np.ndarray:
+    memo = {
+        value: (value.strip().lower() in TRUE_STRINGS) if isinstance(value, str) else bool(value)
+        for value in set(values)
+    }
+    return np.fromiter(map(memo.__getitem__, values), dtype=bool, count=len(values))
+
+def _plain_number(value: float) -> Any:
+    return int(value) if float(value).is_integer() else float(value)
+
+class PipelineScanner:
+    """Streams a deal book in chunks, scoring risk with NumPy and keeping only the top-K and per-stage totals."""
+
+    def __init__(self, top_k: int = 20):
+        self.top_k = top_k
+        # Pin one snapshot so a hot reload mid-scan cannot mix two rule sets
+        self.snapshot = get_snapshot()
+        self.risk_scores, self.risk_flags = _risk_table()
+        self.stage_names: List[str] = list(self.snapshot.pipeline_stages)
+        self.stage_codes: Dict[Any, int] = {name: i for i, name in enumerate(self.stage_names)}
+        self.totals = np.zeros((len(self.stage_names), 5), dtype=np.float64)
+        self.deals_scanned = 0
+        self._top: List[Tuple[float, float, int, Dict[str, Any]]] = []
+
+    def _encode_stages(self, values: Sequence[Any]) -> np.ndarray:
+        memo = {}
+        for value in set(values):
+            name = "lead" if value is None else str(value)
+            if name not in self.stage_codes:
+                self.stage_codes[name] = len(self.stage_names)
+                self.stage_names.append(name)
+            memo[value] = self.stage_codes[name]
+        if len(self.stage_names) > len(self.totals):
+            self.totals = np.vstack([self.totals, np.zeros((len(self.stage_names) - len(self.totals), 5))])
+        return np.fromiter(map(memo.__getitem__, values), dtype=np.intp, count=len(values))
+
+    def scan_chunk(self, chunk: Mapping[str, Sequence[Any]]) -> None:
+        n = len(chunk["stage"])
+        if n == 0:
+            return
+        risk_factors = self.snapshot.risk_factors
+        numeric = {field: _numeric(chunk[field]) for field in NUMERIC_FIELDS}
+        competitor = _flag(chunk["competitor_mentioned"])
+        mask = (
+            (numeric["inactive_days"] >= risk_factors["inactive_days"]).astype(np.intp)
+            | ((numeric["price_sensitivity"] >= risk_factors["price_sensitivity_threshold"]) << 1)
+            | (competitor << 2)
+            | ((numeric["response_delay"] >= risk_factors["delayed_response"]) << 3)
+        )
+        risk = self.risk_scores[mask]
+        at_risk = self.risk_flags[mask]
+        value = numeric["value"]
+
+        stages = self._encode_stages(chunk["stage"])
+        size = len(self.stage_names)
+        self.totals[:, 0] += np.bincount(stages, minlength=size)
+        self.totals[:, 1] += np.bincount(stages, weights=at_risk, minlength=size)
+        self.totals[:, 2] += np.bincount(stages, weights=risk, minlength=size)
+        self.totals[:, 3] += np.bincount(stages, weights=value, minlength=size)
+        self.totals[:, 4] += np.bincount(stages, weights=value * at_risk, minlength=size)
+
+        if self.top_k > 0:
+            candidates = np.flatnonzero(at_risk)
+            if len(candidates):
+                # Highest risk first, then highest value, then earliest in the stream
+                order = np.lexsort((-candidates, value[candidates], risk[candidates]))[::-1][:self.top_k]
+                for i in candidates[order]:
+                    record = {field: chunk[field][i] for field in DEAL_FIELDS if chunk[field][i] is not None}
+                    for field in NUMERIC_FIELDS:
+                        if field in record:
+                            record[field] = _plain_number(numeric[field][i])
+                    if "competitor_mentioned" in record:
+                        record["competitor_mentioned"] = bool(competitor[i])
+                    self._top.append((float(risk[i]), float(value[i]), self.deals_scanned + int(i), record))
+                self._top = heapq.nlargest(self.top_k, self._top, key=lambda item: (item[0], item[1], -item[2]))
+        self.deals_scanned += n
+
+    def result(self) -> Dict[str, Any]:
+        from tools import calculate_deal_risk
+
+        top_at_risk = []
+        for risk_score, _, _, record in self._top:
+            assessment = calculate_deal_risk(record)
+            top_at_risk.append({**record, "risk_score": risk_score, "risk_reasons": assessment["risk_reasons"]})
+
+        stages = {}
+        for i, name in enumerate(self.stage_names):
+            deals, at_risk, risk_sum, value_sum, at_risk_value = self.totals[i]
+            if deals or name in self.snapshot.stage_index:
+                stages[name] = {
+                    "deals": int(deals),
+                    "at_risk": int(at_risk),
+                    "avg_risk_score": round(risk_sum / deals, 3) if deals else 0.0,
+                    "total_value": round(float(value_sum), 2),
+                    "at_risk_value": round(float(at_risk_value), 2)
+                }
+        return {
+            "deals_scanned": self.deals_scanned,
+            "at_risk": int(self.totals[:, 1].sum()),
+            "top_at_risk": top_at_risk,
+            "stages": stages
+        }
+
+def scan_pipeline(source: RecordSource, top_k: int = 20, chunk_size: int = 20000) -> Dict[str, Any]:
+    """
+    Assess risk across an entire deal book.
+    Input: an iterable of deal dicts, a dict of columns, or a path to a CSV/JSONL file
+    (streamed in chunks of `chunk_size`). Deals use the pipeline_manager keys plus
+    optional deal_id, name, owner and value.
+    Returns the top-K at-risk deals and per-stage aggregates.
+    """
+    scanner = PipelineScanner(top_k=top_k)
+    for chunk in iter_record_chunks(source, DEAL_FIELDS, chunk_size):
+        scanner.scan_chunk(chunk)
+    return scanner.result()
@@ -0,0 +1,332 @@
+import argparse
+import html
+import json
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from config import Config
+from compiled_config import get_snapshot
+from records import iter_records
+from templating import CompiledTemplate
+
+# Quotation pricing and documents. Kept free of LangChain imports so pool workers start quickly.
+
+DOCUMENT_FORMATS = ("html", "pdf")
+
+def select_quotation_template(deal_context: Dict[str, Any]) -> str:
+    """Select the most appropriate quotation template based on deal context."""
+    deal_size = deal_context.get("base_price", 0)
+    customer_type = deal_context.get("customer_type", "regular")
+
+    if deal_size >= 100000 or customer_type == "vip":
+        return "enterprise"
+    elif deal_size >= 50000 or customer_type == "premium":
+        return "premium"
+    return "standard"
+
+def calculate_adjusted_price(base_price: float, deal_context: Dict[str, Any]) -> float:
+    """Calculate adjusted price based on various factors."""
+    snapshot = get_snapshot()
+
+    # Apply urgency multiplier
+    urgency = deal_context.get("urgency", "medium").lower()
+    urgency_multiplier = snapshot.urgency_multipliers.get(urgency, 1.0)
+
+    # Apply customer type discount
+    customer_type = deal_context.get("customer_type", "regular").lower()
+    customer_multiplier = snapshot.customer_discounts.get(customer_type, 1.0)
+
+    # Calculate final price
+    adjusted_price = base_price * urgency_multiplier * customer_multiplier
+    return round(adjusted_price, 2)
+
+def build_quotation(deal_context: Dict[str, Any]) -> Dict[str, Any]:
+    """Template, pricing and notes for one quotation; shared by quotation_tool and the document renderer."""
+    base_price = deal_context.get("base_price") or deal_context.get("deal_size") or 10000
+    template_key = select_quotation_template(deal_context)
+    template_config = get_snapshot().quotation_templates[template_key]
+
+    quotation_details = {
+        "template_key": template_key,
+        "template_name": template_config["name"],
+        "customer_type": deal_context.get("customer_type", "regular").capitalize(),
+        "base_price": base_price,
+        "final_price": calculate_adjusted_price(base_price, deal_context),
+        "terms": template_config["terms"],
+        "delivery": template_config["delivery"],
+        "validity": "30 days",
+        "special_notes": []
+    }
+
+    # Add special notes based on context
+    if deal_context.get("urgency") == "high":
+        quotation_details["special_notes"].append("Expedited delivery available")
+    if deal_context.get("customer_type") == "vip":
+        quotation_details["special_notes"].append("Premium support included")
+    return quotation_details
+
+# --- Documents ---
+
+_HTML_PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{company} - {template_name} {{quote_id}}</title>
+<style>
+body {{{{ font-family: Helvetica, Arial, sans-serif; color: #222; margin: 48px; }}}}
+h1 {{{{ font-size: 22px; margin-bottom: 4px; }}}}
+.meta {{{{ color: #666; margin-bottom: 24px; }}}}
+table {{{{ border-collapse: collapse; width: 100%; }}}}
+td {{{{ padding: 8px 12px; border-bottom: 1px solid #ddd; }}}}
+td.label {{{{ font-weight: bold; width: 35%; }}}}
+.total td {{{{ font-size: 18px; font-weight: bold; }}}}
+</style>
+</head>
+<body>
+<h1>{company}</h1>
+<div class="meta">{template_name} &middot; Quote {{quote_id}} &middot; Issued {{issued}} &middot; Valid until {{valid_until}}</div>
+<table>
+<tr><td class="label">Customer</td><td>{{customer}}</td></tr>
+<tr><td class="label">Customer Type</td><td>{{customer_type}}</td></tr>
+<tr><td class="label">Base Price</td><td>{{base_price}}</td></tr>
+<tr class="total"><td class="label">Final Price</td><td>{{final_price}}</td></tr>
+<tr><td class="label">Terms</td><td>{terms}</td></tr>
+<tr><td class="label">Delivery</td><td>{delivery}</td></tr>
+<tr><td class="label">Validity</td><td>{validity}</td></tr>
+</table>
+{{notes}}</body>
+</html>
+"""
+
+HTML_FIELDS = ("quote_id", "issued", "valid_until", "customer", "customer_type", "base_price", "final_price", "notes")
+
+def _pdf_text(text: str) -> bytes:
+    escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return b"(" + escaped.encode("latin-1", "replace") + b")"
+
+# Catalog, page tree, page and the two standard fonts; only the content stream differs per quote
+_PDF_HEADER_OBJECTS = (
+    b"<< /Type /Catalog /Pages 2 0 R >>",
+    b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+    b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 4 0 R /F2 5 0 R >> >> /Contents 6 0 R >>",
+    b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>"
+)
+
+def _pdf_prefix() -> Tuple[bytes, List[int]]:
+    prefix = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(_PDF_HEADER_OBJECTS, start=1):
+        offsets.append(len(prefix))
+        prefix += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    return prefix, offsets
+
+_PDF_PREFIX, _PDF_OFFSETS = _pdf_prefix()
+
+class _StaticParts:
+    """The parts of a template's documents that are the same for every quote, rendered once."""
+
+    __slots__ = ("html", "pdf_head", "pdf_tail")
+
+    def __init__(self, template_key: str):
+        template_config = get_snapshot().quotation_templates[template_key]
+        company = Config.QUOTATION_DOCS["company"]
+        static = {
+            # Braces are doubled so values reach CompiledTemplate as literal text
+            name: html.escape(str(value)).replace("{", "{{").replace("}", "}}")
+            for name, value in (
+                ("company", company),
+                ("template_name", template_config["name"]),
+                ("terms", template_config["terms"]),
+                ("delivery", template_config["delivery"]),
+                ("validity", "30 days")
+            )
+        }
+        self.html = CompiledTemplate(_HTML_PAGE.format(**static), HTML_FIELDS)
+        # Content stream: a bold title block, then one 11pt line per row with 18pt leading
+        self.pdf_head = b"BT /F2 20 Tf 72 720 Td 26 TL " + _pdf_text(company) + b" Tj T* /F2 13 Tf " + _pdf_text(template_config["name"]) + b" Tj /F1 11 Tf 18 TL T* T*"
+        self.pdf_tail = b" T* " + b" T* ".join(
+            _pdf_text(line) + b" Tj"
+            for line in (f"Terms: {template_config['terms']}", f"Delivery: {template_config['delivery']}", "Validity: 30 days")
+        )
+
+@lru_cache(maxsize=64)
+def _static_parts(template_key: str, config_version: int) -> _StaticParts:
+    return _StaticParts(template_key)
+
+def _money(value: float) -> str:
+    return f"${value:,.2f}"
+
+def _document_fields(quotation: Dict[str, Any], deal_context: Dict[str, Any], quote_id: str, issued: date) -> Dict[str, str]:
+    return {
+        "quote_id": quote_id,
+        "issued": issued.isoformat(),
+        "valid_until": (issued + timedelta(days=30)).isoformat(),
+        "customer": str(deal_context.get("customer") or deal_context.get("name") or "Valued Customer"),
+        "customer_type": quotation["customer_type"],
+        "base_price": _money(quotation["base_price"]),
+        "final_price": _money(quotation["final_price"])
+    }
+
+def render_html(quotation: Dict[str, Any], deal_context: Dict[str, Any], quote_id: str, issued: Optional[date] = None) -> str:
+    parts = _static_parts(quotation["template_key"], get_snapshot().version)
+    values = {name: html.escape(value) for name, value in _document_fields(quotation, deal_context, quote_id, issued or date.today()).items()}
+    notes = quotation["special_notes"]
+    values["notes"] = "<h2>Special Notes</h2>\n<ul>\n" + "".join(f"<li>{html.escape(note)}</li>\n" for note in notes) + "</ul>\n" if notes else ""
+    return parts.html.render(values)
+
+def render_pdf(quotation: Dict[str, Any], deal_context: Dict[str, Any], quote_id: str, issued: Optional[date] = None) -> bytes:
+    """A one-page PDF (standard Helvetica fonts, no dependencies) with the same content as the HTML."""
+    parts = _static_parts(quotation["template_key"], get_snapshot().version)
+    fields = _document_fields(quotation, deal_context, quote_id, issued or date.today())
+    lines = [
+        f"Quote {fields['quote_id']}  -  Issued {fields['issued']}  -  Valid until {fields['valid_until']}",
+        f"Customer: {fields['customer']} ({fields['customer_type']})",
+        f"Base Price: {fields['base_price']}",
+        f"Final Price: {fields['final_price']}"
+    ]
+    lines += [f"Note: {note}" for note in quotation["special_notes"]]
+    content = parts.pdf_head + b" " + b" T* ".join(_pdf_text(line) + b" Tj" for line in lines) + parts.pdf_tail + b" ET"
+    body = _PDF_PREFIX + b"6 0 obj\n<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream\nendobj\n"
+    xref_offset = len(body)
+    offsets = _PDF_OFFSETS + [len(_PDF_PREFIX)]
+    xref = b"xref\n0 7\n0000000000 65535 f \n" + b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    return body + xref + b"trailer\n<< /Size 7 /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % xref_offset
+
+_UNSAFE_FILENAME = re.compile(r"[^A-Za-z0-9._-]+")
+
+def render_quotation_documents(
+    deal_context: Dict[str, Any],
+    output_dir: str,
+    formats: Sequence[str] = DOCUMENT_FORMATS,
+    quote_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Render one deal's quotation to files in `output_dir`. Returns the quote's id, price, files and render time."""
+    start = time.perf_counter()
+    if isinstance(formats, str):
+        formats = [formats]
+    unknown = set(formats) - set(DOCUMENT_FORMATS)
+    if unknown:
+        raise ValueError(f"Unknown document formats {sorted(unknown)}. Expected any of {list(DOCUMENT_FORMATS)}")
+    quotation = build_quotation(deal_context)
+    quote_id = str(quote_id or deal_context.get("quote_id") or deal_context.get("deal_id") or f"Q{time.time_ns()}")
+    stem = os.path.join(output_dir, _UNSAFE_FILENAME.sub("_", quote_id))
+    files = {}
+    if "html" in formats:
+        with open(stem + ".html", "w", encoding="utf-8") as f:
+            f.write(render_html(quotation, deal_context, quote_id))
+        files["html"] = stem + ".html"
+    if "pdf" in formats:
+        with open(stem + ".pdf", "wb") as f:
+            f.write(render_pdf(quotation, deal_context, quote_id))
+        files["pdf"] = stem + ".pdf"
+    return {
+        "quote_id": quote_id,
+        "template": quotation["template_key"],
+        "final_price": quotation["final_price"],
+        "files": files,
+        "render_ms": round((time.perf_counter() - start) * 1000, 3)
+    }
+
+def _render_chunk(chunk: List[Tuple[int, Dict[str, Any]]], output_dir: str, formats: Sequence[str], batch_id: str) -> List[Dict[str, Any]]:
+    # Runs in a pool worker: renders and writes its documents, returning only metadata
+    results = []
+    for index, deal_context in chunk:
+        try:
+            result = render_quotation_documents(deal_context, output_dir, formats, deal_context.get("quote_id") or deal_context.get("deal_id") or f"{batch_id}-{index:06d}")
+            results.append({"index": index, "status": "ok", **result})
+        except Exception as e:
+            results.append({"index": index, "status": "error", "error": str(e)})
+    return results
+
+def render_quotation_batch(
+    deals: Iterable[Dict[str, Any]],
+    output_dir: str,
+    formats: Sequence[str] = DOCUMENT_FORMATS,
+    workers: Optional[int] = None,
+    chunk_size: Optional[int] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Render many quotations on a process pool, yielding one result per deal (with its `index`
+    and `render_ms`) as chunks complete, then a summary with throughput and timing percentiles.
+    Deals are streamed to the pool `chunk_size` at a time, with at most two chunks queued per
+    worker, so memory stays bounded for any number of deals.
+    """
+    settings = Config.QUOTATION_DOCS
+    workers = workers or settings["workers"] or os.cpu_count() or 1
+    chunk_size = chunk_size or settings["chunk_size"]
+    os.makedirs(output_dir, exist_ok=True)
+    batch_id = f"Q{date.today():%Y%m%d}-{os.getpid()}-{int(time.time())}"
+    start = time.perf_counter()
+    timings: List[float] = []
+    errors = 0
+    deals = enumerate(deals)
+    context = multiprocessing.get_context(settings["start_method"])
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        pending = []
+        while True:
+            while len(pending) < 2 * workers:
+                chunk = list(islice(deals, chunk_size))
+                if not chunk:
+                    break
+                pending.append(pool.submit(_render_chunk, chunk, output_dir, tuple(formats), batch_id))
+            if not pending:
+                break
+            for result in pending.pop(0).result():
+                if result["status"] == "ok":
+                    timings.append(result["render_ms"])
+                else:
+                    errors += 1
+                yield result
+    wall_time = time.perf_counter() - start
+    timings.sort()
+
+    def percentile(q: float) -> Optional[float]:
+        return timings[min(len(timings) - 1, int(q * len(timings)))] if timings else None
+
+    yield {
+        "status": "done",
+        "documents": len(timings),
+        "errors": errors,
+        "workers": workers,
+        "wall_time_s": round(wall_time, 3),
+        "documents_per_s": round(len(timings) / wall_time, 1) if wall_time else None,
+        "render_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "max": timings[-1] if timings else None}
+    }
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description="Render quotation documents for many deals")
+    arg_parser.add_argument("deals", help="CSV or JSONL file of deal contexts (base_price, urgency, customer_type, customer, deal_id)")
+    arg_parser.add_argument("--output-dir", default=Config.QUOTATION_DOCS["output_dir"])
+    arg_parser.add_argument("--formats", nargs="+", choices=DOCUMENT_FORMATS, default=list(Config.QUOTATION_DOCS["formats"]))
+    arg_parser.add_argument("--workers", type=int, help="Worker processes (default: one per CPU)")
+    arg_parser.add_argument("--report", help="Write per-document results as JSONL here")
+    args = arg_parser.parse_args()
+
+    def deals() -> Iterator[Dict[str, Any]]:
+        for deal in iter_records(args.deals):
+            # CSV values arrive as strings
+            for field in ("base_price", "deal_size"):
+                if isinstance(deal.get(field), str):
+                    deal[field] = float(deal[field])
+            yield deal
+
+    report = open(args.report, "w", encoding="utf-8") if args.report else None
+    try:
+        for result in render_quotation_batch(deals(), args.output_dir, args.formats, args.workers):
+            if result["status"] == "done":
+                print(json.dumps(result))
+            elif report is not None:
+                report.write(json.dumps(result) + "\n")
+    finally:
+        if report is not None:
+            report.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import json
+from typing import Any, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+from pydantic import ConfigDict
+from config import Config
+from llm_scheduler import LLMScheduler, get_llm_scheduler
+from memory import estimate_tokens
+
+# Imported by main.get_llm on first use, like the Gemini client it wraps
+
+def estimate_call_tokens(messages: List[BaseMessage], tools: Any = None) -> int:
+    """Rough prompt size of one model call: the messages plus any bound tool schemas."""
+    tokens = sum(estimate_tokens(str(message.content)) for message in messages)
+    if tools:
+        tokens += estimate_tokens(json.dumps(tools, default=str))
+    return tokens
+
+def _used_tokens(result: ChatResult) -> Optional[int]:
+    usage = [getattr(generation.message, "usage_metadata", None) for generation in result.generations]
+    if not any(usage):
+        return None
+    return sum(item.get("total_tokens", 0) for item in usage if item)
+
+class RateLimitedChatModel(BaseChatModel):
+    """
+    A chat model whose calls go through an LLMScheduler: admitted by priority lane within the
+    request and token rate limits, and retried by the scheduler when the provider returns a
+    quota error. Tool binding is done by the wrapped model, so provider-specific tool formats
+    are kept; only the resulting call arguments pass through this wrapper.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    model: BaseChatModel
+    scheduler: LLMScheduler
+
+    @property
+    def _llm_type(self) -> str:
+        return f"rate-limited-{self.model._llm_type}"
+
+    def bind_tools(self, tools: Any, **kwargs: Any):
+        return self.bind(**self.model.bind_tools(tools, **kwargs).kwargs)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        return self.scheduler.call(
+            lambda: self.model._generate(messages, stop=stop, run_manager=run_manager, **kwargs),
+            estimate_call_tokens(messages, kwargs.get("tools")),
+            _used_tokens
+        )
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any
+    ) -> ChatResult:
+        return await self.scheduler.acall(
+            lambda: self.model._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs),
+            estimate_call_tokens(messages, kwargs.get("tools")),
+            _used_tokens
+        )
+
+def rate_limited(chat_model: BaseChatModel, scheduler: Optional[LLMScheduler] = None) -> BaseChatModel:
+    """Put `chat_model` behind the shared scheduler, unless Config.LLM_SCHEDULER is disabled."""
+    if scheduler is None and not Config.LLM_SCHEDULER["enabled"]:
+        return chat_model
+    return RateLimitedChatModel(model=chat_model, scheduler=scheduler or get_llm_scheduler())
@@ -0,0 +1,214 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class RecordWriterError(RuntimeError):
+    """Raised by write() and flush() once the writer thread has failed to write a batch."""
+
+def format_text_record(record: Dict[str, Any]) -> str:
+    return f"--- Research Output ---\nTimestamp: {record['timestamp']}\n\n{record['data']}\n\n"
+
+def format_jsonl_record(record: Dict[str, Any]) -> str:
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+RECORD_FORMATS: Dict[str, Callable[[Dict[str, Any]], str]] = {
+    "text": format_text_record,
+    "jsonl": format_jsonl_record
+}
+
+class _FlushRequest:
+    __slots__ = ("done",)
+
+    def __init__(self):
+        self.done = threading.Event()
+
+_STOP = object()
+
+class BufferedRecordWriter:
+    """
+    Appends records to a file from a single background thread.
+
+    Callers enqueue and return immediately; the writer drains the queue in batches,
+    writing when `batch_size` records are pending or `flush_interval` seconds have passed.
+    Files are rotated once they exceed `max_bytes` (path.1 ... path.N, like logging's
+    RotatingFileHandler), and `fsync_every` controls durability: 0 never fsyncs,
+    N fsyncs after every N records.
+
+    If writing a batch fails (a full disk, a removed directory), the error is logged and the
+    writer is marked failed: the thread keeps answering flushes but drops records, and
+    write() and flush() raise RecordWriterError. get_writer() replaces a failed writer.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        record_format: str = "text",
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        max_bytes: int = 0,
+        backup_count: int = 5,
+        fsync_every: int = 0
+    ):
+        if record_format not in RECORD_FORMATS:
+            raise ValueError(f"Unknown record format '{record_format}'. Expected one of {list(RECORD_FORMATS)}")
+        self.path = path
+        self.formatter = RECORD_FORMATS[record_format]
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.fsync_every = fsync_every
+        self.records_written = 0
+        self._unsynced = 0
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._file = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.error: Optional[BaseException] = None
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+    def _check(self) -> None:
+        if self.error is not None:
+            raise RecordWriterError(f"Writing to {self.path} failed: {self.error}") from self.error
+
+    def _ensure_started(self) -> None:
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=f"record-writer:{self.path}", daemon=True)
+                    self._thread.start()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        """Queue a record for writing; never blocks on file I/O. Raises RecordWriterError once the writer has failed."""
+        self._check()
+        self._ensure_started()
+        self._queue.put(record)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until every record queued before this call is written. Returns False on timeout;
+        raises RecordWriterError if the writer failed.
+        """
+        self._check()
+        if self._thread is None:
+            return True
+        request = _FlushRequest()
+        self._queue.put(request)
+        done = request.done.wait(timeout)
+        self._check()
+        return done
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _open(self):
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        return self._file
+
+    def _rotate(self) -> None:
+        self._file.close()
+        self._file = None
+        if self.backup_count > 0:
+            for i in range(self.backup_count - 1, 0, -1):
+                source = f"{self.path}.{i}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            open(self.path, "w").close()
+
+    def _write_batch(self, records: List[Dict[str, Any]]) -> None:
+        f = self._open()
+        f.write("".join(self.formatter(record) for record in records))
+        f.flush()
+        self.records_written += len(records)
+        if self.fsync_every > 0:
+            self._unsynced += len(records)
+            if self._unsynced >= self.fsync_every:
+                os.fsync(f.fileno())
+                self._unsynced = 0
+        if self.max_bytes and f.tell() >= self.max_bytes:
+            if self._unsynced:
+                os.fsync(f.fileno())
+                self._unsynced = 0
+            self._rotate()
+
+    def _run(self) -> None:
+        batch: List[Dict[str, Any]] = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, dict):
+                batch.append(item)
+                if len(batch) < self.batch_size:
+                    continue
+            try:
+                if batch and self.error is None:
+                    self._write_batch(batch)
+                if isinstance(item, _FlushRequest) and self._file is not None and self._unsynced:
+                    os.fsync(self._file.fileno())
+                    self._unsynced = 0
+                if item is _STOP and self._file is not None:
+                    if self.fsync_every > 0:
+                        os.fsync(self._file.fileno())
+                    self._file.close()
+                    self._file = None
+            except Exception as e:
+                # Keep the thread alive so flush() callers are released instead of hanging
+                logger.exception("Record writer for %s failed; dropping %d records", self.path, len(batch))
+                self.error = e
+                self._close_quietly()
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+
+            if isinstance(item, _FlushRequest):
+                item.done.set()
+            elif item is _STOP:
+                return
+
+    def _close_quietly(self) -> None:
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+_writers: Dict[str, BufferedRecordWriter] = {}
+_writers_lock = threading.Lock()
+
+def get_writer(path: str, record_format: str = "text", **settings: Any) -> BufferedRecordWriter:
+    """Return the shared writer for `path`, creating it on first use or when the previous one failed."""
+    with _writers_lock:
+        writer = _writers.get(path)
+        if writer is None or writer.failed:
+            writer = _writers[path] = BufferedRecordWriter(path, record_format, **settings)
+        return writer
+
+@atexit.register
+def close_all_writers() -> None:
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        writer.close(timeout=5)
@@ -0,0 +1,130 @@
+import csv
+import json
+import os
+from itertools import islice, zip_longest
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Sequence, Union
+
+RecordSource = Union[str, os.PathLike, Iterable[Mapping[str, Any]], Mapping[str, Sequence[Any]]]
+
+# --- Record Loading Helpers ---
+
+def _read_csv_columns(path: str) -> Dict[str, List[Any]]:
+    """Read a CSV file into a dict of column lists (values stay as strings)."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        columns: Dict[str, List[Any]] = {name: [] for name in header}
+        appenders = [columns[name].append for name in header]
+        for row in reader:
+            for append, value in zip(appenders, row):
+                append(value if value != "" else None)
+    return columns
+
+def _read_parquet_columns(path: str, fields: Sequence[str]) -> Dict[str, List[Any]]:
+    """Read the requested columns of a Parquet file into column lists. Requires pyarrow."""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Reading Parquet files requires pyarrow. Install it with `pip install pyarrow`.") from e
+    available = set(pq.read_schema(path).names)
+    return pq.read_table(path, columns=[f for f in fields if f in available]).to_pydict()
+
+def load_columns(source: RecordSource, fields: Sequence[str]) -> Dict[str, Sequence[Any]]:
+    """
+    Normalize a record source into a columnar dict restricted to `fields`.
+    Accepts a list/iterable of dicts, a dict of column sequences, or a CSV/Parquet path.
+    Missing fields are returned as columns of None.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        path = os.fspath(source)
+        if path.lower().endswith((".parquet", ".pq")):
+            columns = _read_parquet_columns(path, fields)
+        elif path.lower().endswith(".csv"):
+            columns = _read_csv_columns(path)
+        else:
+            raise ValueError(f"Unsupported file type for '{path}'. Expected .csv or .parquet")
+    elif isinstance(source, Mapping):
+        columns = dict(source)
+    else:
+        records = source if isinstance(source, list) else list(source)
+        return {field: [record.get(field) for record in records] for field in fields}
+
+    lengths = {len(values) for values in columns.values()}
+    if len(lengths) > 1:
+        raise ValueError("All columns must have the same length")
+    length = lengths.pop() if lengths else 0
+    return {field: columns[field] if field in columns else [None] * length for field in fields}
+
+def _iter_csv_chunks(path: str, fields: Sequence[str], chunk_size: int) -> Iterator[Dict[str, Sequence[Any]]]:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        positions = {field: header.index(field) for field in fields if field in header}
+        while True:
+            rows = list(islice(reader, chunk_size))
+            if not rows:
+                return
+            rows = [row for row in rows if row]
+            if not rows:
+                continue
+            # Transpose in C; short rows are padded with None
+            columns = list(zip_longest(*rows))
+            chunk: Dict[str, Sequence[Any]] = {}
+            for field in fields:
+                if field not in positions or positions[field] >= len(columns):
+                    chunk[field] = [None] * len(rows)
+                    continue
+                column = columns[positions[field]]
+                chunk[field] = [value if value != "" else None for value in column] if "" in column else column
+            yield chunk
+
+def _iter_jsonl_records(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def iter_records(source: Union[str, os.PathLike, Iterable[Mapping[str, Any]]]) -> Iterator[Dict[str, Any]]:
+    """Stream records one dict at a time from an iterable of dicts or a CSV/JSON Lines path (blank CSV cells become None)."""
+    if not isinstance(source, (str, os.PathLike)):
+        yield from source
+        return
+    path = os.fspath(source)
+    if path.lower().endswith(".csv"):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                yield {key: value if value != "" else None for key, value in row.items()}
+        return
+    if not path.lower().endswith((".jsonl", ".ndjson")):
+        raise ValueError(f"Unsupported file type for '{path}'. Expected .csv, .jsonl or .ndjson")
+    yield from _iter_jsonl_records(path)
+
+def iter_record_chunks(source: RecordSource, fields: Sequence[str], chunk_size: int = 100000) -> Iterator[Dict[str, Sequence[Any]]]:
+    """
+    Stream a record source as columnar chunks of at most `chunk_size` rows, without
+    loading the whole source into memory. Accepts an iterable of dicts, a dict of
+    column sequences, or a path to a CSV or JSON Lines (.jsonl/.ndjson) file.
+    """
+    if isinstance(source, Mapping):
+        columns = load_columns(source, fields)
+        length = len(columns[fields[0]]) if fields else 0
+        for start in range(0, length, chunk_size):
+            yield {field: columns[field][start:start + chunk_size] for field in fields}
+        return
+
+    if isinstance(source, (str, os.PathLike)):
+        path = os.fspath(source)
+        if path.lower().endswith(".csv"):
+            yield from _iter_csv_chunks(path, fields, chunk_size)
+            return
+        if not path.lower().endswith((".jsonl", ".ndjson")):
+            raise ValueError(f"Unsupported file type for '{path}'. Expected .csv, .jsonl or .ndjson")
+        source = _iter_jsonl_records(path)
+
+    records = iter(source)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+        yield {field: [record.get(field) for record in chunk] for field in fields}
@@ -0,0 +1,197 @@
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type, TypeVar
+from pydantic import BaseModel, ValidationError
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+STRUCTURAL_FOLLOWERS = ",:}]"
+ESCAPABLE = '"\\/bfnrtu'
+LITERALS = {"true": "true", "false": "false", "null": "null", "none": "null"}
+NUMBER_CHARS = set("0123456789+-.eE")
+MAX_CANDIDATES = 3
+
+def _closes_string(text: str, i: int) -> bool:
+    """A quote only ends a string if the next non-space character is structural (or the text ends)."""
+    j = i + 1
+    while j < len(text) and text[j] in " \t\r\n":
+        j += 1
+    return j == len(text) or text[j] in STRUCTURAL_FOLLOWERS
+
+def _read_string(text: str, i: int) -> Tuple[str, int, bool]:
+    """Read a single- or double-quoted string starting at text[i]; returns (JSON string, next index, closed)."""
+    quote = text[i]
+    i += 1
+    out = ['"']
+    n = len(text)
+    while i < n:
+        c = text[i]
+        if c == "\\":
+            if i + 1 >= n:
+                i += 1
+                break
+            nxt = text[i + 1]
+            if nxt == "'":
+                out.append("'")
+            elif nxt in ESCAPABLE:
+                out.append(c + nxt)
+            else:
+                out.append("\\\\" + nxt)
+            i += 2
+            continue
+        if c == quote and _closes_string(text, i):
+            out.append('"')
+            return "".join(out), i + 1, True
+        if c == '"':
+            out.append('\\"')
+        elif c == "\n":
+            out.append("\\n")
+        elif c == "\r":
+            out.append("\\r")
+        elif c == "\t":
+            out.append("\\t")
+        elif c < " ":
+            out.append(f"\\u{ord(c):04x}")
+        else:
+            out.append(c)
+        i += 1
+    out.append('"')
+    return "".join(out), i, False
+
+def _drop_trailing_comma(out: List[str]) -> None:
+    j = len(out) - 1
+    while j >= 0 and out[j].isspace():
+        j -= 1
+    if j >= 0 and out[j] == ",":
+        del out[j]
+
+def _scan_object(text: str, start: int) -> Tuple[str, int]:
+    """
+    Rewrite the object starting at text[start] into strict JSON in one pass: single quotes,
+    unescaped inner quotes, raw newlines, Python literals, bare keys and trailing commas are
+    repaired, and an object cut off mid-stream is closed. Returns (JSON text, index after the object).
+    """
+    out: List[str] = []
+    closers: List[str] = []
+    i = start
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if ch in "\"'":
+            token, i, closed = _read_string(text, i)
+            out.append(token)
+            if not closed:
+                break
+            continue
+        if ch in "{[":
+            closers.append("}" if ch == "{" else "]")
+            out.append(ch)
+        elif ch in "}]":
+            if closers and closers[-1] == ch:
+                _drop_trailing_comma(out)
+                closers.pop()
+                out.append(ch)
+                if not closers:
+                    return "".join(out), i + 1
+        elif ch in ",: \t\r\n":
+            out.append(ch)
+        elif ch.isalpha() or ch == "_":
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            out.append(LITERALS.get(word.lower(), json.dumps(word)))
+            i = j
+            continue
+        elif ch in NUMBER_CHARS:
+            j = i
+            while j < n and text[j] in NUMBER_CHARS:
+                j += 1
+            out.append(text[i:j])
+            i = j
+            continue
+        i += 1
+
+    # Truncated output: finish the last value and close whatever is still open
+    _drop_trailing_comma(out)
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ":":
+        out.append("null")
+    elif closers and closers[-1] == "}" and out and out[-1].startswith('"'):
+        # A dangling key with no value yet
+        previous = next((token for token in reversed(out[:-1]) if not token.isspace()), "")
+        if previous in ("{", ","):
+            out.append(": null")
+    out.extend(reversed(closers))
+    return "".join(out), n
+
+def extract_json_object(text: str, fields: Iterable[str] = ()) -> Optional[Dict[str, Any]]:
+    """
+    Find and repair the first JSON object in model output (fenced, prefixed with prose, or truncated).
+    With `fields`, an object that has none of them (e.g. an echoed tool input) gives way to the
+    next object that does; it is only returned if no later candidate qualifies.
+    """
+    wanted = set(fields)
+    start = text.find("{")
+    end = text.rfind("}")
+    if start != -1 and end > start:
+        # Well-formed output (the common case) parses at C speed without the repair scan
+        try:
+            data = json.loads(text[start:end + 1])
+        except ValueError:
+            data = None
+        if isinstance(data, dict) and (not wanted or wanted & data.keys()):
+            return data
+    first = None
+    for _ in range(MAX_CANDIDATES):
+        if start == -1:
+            break
+        candidate, end = _scan_object(text, start)
+        try:
+            data = json.loads(candidate)
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            if not wanted or wanted & data.keys():
+                return data
+            if first is None:
+                first = data
+            start = text.find("{", end)
+        else:
+            start = text.find("{", start + 1)
+    return first
+
+def _as_text(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict) and isinstance(value.get("summary"), str):
+        # The model echoed a whole tool result instead of its summary
+        return value["summary"]
+    return json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+
+def _as_list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        value = [value]
+    return [item if isinstance(item, str) else _as_text(item) for item in value if item is not None]
+
+def parse_response(output: str, model: Type[ModelT]) -> ModelT:
+    """
+    Parse agent output into `model` (topic, summary, source, tools_used). Missing fields get defaults,
+    and output with no recoverable JSON object becomes the summary of a "General" response.
+    """
+    data = extract_json_object(output, model.model_fields) or {}
+    fields = {
+        "topic": _as_text(data.get("topic") or "General"),
+        "summary": _as_text(data["summary"]) if data.get("summary") is not None else output.strip(),
+        "source": _as_list(data.get("source")),
+        "tools_used": _as_list(data.get("tools_used"))
+    }
+    for name in model.model_fields:
+        if name not in fields and name in data:
+            fields[name] = data[name]
+    try:
+        return model.model_validate(fields)
+    except ValidationError:
+        return model.model_validate({"topic": "General", "summary": output.strip(), "source": [], "tools_used": []})
@@ -0,0 +1,198 @@
+import json
+import re
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+from compiled_config import get_snapshot
+from tracing import span
+from tools import lead_qualifier_tool, quotation_tool, pipeline_manager_tool, followup_tool
+
+FAST_PATH = "fast_path"
+AGENT_PATH = "agent"
+
+# Tools that are pure functions of their input and can be called without the LLM
+DIRECT_TOOLS: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    "lead_qualifier": lead_qualifier_tool,
+    "quotation": quotation_tool,
+    "pipeline_manager": pipeline_manager_tool,
+    "followup": followup_tool
+}
+
+# Keys that identify a bare payload as input for a given tool
+TOOL_SIGNATURES = {
+    "lead_qualifier": {"past_behavior", "lead_id"},
+    "quotation": {"base_price", "customer_type"},
+    # A bare deal_id could be for pipeline_manager or sales_coach, so it alone picks neither
+    "pipeline_manager": {"stage", "inactive_days", "price_sensitivity", "competitor_mentioned", "response_delay"},
+    "followup": {"lead_context", "last_interaction"}
+}
+
+# --- Regex Intents ---
+
+# A number only counts as money with a marker: a currency sign or word, a k/m suffix, or a
+# money word before it. "2 cranes" or "a 50 ton crane" are not prices.
+_NUMBER = r"(\d+(?:,\d{3})*(?:\.\d+)?)"
+AMOUNT_PATTERN = re.compile(
+    r"(?:\$|\busd\b)\s*" + _NUMBER + r"(?:\s*(k|m|thousand|million)\b|(k|m)\b)?"
+    r"|\b" + _NUMBER + r"(?:\s*(thousand|million)\b|(k|m)\b)(?:\s*(?:usd|dollars)\b)?"
+    r"|\b(?:price|budget|deal size|deal value|value|cost|worth)\s*(?:is|of|at|around|about|:|=)?\s*" + _NUMBER + r"(?:\s*(thousand|million)\b|(k|m)\b)?"
+    r"|\b" + _NUMBER + r"\s*(?:usd|dollars)\b",
+    re.IGNORECASE
+)
+NUMBER_PATTERN = re.compile(_NUMBER)
+MULTIPLIERS = {"k": 1000, "thousand": 1000, "m": 1000000, "million": 1000000}
+QUOTE_INTENT = re.compile(r"\b(?:quote|quotation)\b", re.IGNORECASE)
+QUALIFY_INTENT = re.compile(r"\b(?:qualify|score)\b.*\blead\b|\blead\b.*\b(?:qualify|qualification|score)\b", re.IGNORECASE)
+PIPELINE_INTENT = re.compile(r"\b(?:deal|opportunity)\b", re.IGNORECASE)
+# Asking for one deal's status or risk, as opposed to mentioning a deal in passing
+DEAL_STATUS_INTENT = re.compile(
+    r"\b(?:status|stuck|stalled|inactive|no activity|at risk|risk|assess|analy[sz]e|health|next steps?)\b", re.IGNORECASE
+)
+# Questions about deals (why we lost one, how many there are, what a stage means) need the agent
+QUESTION_INTENT = re.compile(r"\b(?:why|what|how|which|who|when|explain|describe|count)\b", re.IGNORECASE)
+URGENCY_PATTERN = re.compile(r"\b(high|medium|low)\s+urgency\b|\burgency\s*(?:is|:|=)?\s*(high|medium|low)\b|\b(urgent|asap)\b", re.IGNORECASE)
+BEHAVIOR_PATTERN = re.compile(r"\b(positive|neutral|negative)\b", re.IGNORECASE)
+CUSTOMER_TYPE_PATTERN = re.compile(r"\b(vip|premium|regular|new)\b", re.IGNORECASE)
+INACTIVE_PATTERN = re.compile(r"\b(?:inactive|no activity|without activity)\s+(?:for\s+)?(\d+)\s*days?\b|\b(\d+)\s*days?\s+(?:inactive|of inactivity|without activity)\b", re.IGNORECASE)
+COMPETITOR_PATTERN = re.compile(r"\bcompetitors?\b", re.IGNORECASE)
+
+def parse_amount(text: str) -> Optional[Union[int, float]]:
+    """
+    Extract the money amount from text, e.g. '75k', '$75,000', '1.2m' or 'budget 75000'.
+    None unless it is the only number in the text: with a quantity, a size or a second amount
+    next to it ('2 cranes at 80k') the price is ambiguous and the message is left to the agent.
+    """
+    matches = list(AMOUNT_PATTERN.finditer(text))
+    if len(matches) != 1:
+        return None
+    match = matches[0]
+    if NUMBER_PATTERN.search(text[:match.start()] + " " + text[match.end():]):
+        return None
+    number, *suffixes = (group for group in match.groups() if group is not None)
+    amount = float(number.replace(",", ""))
+    if suffixes:
+        amount *= MULTIPLIERS[suffixes[0].lower()]
+    # Whole amounts stay ints so summaries read "$60,000", not "$60,000.0"
+    return int(amount) if amount.is_integer() else amount
+
+def _parse_urgency(text: str) -> Optional[str]:
+    match = URGENCY_PATTERN.search(text)
+    if not match:
+        return None
+    level = match.group(1) or match.group(2)
+    return level.lower() if level else "high"
+
+def _match_quotation(text: str) -> Optional[Dict[str, Any]]:
+    if not QUOTE_INTENT.search(text):
+        return None
+    base_price = parse_amount(text)
+    if base_price is None:
+        return None
+    deal_context: Dict[str, Any] = {"base_price": base_price}
+    urgency = _parse_urgency(text)
+    if urgency:
+        deal_context["urgency"] = urgency
+    customer_type = CUSTOMER_TYPE_PATTERN.search(text)
+    if customer_type:
+        deal_context["customer_type"] = customer_type.group(1).lower()
+    return deal_context
+
+def _match_lead(text: str) -> Optional[Dict[str, Any]]:
+    if not QUALIFY_INTENT.search(text):
+        return None
+    deal_size = parse_amount(text)
+    urgency = _parse_urgency(text)
+    behavior = BEHAVIOR_PATTERN.search(text)
+    if deal_size is None or urgency is None or behavior is None:
+        return None
+    return {"deal_size": deal_size, "urgency": urgency, "past_behavior": behavior.group(1).lower()}
+
+def _match_pipeline(text: str) -> Optional[Dict[str, Any]]:
+    if not (PIPELINE_INTENT.search(text) and DEAL_STATUS_INTENT.search(text)) or QUESTION_INTENT.search(text):
+        return None
+    # Whole words only, so "unqualified" is not the qualified stage; naming two stages is ambiguous
+    stages = [
+        s for s in get_snapshot().pipeline_stages
+        if s != "lead" and re.search(r"\b" + s.replace("_", r"[\s_-]+") + r"\b", text, re.IGNORECASE)
+    ]
+    if len(stages) != 1:
+        return None
+    deal_status: Dict[str, Any] = {"stage": stages[0]}
+    inactive = INACTIVE_PATTERN.search(text)
+    if inactive:
+        deal_status["inactive_days"] = int(inactive.group(1) or inactive.group(2))
+    if COMPETITOR_PATTERN.search(text):
+        deal_status["competitor_mentioned"] = True
+    return deal_status
+
+INTENT_MATCHERS = [
+    ("quotation", _match_quotation),
+    ("lead_qualifier", _match_lead),
+    ("pipeline_manager", _match_pipeline)
+]
+
+# --- Routing ---
+
+def _detect_payload_tool(payload: Dict[str, Any]) -> Optional[str]:
+    """Infer the target tool from the keys of a bare payload; None if ambiguous."""
+    keys = set(payload)
+    matches = [name for name, signature in TOOL_SIGNATURES.items() if keys & signature]
+    return matches[0] if len(matches) == 1 else None
+
+def _parse_structured(message: str) -> Optional[Dict[str, Any]]:
+    text = message.strip()
+    if not text.startswith("{"):
+        return None
+    try:
+        payload = json.loads(text)
+    except ValueError:
+        return None
+    return payload if isinstance(payload, dict) else None
+
+def _result(path: str, tool: Optional[str], reason: str, response: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {"path": path, "tool": tool, "reason": reason, "response": response}
+
+def _call_tool(tool_name: str, tool_input: Dict[str, Any], reason: str) -> Dict[str, Any]:
+    try:
+        with span("tool", tool_name):
+            response = DIRECT_TOOLS[tool_name](tool_input)
+    except Exception as e:
+        return _result(AGENT_PATH, tool_name, f"Tool '{tool_name}' rejected the input: {e}")
+    return _result(FAST_PATH, tool_name, reason, response)
+
+def match_direct_tool(message: str) -> Tuple[Optional[str], Optional[Dict[str, Any]], str]:
+    """
+    Resolve a message to a direct tool call without running it.
+    Returns (tool, tool_input, reason); tool_input is None when the message needs the agent.
+    """
+    payload = _parse_structured(message)
+    if payload is not None:
+        tool_name = payload.get("tool")
+        if tool_name is not None:
+            tool_input = payload.get("input", payload.get("args", {}))
+            if tool_name in DIRECT_TOOLS and isinstance(tool_input, dict):
+                return tool_name, tool_input, "Explicit tool payload"
+            return tool_name, None, "Tool cannot be called directly"
+        tool_name = _detect_payload_tool(payload)
+        if tool_name:
+            return tool_name, payload, "Structured payload"
+        return None, None, "Unrecognized structured payload"
+
+    for tool_name, matcher in INTENT_MATCHERS:
+        tool_input = matcher(message)
+        if tool_input is not None:
+            return tool_name, tool_input, "Matched intent"
+    return None, None, "No deterministic route"
+
+def _route(message: str) -> Dict[str, Any]:
+    tool_name, tool_input, reason = match_direct_tool(message)
+    if tool_input is None:
+        return _result(AGENT_PATH, tool_name, reason)
+    return _call_tool(tool_name, tool_input, reason)
+
+def route_request(message: str) -> Dict[str, Any]:
+    """
+    Decide whether a message can be answered by calling a tool directly.
+    Returns a dict with 'path' ('fast_path' or 'agent'), 'tool', 'reason' and,
+    for the fast path, 'response' in the Response schema.
+    """
+    with span("route", "router"):
+        return _route(message)
@@ -0,0 +1,415 @@
+import argparse
+import json
+import math
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from config import Config
+from compiled_config import get_snapshot
+
+CLOSED_STATUSES = ("won", "lost")
+
+def _number(value: Any) -> Optional[float]:
+    # CSV imports hand over strings; blanks and junk count as missing
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+class QuantileSketch:
+    """
+    Streaming quantiles with bounded relative error (a DDSketch). Values are counted in
+    logarithmic buckets, so every quantile is within `relative_accuracy` of the true value and
+    memory grows with the range of the values rather than their number. Sketches merge by
+    adding bucket counts, which is how time windows are combined from daily sketches.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def _key(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, key: int) -> float:
+        # Midpoint (in relative terms) of the bucket (gamma^(key-1), gamma^key]
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value: float, count: int = 1) -> None:
+        """Count `value` `count` times; a negative count takes back values added earlier."""
+        if value <= 0:
+            self.zero_count += count
+        else:
+            key = self._key(value)
+            self.bins[key] = self.bins.get(key, 0) + count
+            if not self.bins[key]:
+                del self.bins[key]
+        self.count += count
+
+    def merge(self, other: "QuantileSketch") -> None:
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        key = None
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                break
+        return self._value(key)
+
+    def count_at_least(self, value: float) -> int:
+        """Approximate number of values >= `value` (exact except within the bucket holding `value`)."""
+        if value <= 0:
+            return self.count
+        threshold = self._key(value)
+        return sum(count for key, count in self.bins.items() if key >= threshold)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"bins": {str(key): count for key, count in self.bins.items()}, "zero": self.zero_count}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], relative_accuracy: float) -> "QuantileSketch":
+        sketch = cls(relative_accuracy)
+        sketch.bins = {int(key): count for key, count in data["bins"].items()}
+        sketch.zero_count = data["zero"]
+        sketch.count = sketch.zero_count + sum(sketch.bins.values())
+        return sketch
+
+class DealStats:
+    """
+    Running totals over closed deals: wins and losses per stage, exact days-to-close counts and
+    a value sketch for won deals, and lost deals per coaching reason. Every query is answered
+    from these counters, so its cost does not depend on how many deals have been recorded.
+    """
+
+    def __init__(self, relative_accuracy: float):
+        self.relative_accuracy = relative_accuracy
+        self.won = 0
+        self.lost = 0
+        # Deals without a close date; they count toward all-time totals but no time window
+        self.undated = 0
+        self.stages: Dict[str, List[int]] = {}  # stage -> [won, lost]
+        self.won_days: Dict[int, int] = {}  # whole days to close -> won deals
+        self.won_value = QuantileSketch(relative_accuracy)
+        # Won deals at or above the high-value threshold in effect when they were recorded
+        self.high_value_threshold: Optional[float] = None
+        self.high_value_wins = 0
+        self.lost_reasons: Dict[str, int] = {}
+
+    def add(self, deal: Dict[str, Any], value_threshold: float, lost_reasons: Sequence[str], count: int = 1) -> None:
+        """Count a closed deal; count=-1 takes back a deal counted earlier, before it is recounted."""
+        won = deal.get("status") == "won"
+        stage = str(deal.get("stage") or "unknown")
+        stage_counts = self.stages.setdefault(stage, [0, 0])
+        stage_counts[0 if won else 1] += count
+        if not any(stage_counts):
+            del self.stages[stage]
+        if not won:
+            self.lost += count
+            text = str(deal.get("lost_reason") or "").lower()
+            if text:
+                reason = next((reason for reason in lost_reasons if reason in text), "other")
+                _increment(self.lost_reasons, reason, count)
+            return
+        self.won += count
+        days = _number(deal.get("days_to_close"))
+        if days is not None:
+            _increment(self.won_days, math.ceil(days), count)
+        value = _number(deal.get("value")) or 0.0
+        if self.high_value_threshold != value_threshold:
+            # The threshold is hot-reloadable; past wins are re-counted from the sketch when it changes
+            self.high_value_wins = self.won_value.count_at_least(value_threshold)
+            self.high_value_threshold = value_threshold
+        if value >= value_threshold:
+            self.high_value_wins += count
+        self.won_value.add(value, count)
+
+    def count_high_value(self, threshold: float) -> int:
+        if self.high_value_threshold == threshold:
+            return self.high_value_wins
+        return self.won_value.count_at_least(threshold)
+
+    def merge(self, other: "DealStats") -> None:
+        self.won += other.won
+        self.lost += other.lost
+        self.undated += other.undated
+        for stage, (won, lost) in other.stages.items():
+            counts = self.stages.setdefault(stage, [0, 0])
+            counts[0] += won
+            counts[1] += lost
+        for days, count in other.won_days.items():
+            self.won_days[days] = self.won_days.get(days, 0) + count
+        for reason, count in other.lost_reasons.items():
+            self.lost_reasons[reason] = self.lost_reasons.get(reason, 0) + count
+        threshold = other.high_value_threshold if other.high_value_threshold is not None else self.high_value_threshold
+        if threshold is not None:
+            self.high_value_wins = self.count_high_value(threshold) + other.count_high_value(threshold)
+            self.high_value_threshold = threshold
+        self.won_value.merge(other.won_value)
+
+    def summary(self, settings: Dict[str, Any], quick_close_days: float, value_threshold: float) -> Dict[str, Any]:
+        closed = self.won + self.lost
+        edges = settings["days_to_close_buckets"]
+        labels = [f"<= {edges[0]} days"] + [f"{low + 1}-{high} days" for low, high in zip(edges, edges[1:])] + [f"> {edges[-1]} days"]
+        histogram = dict.fromkeys(labels, 0)
+        for days, count in self.won_days.items():
+            bucket = next((i for i, edge in enumerate(edges) if days <= edge), len(edges))
+            histogram[labels[bucket]] += count
+        return {
+            "closed": closed,
+            "won": self.won,
+            "lost": self.lost,
+            "win_rate": self.won / closed if closed else None,
+            "stage_win_rates": {
+                stage: {"won": won, "lost": lost, "win_rate": won / (won + lost)}
+                for stage, (won, lost) in sorted(self.stages.items(), key=lambda item: -sum(item[1]))
+            },
+            "days_to_close": histogram,
+            "value_quantiles": {f"p{round(q * 100)}": self.won_value.quantile(q) for q in settings["value_quantiles"]},
+            "quick_wins": sum(count for days, count in self.won_days.items() if days <= quick_close_days),
+            "high_value_wins": self.count_high_value(value_threshold),
+            "lost_reasons": dict(sorted(self.lost_reasons.items(), key=lambda item: -item[1]))
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "won": self.won,
+            "lost": self.lost,
+            "undated": self.undated,
+            "stages": self.stages,
+            "won_days": {str(days): count for days, count in self.won_days.items()},
+            "won_value": self.won_value.to_dict(),
+            "high_value": [self.high_value_threshold, self.high_value_wins],
+            "lost_reasons": self.lost_reasons
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], relative_accuracy: float) -> "DealStats":
+        stats = cls(relative_accuracy)
+        stats.won = data["won"]
+        stats.lost = data["lost"]
+        stats.undated = data.get("undated", 0)
+        stats.stages = data["stages"]
+        stats.won_days = {int(days): count for days, count in data["won_days"].items()}
+        stats.won_value = QuantileSketch.from_dict(data["won_value"], relative_accuracy)
+        stats.high_value_threshold, stats.high_value_wins = data["high_value"]
+        stats.lost_reasons = data["lost_reasons"]
+        return stats
+
+def _increment(counts: Dict[Any, int], key: Any, count: int) -> None:
+    counts[key] = counts.get(key, 0) + count
+    if not counts[key]:
+        del counts[key]
+
+def _close_day(deal: Dict[str, Any]) -> Optional[date]:
+    closed_at = deal.get("closed_at")
+    if isinstance(closed_at, datetime):
+        return closed_at.date()
+    if isinstance(closed_at, date):
+        return closed_at
+    if isinstance(closed_at, str) and closed_at:
+        try:
+            return datetime.fromisoformat(closed_at.replace("Z", "+00:00")).date()
+        except ValueError:
+            pass
+    # No usable close date: guessing one would put the deal in the wrong window
+    return None
+
+# Fields of a deal that its contribution to the totals depends on
+CONTRIBUTION_FIELDS = ("status", "stage", "lost_reason", "days_to_close", "value")
+
+def _contribution(deal: Dict[str, Any]) -> Dict[str, Any]:
+    close_day = _close_day(deal)
+    contribution = {field: deal.get(field) for field in CONTRIBUTION_FIELDS}
+    contribution["closed_on"] = close_day.isoformat() if close_day else None
+    return contribution
+
+class SalesAnalytics:
+    """
+    Sales patterns maintained incrementally as deals close, so coaching over years of history
+    reads running totals instead of rescanning the deals.
+
+    Each closed (won/lost) deal is counted once. The fields it was counted with are kept per
+    deal_id, so when the deal is recorded again with a different stage, value or close date,
+    the old contribution is taken back before the new one is added; deals without a deal_id
+    are counted every time they are recorded. A deal reopened after closing keeps its last
+    contribution until it closes again. All-time totals and per-day totals for the last
+    `max(windows)` days are kept in memory and persisted to SQLite after every batch, so they
+    survive restarts. A window view merges the daily totals it covers; deals without a
+    close date are only in the all-time totals.
+    """
+
+    def __init__(self, path: str, settings: Optional[Dict[str, Any]] = None):
+        self.path = path
+        self.settings = settings or Config.SALES_ANALYTICS
+        self.relative_accuracy = self.settings["relative_accuracy"]
+        self.retention_days = max(self.settings["windows"])
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS deal_stats (period TEXT PRIMARY KEY, state TEXT NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS recorded_deals (deal_id TEXT PRIMARY KEY, contribution TEXT)")
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(recorded_deals)")}
+            if "contribution" not in columns:
+                # Deals recorded before contributions were kept cannot be recounted until `rebuild`
+                self._conn.execute("ALTER TABLE recorded_deals ADD COLUMN contribution TEXT")
+            rows = self._conn.execute("SELECT period, state FROM deal_stats").fetchall()
+        self.total = DealStats(self.relative_accuracy)
+        self.days: Dict[str, DealStats] = {}
+        for period, state in rows:
+            stats = DealStats.from_dict(json.loads(state), self.relative_accuracy)
+            if period == "all":
+                self.total = stats
+            else:
+                self.days[period] = stats
+
+    def _cutoff(self, today: date, window_days: int) -> str:
+        # A window of N days covers today and the N - 1 days before it
+        return (today - timedelta(days=window_days - 1)).isoformat()
+
+    def _count(self, contribution: Dict[str, Any], count: int, cutoff: str, value_threshold: float, lost_reasons: Sequence[str], touched: set) -> None:
+        self.total.add(contribution, value_threshold, lost_reasons, count)
+        period = contribution["closed_on"]
+        if period is None:
+            self.total.undated += count
+        elif period >= cutoff and (count > 0 or period in self.days):
+            self.days.setdefault(period, DealStats(self.relative_accuracy)).add(contribution, value_threshold, lost_reasons, count)
+            touched.add(period)
+
+    def record_deals(self, deals: Iterable[Dict[str, Any]]) -> int:
+        """
+        Add closed deals to the running totals, or recount deals that changed since they were
+        counted, and persist them. Returns the number counted or recounted.
+        """
+        coaching = get_snapshot().sales_coaching
+        value_threshold = coaching["win_patterns"]["high_value"]["deal_size_threshold"]
+        lost_reasons = list(coaching["lost_reasons"])
+        cutoff = self._cutoff(date.today(), self.retention_days)
+        recorded = 0
+        touched = set()
+        with self._lock, self._conn:
+            for deal in deals:
+                if deal.get("status") not in CLOSED_STATUSES:
+                    continue
+                contribution = _contribution(deal)
+                deal_id = deal.get("deal_id")
+                if deal_id is not None:
+                    state = json.dumps(contribution, sort_keys=True, default=str)
+                    row = self._conn.execute("SELECT contribution FROM recorded_deals WHERE deal_id = ?", (str(deal_id),)).fetchone()
+                    if row is not None and (row[0] is None or row[0] == state):
+                        # Unchanged, or counted before contributions were kept
+                        continue
+                    if row is not None:
+                        self._count(json.loads(row[0]), -1, cutoff, value_threshold, lost_reasons, touched)
+                    self._conn.execute(
+                        "INSERT INTO recorded_deals (deal_id, contribution) VALUES (?, ?) "
+                        "ON CONFLICT(deal_id) DO UPDATE SET contribution = excluded.contribution",
+                        (str(deal_id), state)
+                    )
+                self._count(contribution, 1, cutoff, value_threshold, lost_reasons, touched)
+                recorded += 1
+            expired = [period for period in self.days if period < cutoff]
+            for period in expired:
+                del self.days[period]
+            self._conn.executemany("DELETE FROM deal_stats WHERE period = ?", [(period,) for period in expired])
+            if recorded:
+                self._conn.executemany(
+                    "INSERT INTO deal_stats (period, state) VALUES (?, ?) ON CONFLICT(period) DO UPDATE SET state = excluded.state",
+                    [(period, json.dumps(stats.to_dict())) for period, stats in [("all", self.total)] + [(p, self.days[p]) for p in touched]]
+                )
+        return recorded
+
+    def view(self, window_days: Optional[int] = None) -> Dict[str, Any]:
+        """Win rates, days-to-close histogram and value quantiles for all time or the last `window_days` days."""
+        if window_days is not None and not 1 <= window_days <= self.retention_days:
+            raise ValueError(f"window_days must be between 1 and {self.retention_days} (the longest configured window)")
+        win_patterns = get_snapshot().sales_coaching["win_patterns"]
+        with self._lock:
+            if window_days is None:
+                stats = self.total
+            else:
+                cutoff = self._cutoff(date.today(), window_days)
+                stats = DealStats(self.relative_accuracy)
+                for period, day in self.days.items():
+                    if period >= cutoff:
+                        stats.merge(day)
+            summary = stats.summary(
+                self.settings,
+                win_patterns["quick_close"]["days_to_close"],
+                win_patterns["high_value"]["deal_size_threshold"]
+            )
+            undated = self.total.undated
+        # Windows cannot place deals without a close date; all-time figures include them
+        return {"window_days": window_days, **summary, "undated": undated}
+
+    def reset(self) -> None:
+        """Forget every recorded deal, e.g. before rebuilding from the store."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM deal_stats")
+            self._conn.execute("DELETE FROM recorded_deals")
+            self.total = DealStats(self.relative_accuracy)
+            self.days = {}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            recorded = self._conn.execute("SELECT COUNT(*) FROM recorded_deals").fetchone()[0]
+        return {"path": self.path, "recorded_deals": recorded, "closed_deals": self.total.won + self.total.lost, "days": len(self.days)}
+
+_analytics: Optional[SalesAnalytics] = None
+_analytics_lock = threading.Lock()
+
+def get_sales_analytics() -> SalesAnalytics:
+    """Shared analytics at Config.SALES_ANALYTICS["path"], loaded on first use."""
+    global _analytics
+    if _analytics is None:
+        with _analytics_lock:
+            if _analytics is None:
+                _analytics = SalesAnalytics(Config.SALES_ANALYTICS["path"])
+    return _analytics
+
+def record_closed_deals(deals: Iterable[Dict[str, Any]]) -> int:
+    """Feed newly written deals to the shared analytics (if enabled); open deals are ignored."""
+    if not Config.SALES_ANALYTICS["enabled"]:
+        return 0
+    closed = [deal for deal in deals if deal.get("status") in CLOSED_STATUSES]
+    return get_sales_analytics().record_deals(closed) if closed else 0
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description="Incremental sales analytics over closed deals")
+    subcommands = arg_parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("rebuild", help="Recount every closed deal in the CRM store")
+    show_parser = subcommands.add_parser("show", help="Print the analytics as JSON")
+    show_parser.add_argument("--window", type=int, help="Only the last N days")
+    args = arg_parser.parse_args()
+
+    analytics = get_sales_analytics()
+    if args.command == "rebuild":
+        from crm_store import get_crm_store
+
+        analytics.reset()
+        recorded = analytics.record_deals(get_crm_store().iter_records("deals", {"status": list(CLOSED_STATUSES)}))
+        print(f"Recorded {recorded:,} closed deals into {analytics.path}")
+    else:
+        print(json.dumps(analytics.view(args.window), indent=2))
+
+if __name__ == "__main__":
+    main()
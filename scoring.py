@@ -0,0 +1,130 @@
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+import numpy as np
+from compiled_config import get_snapshot
+from records import RecordSource, load_columns
+
+# Score awarded to each deal size bucket (index 0 = high, 1 = medium, 2 = low)
+DEAL_SIZE_SCORES = (1.0, 0.6, 0.3)
+DEFAULT_URGENCY = "low"
+DEFAULT_URGENCY_SCORE = 0.3
+DEFAULT_BEHAVIOR = "neutral"
+DEFAULT_BEHAVIOR_SCORE = 0.5
+
+LEAD_FIELDS = ("deal_size", "urgency", "past_behavior")
+
+class CompiledLeadScorer:
+    """
+    Lead scorer compiled once from the scoring configuration.
+
+    Every lead falls into one cell of a (deal size bucket x urgency x past behavior)
+    grid, so all possible scores are computed up front with the same arithmetic as
+    the per-lead formula. Scoring a lead (or a batch of leads) is then a table lookup,
+    which keeps single-lead and batch results identical.
+    """
+
+    def __init__(self, scoring_config: Mapping[str, Any], segments: Mapping[str, float]):
+        size_config = scoring_config["deal_size"]
+        self.high_threshold = size_config["thresholds"]["high"]
+        self.medium_threshold = size_config["thresholds"]["medium"]
+
+        urgency_values = scoring_config["urgency"]["values"]
+        behavior_values = scoring_config["past_behavior"]["values"]
+        # The last code of each category is reserved for unknown values
+        self.urgency_codes = {key: i for i, key in enumerate(urgency_values)}
+        self.behavior_codes = {key: i for i, key in enumerate(behavior_values)}
+        self.unknown_urgency = len(urgency_values)
+        self.unknown_behavior = len(behavior_values)
+        urgency_scores = list(urgency_values.values()) + [DEFAULT_URGENCY_SCORE]
+        behavior_scores = list(behavior_values.values()) + [DEFAULT_BEHAVIOR_SCORE]
+
+        weights = (
+            size_config["weight"],
+            scoring_config["urgency"]["weight"],
+            scoring_config["past_behavior"]["weight"],
+        )
+        self.table: List[List[List[float]]] = [
+            [
+                [self._combine(weights, size_score, urgency_score, behavior_score) for behavior_score in behavior_scores]
+                for urgency_score in urgency_scores
+            ]
+            for size_score in DEAL_SIZE_SCORES
+        ]
+        self.score_array = np.array(self.table, dtype=np.float64)
+
+        ordered = sorted(segments.items(), key=lambda item: item[1], reverse=True)
+        self.segment_names = [name for name, _ in ordered]
+        self.segment_bounds = [bound for _, bound in ordered]
+        self.segment_array = np.array(self.segment_names)
+        self.segment_index_array = np.vectorize(self._segment_index, otypes=[np.intp])(self.score_array)
+
+    @staticmethod
+    def _combine(weights: Tuple[float, float, float], size_score: float, urgency_score: float, behavior_score: float) -> float:
+        score = 0.0
+        score += size_score * weights[0]
+        score += urgency_score * weights[1]
+        score += behavior_score * weights[2]
+        return round(score * 100, 2)
+
+    def _segment_index(self, score: float) -> int:
+        for i, bound in enumerate(self.segment_bounds):
+            if score >= bound:
+                return i
+        return len(self.segment_bounds) - 1
+
+    def segment(self, score: float) -> str:
+        """Return the segment name for a score."""
+        return self.segment_names[self._segment_index(score)]
+
+    def score_one(self, lead_info: Mapping[str, Any]) -> float:
+        """Score a single lead dict."""
+        deal_size = lead_info.get("deal_size", 0)
+        if deal_size >= self.high_threshold:
+            size_idx = 0
+        elif deal_size >= self.medium_threshold:
+            size_idx = 1
+        else:
+            size_idx = 2
+        urgency_idx = self.urgency_codes.get(lead_info.get("urgency", DEFAULT_URGENCY).lower(), self.unknown_urgency)
+        behavior_idx = self.behavior_codes.get(lead_info.get("past_behavior", DEFAULT_BEHAVIOR).lower(), self.unknown_behavior)
+        return self.table[size_idx][urgency_idx][behavior_idx]
+
+    @staticmethod
+    def _encode(values: Sequence[Any], codes: Mapping[str, int], default: str, unknown: int) -> np.ndarray:
+        # Normalize each distinct raw value once, then map the column through the memo at C speed
+        memo = {
+            value: codes.get(default if value is None else str(value).lower(), unknown)
+            for value in set(values)
+        }
+        return np.fromiter(map(memo.__getitem__, values), dtype=np.intp, count=len(values))
+
+    def score_columns(self, columns: Mapping[str, Sequence[Any]]) -> Dict[str, np.ndarray]:
+        """Score columnar lead data in one vectorized pass."""
+        deal_size = np.asarray(columns["deal_size"], dtype=np.float64)
+        # Missing deal sizes (NaN) fail both comparisons and land in the low bucket, like a default of 0
+        size_idx = np.where(deal_size >= self.high_threshold, 0, np.where(deal_size >= self.medium_threshold, 1, 2))
+        urgency_idx = self._encode(columns["urgency"], self.urgency_codes, DEFAULT_URGENCY, self.unknown_urgency)
+        behavior_idx = self._encode(columns["past_behavior"], self.behavior_codes, DEFAULT_BEHAVIOR, self.unknown_behavior)
+        return {
+            "score": self.score_array[size_idx, urgency_idx, behavior_idx],
+            "segment": self.segment_array[self.segment_index_array[size_idx, urgency_idx, behavior_idx]],
+        }
+
+_lead_scorer: Optional[Tuple[int, CompiledLeadScorer]] = None
+
+def get_lead_scorer() -> CompiledLeadScorer:
+    """Return the shared scorer, recompiling it whenever a new config snapshot is published."""
+    global _lead_scorer
+    snapshot = get_snapshot()
+    cached = _lead_scorer
+    if cached is None or cached[0] != snapshot.version:
+        cached = _lead_scorer = (snapshot.version, CompiledLeadScorer(snapshot.lead_scoring, snapshot.lead_segments))
+    return cached[1]
+
+def score_leads(records: RecordSource) -> Dict[str, np.ndarray]:
+    """
+    Score many leads at once.
+    Input: a list of lead dicts, a dict of columns (deal_size, urgency, past_behavior),
+    or a path to a CSV/Parquet file.
+    Returns a dict with 'score' (float array) and 'segment' (str array), in input order.
+    """
+    return get_lead_scorer().score_columns(load_columns(records, LEAD_FIELDS))
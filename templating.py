@@ -0,0 +1,47 @@
+from string import Formatter
+from typing import Any, Iterable, Mapping, Optional
+
+# Per-lead fields a follow-up template may use; {delay_days} is filled in from the template's own setting
+FOLLOWUP_FIELDS = ("name", "custom_message", "interaction_type")
+
+def _escape(text: str) -> str:
+    return text.replace("{", "{{").replace("}", "}}")
+
+class CompiledTemplate:
+    """
+    A str.format template parsed once. Constant fields (such as a template's delay_days) are
+    substituted at compile time and every other field is checked against `fields`, so a bad
+    template fails when the config is loaded rather than per message, and rendering is a
+    single format_map call. `fields=None` accepts any field name.
+    """
+
+    __slots__ = ("source", "pattern", "fields")
+
+    def __init__(self, template: str, fields: Optional[Iterable[str]] = None, constants: Optional[Mapping[str, Any]] = None):
+        allowed = set(fields) if fields is not None else None
+        constants = constants or {}
+        parts = []
+        names = set()
+        for literal, field, spec, conversion in Formatter().parse(template):
+            parts.append(_escape(literal))
+            if field is None:
+                continue
+            name = field.split(".", 1)[0].split("[", 1)[0]
+            if not name or name.isdigit():
+                raise ValueError(f"Template fields must be named, got '{{{field}}}' in {template!r}")
+            if field in constants and not conversion:
+                parts.append(_escape(format(constants[field], spec or "")))
+                continue
+            if allowed is not None and name not in allowed:
+                raise ValueError(f"Unknown field '{name}' in template {template!r}. Expected one of {sorted(allowed)}")
+            names.add(name)
+            parts.append("{" + field + (f"!{conversion}" if conversion else "") + (f":{spec}" if spec else "") + "}")
+        self.source = template
+        self.pattern = "".join(parts)
+        self.fields = frozenset(names)
+
+    def render(self, values: Mapping[str, Any]) -> str:
+        return self.pattern.format_map(values)
+
+    def __repr__(self) -> str:
+        return f"CompiledTemplate({self.source!r})"
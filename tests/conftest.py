@@ -0,0 +1,5 @@
+import os
+
+# Importing the servers must not start background work or touch shared files during tests
+os.environ.setdefault("AGENT_WARMUP", "off")
+os.environ.setdefault("FOLLOWUP_WORKER_ENABLED", "false")
@@ -0,0 +1,75 @@
+import json
+import time
+import pytest
+from langchain_core.tools import Tool
+from agent_executor import CRMAgentExecutor
+from fake_llm import FakeChatModel
+from main import build_agent
+
+QUOTE = {"summary": "Quoted $50,000", "topic": "Quotation", "tools_used": ["quotation"], "source": []}
+
+def tool(name, func):
+    return Tool(name=name, func=func, description=f"The {name} tool.")
+
+def executor(model, tools, **kwargs):
+    return CRMAgentExecutor(agent=build_agent(model, tools), tools=tools, return_intermediate_steps=True, **kwargs)
+
+def test_a_direct_tool_response_skips_the_second_model_call():
+    model = FakeChatModel(script=[("quot", "quotation", "50k")])
+    result = executor(model, [tool("quotation", lambda query: dict(QUOTE))], direct_tools=frozenset({"quotation"})).invoke(
+        {"query": "quote 50k", "chat_history": []}
+    )
+    assert model.calls == 1
+    assert json.loads(result["output"]) == QUOTE
+
+def test_tools_outside_direct_tools_still_go_back_to_the_model():
+    model = FakeChatModel(script=[("quot", "quotation", "50k")])
+    executor(model, [tool("quotation", lambda query: dict(QUOTE))]).invoke({"query": "quote 50k", "chat_history": []})
+    assert model.calls == 2
+
+def sleeper(seconds, answer):
+    def run(query):
+        time.sleep(seconds)
+        return answer
+    return run
+
+def failing(query):
+    raise RuntimeError("backend down")
+
+def observations(result):
+    return [(action.tool, observation) for action, observation in result["intermediate_steps"]]
+
+def test_parallel_calls_keep_the_model_order():
+    model = FakeChatModel(script=[("slow", "slow_search", "a"), ("fast", "fast_search", "b"), ("quot", "quotation", "c")])
+    tools = [tool("slow_search", sleeper(0.3, "slow result")), tool("fast_search", sleeper(0.01, "fast result")), tool("quotation", lambda query: "quoted")]
+    started = time.monotonic()
+    result = executor(model, tools, blocking_tools=frozenset({"slow_search", "fast_search"})).invoke(
+        {"query": "slow and fast search, then quot", "chat_history": []}
+    )
+    assert observations(result) == [("slow_search", "slow result"), ("fast_search", "fast result"), ("quotation", "quoted")]
+    # The blocking calls overlapped
+    assert time.monotonic() - started < 0.55
+
+def test_a_timed_out_tool_becomes_an_error_observation():
+    model = FakeChatModel(script=[("slow", "slow_search", "a"), ("quot", "quotation", "c")])
+    tools = [tool("slow_search", sleeper(0.5, "too late")), tool("quotation", lambda query: "quoted")]
+    result = executor(model, tools, blocking_tools=frozenset({"slow_search"}), tool_timeouts={"slow_search": 0.05}).invoke(
+        {"query": "slow search and quot", "chat_history": []}
+    )
+    assert observations(result) == [("slow_search", "Error: tool 'slow_search' timed out after 0.05 seconds"), ("quotation", "quoted")]
+
+def test_a_failing_tool_among_several_becomes_an_error_observation():
+    model = FakeChatModel(script=[("search", "web_search", "a"), ("quot", "quotation", "c")])
+    tools = [tool("web_search", failing), tool("quotation", lambda query: "quoted")]
+    result = executor(model, tools, blocking_tools=frozenset({"web_search"})).invoke(
+        {"query": "search and quot", "chat_history": []}
+    )
+    assert observations(result) == [("web_search", "Error: tool 'web_search' failed: backend down"), ("quotation", "quoted")]
+
+def test_a_single_failing_tool_still_raises():
+    for blocking_tools in (frozenset(), frozenset({"web_search"})):
+        model = FakeChatModel(script=[("search", "web_search", "a")])
+        with pytest.raises(RuntimeError, match="backend down"):
+            executor(model, [tool("web_search", failing)], blocking_tools=blocking_tools).invoke(
+                {"query": "search", "chat_history": []}
+            )
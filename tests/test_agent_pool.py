@@ -0,0 +1,26 @@
+import queue
+import pytest
+from fake_llm import FakeChatModel
+from main import AgentExecutorPool, build_agent
+
+def test_a_busy_pool_times_out_instead_of_blocking_forever():
+    pool = AgentExecutorPool(size=1, tool_agent=build_agent(FakeChatModel(latency=0)), timeout=0.05)
+    with pool.acquire():
+        with pytest.raises(queue.Empty):
+            with pool.acquire():
+                pass
+    # The executor went back to the pool
+    with pool.acquire(timeout=0.05):
+        pass
+
+def test_a_busy_pool_answers_503(monkeypatch):
+    import app as flask_app
+
+    def busy(inputs):
+        raise queue.Empty
+
+    monkeypatch.setattr(flask_app.executor_pool, "invoke", busy)
+    monkeypatch.setattr(flask_app.response_cache, "get", lambda query: None)
+    response = flask_app.app.test_client().post("/api/ask", json={"message": "hello there"})
+    assert response.status_code == 503
+    assert "capacity" in response.get_json()["error"]
@@ -0,0 +1,44 @@
+import asyncio
+import time
+import httpx
+import asgi
+
+def slow_route(query):
+    # A direct tool stuck on a slow CRM lookup
+    time.sleep(0.3)
+    return {
+        "path": asgi.FAST_PATH,
+        "tool": "quotation",
+        "reason": "test",
+        "response": {"topic": "Quotation", "summary": query, "tools_used": ["quotation"], "source": []}
+    }
+
+async def post_while_ticking(path: str, message: str):
+    ticks = []
+
+    async def tick():
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    ticker = asyncio.create_task(tick())
+    transport = httpx.ASGITransport(app=asgi.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post(path, json={"message": message})
+    ticker.cancel()
+    return response, ticks
+
+def test_ask_keeps_the_event_loop_free_during_a_slow_direct_tool(monkeypatch):
+    monkeypatch.setattr(asgi, "route_request", slow_route)
+    response, ticks = asyncio.run(post_while_ticking("/api/ask", "Quote $80k"))
+    assert response.status_code == 200
+    assert response.json()["route"] == asgi.FAST_PATH
+    # The loop kept running other tasks while the route was computed
+    assert len(ticks) >= 10
+
+def test_stream_keeps_the_event_loop_free_during_a_slow_direct_tool(monkeypatch):
+    monkeypatch.setattr(asgi, "route_request", slow_route)
+    response, ticks = asyncio.run(post_while_ticking("/api/ask/stream", "Quote $90k"))
+    assert response.status_code == 200
+    assert "event: final" in response.text
+    assert len(ticks) >= 10
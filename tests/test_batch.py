@@ -0,0 +1,20 @@
+from batch import run_batch
+
+def answer(query):
+    if query == "boom":
+        raise RuntimeError("model unavailable")
+    response = {"topic": "t", "summary": query, "tools_used": [], "source": []}
+    return response, "cache" if query == "cached" else "agent"
+
+def test_summary_counts_cache_hits_and_agent_errors_separately():
+    results = list(run_batch(["cached", "fresh", "boom", "boom"], answer, 2))
+    done = results[-1]
+    assert (done["cache"], done["agent"], done["errors"]) == (1, 1, 2)
+
+def test_batch_rejects_a_bad_concurrency():
+    import app as flask_app
+
+    client = flask_app.app.test_client()
+    for concurrency in ("many", None, 0, -2):
+        response = client.post("/api/ask/batch", json={"items": ["hi"], "concurrency": concurrency})
+        assert response.status_code == 400
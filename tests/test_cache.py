@@ -0,0 +1,60 @@
+from cache import ToolResultCache
+
+def journal_lines(path) -> int:
+    with open(path, encoding="utf-8") as f:
+        return sum(1 for _ in f)
+
+def test_journal_directory_is_created(tmp_path):
+    path = tmp_path / "missing" / "web_search.jsonl"
+    cache = ToolResultCache("web_search", ttl=60, persist_path=str(path))
+    cache.get_or_call("cranes", lambda query: f"about {query}")
+    assert path.exists()
+
+def test_journal_is_compacted_as_it_grows(tmp_path):
+    path = str(tmp_path / "web_search.jsonl")
+    cache = ToolResultCache("web_search", ttl=60, max_entries=5, persist_path=path, compact_factor=4)
+    for i in range(200):
+        cache.get_or_call(f"query {i}", lambda query: query.upper())
+    # Never more than compact_factor records per live entry
+    assert journal_lines(path) < 4 * 5
+    reloaded = ToolResultCache("web_search", ttl=60, max_entries=5, persist_path=path)
+    assert reloaded.get_or_call("query 199", lambda query: "upstream") == "QUERY 199"
+    assert reloaded.upstream_calls == 0
+
+def response_cache(**ttls):
+    from cache import ResponseCache
+    from config import Config
+    settings = dict(Config.RESPONSE_CACHE, enabled=True, similarity_mode=False)
+    settings["tool_ttls"] = dict(Config.RESPONSE_CACHE["tool_ttls"], **ttls)
+    return ResponseCache(settings)
+
+def answer(topic, tools_used, source=()):
+    return {"topic": topic, "summary": "done", "source": list(source), "tools_used": tools_used}
+
+def test_followup_answers_are_not_cached():
+    cache = response_cache()
+    cache.set("follow up with L1", answer("Follow-up Plan", ["followup"]))
+    assert cache.get("follow up with L1") is None
+
+def test_quotations_with_documents_are_not_cached(tmp_path):
+    cache = response_cache()
+    cache.set("quote 50k for L1 as pdf", answer("Quotation", ["quotation"]))
+    assert cache.get("quote 50k for L1 as pdf") is None
+    cache.set("quote 50k for L1", answer("Quotation", ["quotation"], [str(tmp_path / "Q1.html")]))
+    assert cache.get("quote 50k for L1") is None
+    cache.set("quote 60k for L1", answer("Quotation", ["quotation"]))
+    assert cache.get("quote 60k for L1")["topic"] == "Quotation"
+
+def test_parse_fallbacks_are_not_cached():
+    from response_parsing import parse_response
+    from main import Response
+    cache = response_cache()
+    fallback = parse_response("Sorry, I could not do that", Response).model_dump()
+    cache.set("do the thing", fallback)
+    assert cache.get("do the thing") is None
+
+def test_pipeline_scans_use_their_own_ttl():
+    cache = response_cache(pipeline_scanner=0)
+    cache.set("scan deals.csv", answer("Pipeline Risk Scan", ["pipeline_scanner"], ["deals.csv"]))
+    assert cache.get("scan deals.csv") is None
+    assert response_cache().ttl_for(["pipeline_scanner"]) == 300
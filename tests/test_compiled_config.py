@@ -0,0 +1,68 @@
+import json
+import pytest
+from cache import ResponseCache
+from compiled_config import ConfigWatcher, get_snapshot, reload_config
+from config import Config
+from scoring import get_lead_scorer
+
+HOT_LEAD = {"deal_size": 75000, "urgency": "high", "past_behavior": "positive"}
+
+@pytest.fixture
+def overrides(tmp_path):
+    path = tmp_path / "overrides.json"
+    yield path
+    # Publish the plain Config tables again for the other tests
+    reload_config(str(tmp_path / "missing.json"))
+
+def write(path, settings):
+    path.write_text(json.dumps(settings), encoding="utf-8")
+
+def test_reload_publishes_a_new_snapshot_only_when_settings_change(overrides):
+    before = reload_config(str(overrides))
+    write(overrides, {"RISK_FACTORS": {"inactive_days": 3}})
+    after = reload_config(str(overrides))
+    assert after.version == before.version + 1
+    assert after.risk_factors["inactive_days"] == 3
+    # Untouched keys of an overridden section keep their Config values
+    assert after.risk_factors["delayed_response"] == Config.RISK_FACTORS["delayed_response"]
+    assert get_snapshot() is after
+    assert reload_config(str(overrides)) is after
+
+def test_snapshots_are_read_only(overrides):
+    snapshot = reload_config(str(overrides))
+    with pytest.raises(AttributeError):
+        snapshot.version = 99
+    with pytest.raises(TypeError):
+        snapshot.risk_factors["inactive_days"] = 1
+
+def test_invalid_overrides_are_rejected(overrides):
+    write(overrides, {"NOT_A_SECTION": {}})
+    with pytest.raises(ValueError):
+        reload_config(str(overrides))
+
+def test_reload_invalidates_the_scorer_and_the_response_cache(overrides):
+    reload_config(str(overrides))
+    cache = ResponseCache(dict(Config.RESPONSE_CACHE, enabled=True, similarity_mode=False))
+    cache.set("qualify lead L1", {"topic": "Lead Qualification", "summary": "hot", "source": [], "tools_used": ["lead_qualifier"]})
+    assert cache.get("qualify lead L1") is not None
+    assert get_lead_scorer().score_one(HOT_LEAD) == 100.0
+
+    write(overrides, {"LEAD_SCORING": {"urgency": {"values": {"high": 0.5}}}})
+    reload_config(str(overrides))
+    assert get_lead_scorer().score_one(HOT_LEAD) < 100.0
+    assert cache.get("qualify lead L1") is None
+    assert cache.invalidations == 1
+
+def test_watcher_reloads_changed_files_and_keeps_the_last_good_snapshot(overrides):
+    write(overrides, {"RISK_FACTORS": {"inactive_days": 3}})
+    watcher = ConfigWatcher(str(overrides), interval=60)
+    reload_config(str(overrides))
+    assert not watcher.check()
+
+    write(overrides, {"RISK_FACTORS": {"inactive_days": 45}})
+    assert watcher.check()
+    assert get_snapshot().risk_factors["inactive_days"] == 45
+
+    overrides.write_text("{not json", encoding="utf-8")
+    assert not watcher.check()
+    assert get_snapshot().risk_factors["inactive_days"] == 45
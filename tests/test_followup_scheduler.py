@@ -0,0 +1,67 @@
+from followup_scheduler import FollowUpScheduler, LogSender, followup_key, recipient_for
+from config import Config
+
+def make_scheduler(tmp_path) -> FollowUpScheduler:
+    return FollowUpScheduler(str(tmp_path / "followups.db"), senders={"email": LogSender()}, settings=dict(Config.FOLLOWUP_SCHEDULER))
+
+def test_only_an_email_or_lead_id_is_a_recipient():
+    assert recipient_for({"email": "a@example.com", "lead_id": 7}) == "a@example.com"
+    assert recipient_for({"lead_id": 7, "name": "Ann"}) == "7"
+    assert recipient_for({"name": "Ann"}) is None
+    assert recipient_for({}) is None
+
+def test_same_message_is_scheduled_once_and_a_different_one_again(tmp_path):
+    scheduler = make_scheduler(tmp_path)
+    first = followup_key("email", "a@example.com", "general", "2026-01-01", "Hello")
+    other = followup_key("email", "a@example.com", "general", "2026-01-01", "Hello again")
+    followup_id, created = scheduler.schedule("a@example.com", "Hi", "Hello", 0, channel="email", key=first)
+    assert created
+    assert scheduler.schedule("a@example.com", "Hi", "Hello", 0, channel="email", key=first) == (followup_id, False)
+    other_id, created = scheduler.schedule("a@example.com", "Hi", "Hello again", 0, channel="email", key=other)
+    assert created and other_id != followup_id
+    assert scheduler.stats()["pending"] == 2
+
+class RecordingSender(LogSender):
+    def __init__(self, sent, during_send=None):
+        self.sent = sent
+        self.during_send = during_send
+
+    def send(self, followup):
+        if self.during_send is not None:
+            self.during_send()
+        self.sent.append(followup["id"])
+
+def test_workers_sharing_a_journal_send_each_followup_once(tmp_path):
+    sent = []
+    path = str(tmp_path / "followups.db")
+    settings = dict(Config.FOLLOWUP_SCHEDULER)
+    first = FollowUpScheduler(path, senders={"email": RecordingSender(sent, lambda: second.run_due())}, settings=settings)
+    first.schedule_many({"recipient": f"{i}@example.com", "subject": "Hi", "message": "Hello", "due_at": 0, "channel": "email"} for i in range(5))
+    # A second process loads the same pending follow-ups into its own heap and runs while the first is sending
+    second = FollowUpScheduler(path, senders={"email": RecordingSender(sent)}, settings=settings)
+    assert first.run_due() == 5
+    assert sorted(sent) == [1, 2, 3, 4, 5]
+    assert second.stats()["sent"] == 5
+
+def test_an_expired_claim_is_sent_again_after_a_restart(tmp_path):
+    path = str(tmp_path / "followups.db")
+    settings = dict(Config.FOLLOWUP_SCHEDULER, claim_timeout=0)
+    crashed = FollowUpScheduler(path, senders={"email": LogSender()}, settings=settings)
+    followup_id, _ = crashed.schedule("a@example.com", "Hi", "Hello", 0, channel="email")
+    with crashed._conn:
+        crashed._conn.execute("UPDATE followups SET status = 'sending', claimed_at = 0 WHERE id = ?", (followup_id,))
+    sent = []
+    restarted = FollowUpScheduler(path, senders={"email": RecordingSender(sent)}, settings=settings)
+    assert restarted.run_due() == 1
+    assert sent == [followup_id]
+
+def test_a_worker_sends_followups_scheduled_by_another_process(tmp_path):
+    sent = []
+    path = str(tmp_path / "followups.db")
+    settings = dict(Config.FOLLOWUP_SCHEDULER)
+    worker = FollowUpScheduler(path, senders={"email": RecordingSender(sent)}, settings=settings)
+    web = FollowUpScheduler(path, senders={"email": LogSender()}, settings=settings)
+    followup_id, _ = web.schedule("a@example.com", "Hi", "Hello", 0, channel="email")
+    assert worker.run_due() == 1
+    assert sent == [followup_id]
+    assert web.due() == []
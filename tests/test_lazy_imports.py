@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+import pytest
+from benchmark import DEFERRED_MODULES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run_python(code):
+    # Without tool selection, building the agent builds the tool-calling agent right away
+    env = dict(os.environ, GOOGLE_API_KEY=os.environ.get("GOOGLE_API_KEY", "test-key"), TOOL_SELECTION_ENABLED="false")
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+@pytest.mark.parametrize("module", ["main", "app"])
+def test_importing_the_entry_points_defers_the_heavy_modules(module):
+    loaded = run_python(
+        f"import sys, {module}\n"
+        f"print([name for name in {list(DEFERRED_MODULES)!r} if name in sys.modules])"
+    )
+    assert loaded.strip() == "[]"
+
+def test_main_llm_and_agent_are_built_once_on_first_access():
+    output = run_python(
+        "import sys, main\n"
+        "assert 'langchain_google_genai' not in sys.modules\n"
+        "llm = main.llm\n"
+        "assert 'langchain_google_genai' in sys.modules and 'langchain.agents' not in sys.modules\n"
+        "assert main.llm is llm is main.get_llm()\n"
+        "agent = main.agent\n"
+        "assert 'langchain.agents' in sys.modules\n"
+        "assert main.agent is agent is main.get_agent()\n"
+        "assert main.prompt is main.get_prompt()\n"
+        "print('ok')"
+    )
+    assert output.strip() == "ok"
+
+def test_unknown_attributes_still_raise():
+    import main
+
+    with pytest.raises(AttributeError):
+        main.not_a_setting
@@ -0,0 +1,51 @@
+import tools
+
+def test_bulk_scoring_without_lead_ids_never_opens_the_store(monkeypatch):
+    def no_store():
+        raise AssertionError("the CRM store was opened")
+
+    monkeypatch.setattr(tools, "get_crm_store", no_store)
+    results = tools.lead_qualifier_bulk([
+        {"deal_size": 75000, "urgency": "high", "past_behavior": "positive"},
+        {"deal_size": 5000, "urgency": "low", "past_behavior": "negative"}
+    ])
+    assert len(results) == 2
+    assert all(result["tools_used"] == ["lead_qualifier"] for result in results)
+
+def _store_with_leads(tmp_path, monkeypatch, leads):
+    from crm_store import CRMStore
+    store = CRMStore(str(tmp_path / "crm.db"))
+    store.import_records("leads", leads)
+    monkeypatch.setattr(tools, "get_crm_store", lambda: store)
+    return store
+
+def test_filtered_qualification_ranks_every_match_not_just_the_largest(tmp_path, monkeypatch):
+    leads = [
+        {"lead_id": f"L{i}", "name": f"Big {i}", "deal_size": 1000000, "urgency": "low", "past_behavior": "negative"}
+        for i in range(600)
+    ]
+    leads.append({"lead_id": "BEST", "name": "Best", "deal_size": 60000, "urgency": "high", "past_behavior": "positive"})
+    _store_with_leads(tmp_path, monkeypatch, leads)
+    monkeypatch.setattr(tools, "LEAD_SCORING_CHUNK", 64)
+
+    summary = tools.lead_qualifier_tool({"filter": {}, "limit": 3})["summary"]
+    assert "**Matching Leads:** 601" in summary
+    top = summary.split("**Top Leads:**\n")[1].splitlines()
+    assert top[0].startswith("- Best (BEST): 100.0/100")
+    # Equal scores keep store order
+    assert top[1].startswith("- Big 0 (L0): 55.0/100") and top[2].startswith("- Big 1 (L1)")
+
+def test_filtered_qualification_only_scores_matching_leads(tmp_path, monkeypatch):
+    _store_with_leads(tmp_path, monkeypatch, [
+        {"lead_id": "A", "name": "Alpha", "deal_size": 60000, "urgency": "high", "past_behavior": "positive"},
+        {"lead_id": "B", "name": "Beta", "deal_size": 20000, "urgency": "medium", "past_behavior": "neutral"},
+        {"lead_id": "C", "name": "Gamma", "deal_size": 5000, "urgency": "low", "past_behavior": "negative"}
+    ])
+
+    summary = tools.lead_qualifier_tool({"filter": {"max_deal_size": 30000}})["summary"]
+    assert "**Matching Leads:** 2" in summary
+    assert "Alpha" not in summary
+    assert summary.index("Beta") < summary.index("Gamma")
+
+    summary = tools.lead_qualifier_tool({"filter": {"min_deal_size": 1000000}})["summary"]
+    assert "**Matching Leads:** 0" in summary and "Top Leads" not in summary
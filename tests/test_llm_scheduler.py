@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import time
+import pytest
+from config import Config
+from fake_llm import FakeQuotaError
+from llm_scheduler import BATCH, LLMQueueTimeout, LLMScheduler, is_rate_limit_error, llm_priority
+
+def make_scheduler(**overrides) -> LLMScheduler:
+    settings = dict(
+        Config.LLM_SCHEDULER, requests_per_minute=60000, tokens_per_minute=10**9, burst_seconds=1,
+        max_concurrency=1, max_queue_wait=5, base_backoff=0.01, max_backoff=0.05
+    )
+    settings.update(overrides)
+    return LLMScheduler(settings)
+
+def test_cancelled_async_waiter_releases_its_place():
+    scheduler = make_scheduler()
+    held = scheduler.acquire(1)
+
+    async def run():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(scheduler.aacquire(1), 0.05)
+        scheduler.release(held)
+        # The cancelled ticket must not be admitted (and keep the only slot) after the release
+        ticket = await asyncio.wait_for(scheduler.aacquire(1), 1)
+        scheduler.release(ticket)
+
+    asyncio.run(run())
+    stats = scheduler.stats()
+    assert stats["in_flight"] == 0
+    assert stats["queued"] == {"interactive": 0, "batch": 0}
+    assert stats["cancelled"] == 1
+
+def test_timed_out_sync_waiter_releases_its_place():
+    scheduler = make_scheduler(max_queue_wait=0.05)
+    held = scheduler.acquire(1)
+    with pytest.raises(LLMQueueTimeout):
+        scheduler.acquire(1)
+    scheduler.release(held)
+    scheduler.release(scheduler.acquire(1))
+    stats = scheduler.stats()
+    assert stats["in_flight"] == 0
+    assert stats["timed_out"] == 1
+
+def test_interactive_calls_are_admitted_before_queued_batch_calls():
+    scheduler = make_scheduler()
+    held = scheduler.acquire(1)
+    order = []
+
+    def wait(lane: str) -> None:
+        with llm_priority(lane):
+            ticket = scheduler.acquire(1)
+        order.append(lane)
+        scheduler.release(ticket)
+
+    batch = threading.Thread(target=wait, args=(BATCH,))
+    batch.start()
+    time.sleep(0.05)
+    interactive = threading.Thread(target=wait, args=("interactive",))
+    interactive.start()
+    time.sleep(0.05)
+    scheduler.release(held)
+    batch.join(2)
+    interactive.join(2)
+    assert order == ["interactive", BATCH]
+
+def test_quota_errors_are_retried_and_halve_the_concurrency_limit():
+    scheduler = make_scheduler(max_concurrency=8)
+    attempts = []
+
+    def call() -> str:
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise FakeQuotaError(0.01)
+        return "ok"
+
+    assert scheduler.call(call, 10) == "ok"
+    stats = scheduler.stats()
+    assert len(attempts) == 2
+    assert stats["rate_limited"] == 1
+    assert stats["concurrency_limit"] == 4
+    assert stats["in_flight"] == 0
+
+def test_only_quota_errors_count_as_rate_limits():
+    class ResourceExhausted(Exception):
+        pass
+
+    assert is_rate_limit_error(FakeQuotaError(1))
+    assert is_rate_limit_error(ResourceExhausted("slow down"))
+    wrapped = RuntimeError("model call failed")
+    wrapped.__cause__ = ResourceExhausted("slow down")
+    assert is_rate_limit_error(wrapped)
+    assert not is_rate_limit_error(ValueError("monthly quota report for 429 deals"))
+    assert not is_rate_limit_error(ValueError("HTTP 429"))
@@ -0,0 +1,24 @@
+import followup_scheduler
+from config import Config
+from followup_scheduler import FollowUpScheduler, LogSender
+from mail_merge import run_campaign
+
+CONTACTS = [
+    {"name": "Ann", "email": "ann@example.com"},
+    {"name": "Bob", "lead_id": "L-2"},
+    {"name": "Cy"}
+]
+
+def test_campaign_counts_new_duplicate_and_unaddressed_messages(tmp_path, monkeypatch):
+    scheduler = FollowUpScheduler(str(tmp_path / "followups.db"), senders={"email": LogSender()}, settings=dict(Config.FOLLOWUP_SCHEDULER))
+    monkeypatch.setattr(followup_scheduler, "_scheduler", scheduler)
+    output = str(tmp_path / "messages.jsonl")
+
+    first = run_campaign(CONTACTS, output, template="Hi {name}", schedule=True, channel="email")
+    assert (first["messages"], first["scheduled"], first["already_scheduled"], first["no_recipient"]) == (3, 2, 0, 1)
+    again = run_campaign(CONTACTS, output, template="Hi {name}", schedule=True, channel="email")
+    assert (again["scheduled"], again["already_scheduled"]) == (0, 2)
+    # Different ad-hoc text is a different campaign, not a duplicate
+    other = run_campaign(CONTACTS, output, template="Hello again {name}", schedule=True, channel="email")
+    assert (other["scheduled"], other["already_scheduled"]) == (2, 0)
+    assert scheduler.stats()["pending"] == 4
@@ -0,0 +1,63 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from config import Config
+from memory import ConversationMemory, SQLiteSessionStore, estimate_tokens
+
+def settings(**overrides):
+    return {**Config.CONVERSATION_MEMORY, "enabled": True, "backend": "memory", **overrides}
+
+def talk(memory, session_id, turns):
+    for i in range(turns):
+        memory.append(session_id, f"Question {i} about deal D{i}", f"Answer {i}: deal D{i} is in negotiation")
+
+def test_old_turns_are_folded_into_the_summary():
+    memory = ConversationMemory(settings(window_turns=3))
+    talk(memory, "s1", 5)
+    history = memory.history("s1")
+    assert "Question 0" in history[0].content and "Question 1" in history[0].content
+    assert isinstance(history[1], AIMessage)
+    assert [message.content for message in history[2::2]] == ["Question 2 about deal D2", "Question 3 about deal D3", "Question 4 about deal D4"]
+    assert all(isinstance(message, HumanMessage) for message in history[2::2])
+
+def test_history_stays_within_the_token_budget():
+    memory = ConversationMemory(settings(window_turns=50, max_history_tokens=200, summary_max_tokens=60))
+    for i in range(40):
+        memory.append("s1", f"Question {i}: " + "details " * 20, f"Answer {i}: " + "findings " * 20)
+    history = memory.history("s1")
+    summary, turns = history[0].content, history[2:]
+    assert estimate_tokens(summary) <= 60 + estimate_tokens("Summary of our earlier conversation:\n")
+    assert sum(estimate_tokens(message.content) for message in turns) <= 200
+    # The newest turn is always kept verbatim, and the summary keeps the most recent folded turns
+    assert turns[-2].content.startswith("Question 39:")
+    assert "Question 0:" not in summary
+
+def test_unknown_and_invalid_sessions_have_no_history():
+    memory = ConversationMemory(settings())
+    memory.append(None, "hello", "hi")
+    memory.append("x" * 500, "hello", "hi")
+    assert memory.history(None) == []
+    assert memory.history("x" * 500) == []
+    assert memory.history("never-seen") == []
+
+def test_sqlite_sessions_survive_a_restart(tmp_path):
+    path = str(tmp_path / "conversations.db")
+    memory = ConversationMemory(settings(window_turns=2), store=SQLiteSessionStore(path, max_sessions=10, idle_ttl=3600))
+    talk(memory, "s1", 3)
+    before = [message.content for message in memory.history("s1")]
+
+    restarted = ConversationMemory(settings(window_turns=2), store=SQLiteSessionStore(path, max_sessions=10, idle_ttl=3600))
+    assert [message.content for message in restarted.history("s1")] == before
+    restarted.clear("s1")
+    assert memory.history("s1") == []
+
+def test_sqlite_store_prunes_idle_and_excess_sessions(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "conversations.db"), max_sessions=2, idle_ttl=3600, evict_every=1)
+    for session_id in ("a", "b", "c"):
+        store.save(session_id, {"summary": "", "turns": [{"query": "q", "answer": "a"}]})
+    assert store.stats()["sessions"] == 2
+    assert store.load("a") is None and store.load("c") is not None
+    assert SQLiteSessionStore(str(tmp_path / "conversations.db"), max_sessions=2, idle_ttl=0).load("c") is None
+
+def test_unknown_backends_are_rejected():
+    with pytest.raises(ValueError):
+        ConversationMemory(settings(backend="redis"))
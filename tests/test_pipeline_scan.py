@@ -0,0 +1,55 @@
+import itertools
+import random
+from pipeline_scan import scan_pipeline
+from tools import calculate_deal_risk
+
+def deal_book():
+    rng = random.Random(7)
+    stages = ["lead", "qualified", "proposal_sent", "negotiation", "closed_won"]
+    deals = []
+    for i in range(300):
+        deals.append({
+            "deal_id": f"D{i}",
+            "stage": rng.choice(stages),
+            "value": rng.choice([5000, 20000, 75000, 150000]),
+            "inactive_days": rng.randint(0, 40),
+            "price_sensitivity": round(rng.random(), 2),
+            "competitor_mentioned": rng.random() < 0.4,
+            "response_delay": rng.randint(0, 10)
+        })
+    # Missing fields score like the tool's zero defaults
+    deals.append({"deal_id": "EMPTY", "stage": "lead"})
+    return deals
+
+def test_scan_matches_calculate_deal_risk_per_deal():
+    deals = deal_book()
+    result = scan_pipeline(deals, top_k=len(deals), chunk_size=64)
+    assessments = {deal["deal_id"]: calculate_deal_risk(deal) for deal in deals}
+
+    assert result["deals_scanned"] == len(deals)
+    assert result["at_risk"] == sum(a["is_at_risk"] for a in assessments.values())
+    by_id = {deal["deal_id"]: deal for deal in deals}
+    assert {deal["deal_id"] for deal in result["top_at_risk"]} == {i for i, a in assessments.items() if a["is_at_risk"]}
+    for deal in result["top_at_risk"]:
+        assert deal["risk_score"] == assessments[deal["deal_id"]]["risk_score"]
+        assert deal["risk_reasons"] == assessments[deal["deal_id"]]["risk_reasons"]
+        assert {key: deal[key] for key in by_id[deal["deal_id"]]} == by_id[deal["deal_id"]]
+
+    # Highest risk, then highest value, then earliest in the book
+    position = {deal["deal_id"]: i for i, deal in enumerate(deals)}
+    keys = [(-deal["risk_score"], -deal["value"], position[deal["deal_id"]]) for deal in result["top_at_risk"]]
+    assert keys == sorted(keys)
+
+    for stage, group in itertools.groupby(sorted(deals, key=lambda deal: deal["stage"]), key=lambda deal: deal["stage"]):
+        group = list(group)
+        totals = result["stages"][stage]
+        assert totals["deals"] == len(group)
+        assert totals["at_risk"] == sum(assessments[deal["deal_id"]]["is_at_risk"] for deal in group)
+        assert totals["avg_risk_score"] == round(sum(assessments[deal["deal_id"]]["risk_score"] for deal in group) / len(group), 3)
+        assert totals["total_value"] == sum(deal.get("value", 0) for deal in group)
+
+def test_top_k_keeps_the_riskiest_deals_across_chunks():
+    deals = deal_book()
+    everything = scan_pipeline(deals, top_k=len(deals), chunk_size=1000)["top_at_risk"]
+    top = scan_pipeline(deals, top_k=5, chunk_size=16)["top_at_risk"]
+    assert [deal["deal_id"] for deal in top] == [deal["deal_id"] for deal in everything[:5]]
@@ -0,0 +1,17 @@
+import os
+from config import Config
+from tools import quotation_tool
+
+def test_a_single_format_string_renders_that_format(tmp_path, monkeypatch):
+    monkeypatch.setitem(Config.QUOTATION_DOCS, "output_dir", str(tmp_path))
+    result = quotation_tool({"base_price": 80000, "customer_type": "vip", "formats": "pdf", "quote_id": "Q1"})
+    assert result["source"] == [os.path.join(str(tmp_path), "Q1.pdf")]
+    assert os.path.exists(result["source"][0])
+
+def test_pricing_helpers_are_still_importable_from_tools():
+    from tools import calculate_adjusted_price, select_quotation_template
+    import quotation_docs
+    assert calculate_adjusted_price is quotation_docs.calculate_adjusted_price
+    assert select_quotation_template is quotation_docs.select_quotation_template
+    assert select_quotation_template({"base_price": 60000}) == "premium"
+    assert calculate_adjusted_price(50000, {"urgency": "medium", "customer_type": "regular"}) == 50000
@@ -0,0 +1,23 @@
+import pytest
+from record_writer import BufferedRecordWriter, RecordWriterError, get_writer
+
+def test_a_failed_batch_fails_flush_and_later_writes(tmp_path):
+    blocker = tmp_path / "not_a_directory"
+    blocker.write_text("")
+    writer = BufferedRecordWriter(str(blocker / "out.txt"), flush_interval=0.01)
+    writer.write({"timestamp": "now", "data": "lost"})
+    with pytest.raises(RecordWriterError):
+        writer.flush(timeout=5)
+    with pytest.raises(RecordWriterError):
+        writer.write({"timestamp": "now", "data": "refused"})
+    writer.close(timeout=5)
+
+def test_get_writer_replaces_a_failed_writer(tmp_path):
+    path = str(tmp_path / "out.jsonl")
+    writer = get_writer(path, "jsonl")
+    writer.error = OSError("disk full")
+    replacement = get_writer(path, "jsonl")
+    assert replacement is not writer
+    replacement.write({"timestamp": "now", "data": "saved"})
+    assert replacement.flush(timeout=5)
+    replacement.close(timeout=5)
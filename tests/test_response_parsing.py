@@ -0,0 +1,38 @@
+import pytest
+from main import Response
+from response_parsing import extract_json_object, parse_response
+
+@pytest.mark.parametrize("output, expected", [
+    # Unescaped quotes inside a string
+    ('{"topic": "Quote", "summary": "He said "yes" to 50k"}', {"topic": "Quote", "summary": 'He said "yes" to 50k'}),
+    # Single-quoted strings with apostrophes
+    ("{'topic': 'Deal', 'summary': 'It's stalled since Acme's review'}", {"topic": "Deal", "summary": "It's stalled since Acme's review"}),
+    # Output cut off mid-string and mid-list
+    ('{"topic": "Leads", "summary": "L1 is hot", "tools_used": ["lead_qual', {"topic": "Leads", "summary": "L1 is hot", "tools_used": ["lead_qual"]}),
+    # Output cut off after a key
+    ('{"topic": "Leads", "summary":', {"topic": "Leads", "summary": None}),
+    # Bare keys
+    ('{topic: "Leads", summary: "L1 is hot"}', {"topic": "Leads", "summary": "L1 is hot"}),
+    # Python literals
+    ('{"topic": "Leads", "hot": True, "stale": False, "owner": None}', {"topic": "Leads", "hot": True, "stale": False, "owner": None}),
+    # Trailing commas and raw newlines
+    ('{"topic": "Leads", "summary": "line one\nline two", "source": ["crm",],}', {"topic": "Leads", "summary": "line one\nline two", "source": ["crm"]}),
+    # Fenced and prefixed with prose
+    ('Here you go:\n```json\n{"topic": "Leads"}\n```', {"topic": "Leads"}),
+])
+def test_repair_rules(output, expected):
+    assert extract_json_object(output) == expected
+
+def test_no_json_object():
+    assert extract_json_object("No structured answer today") is None
+
+def test_an_object_without_response_fields_gives_way_to_the_next_one():
+    output = 'Calling {"deal_size": 50000} first, then {"topic": "Quotation", "summary": "Quoted 50k", "tools_used": ["quotation"]}'
+    response = parse_response(output, Response)
+    assert (response.topic, response.summary, response.tools_used) == ("Quotation", "Quoted 50k", ["quotation"])
+    # Without a later candidate the first object is still used
+    assert extract_json_object('{"deal_size": 50000} and nothing else', ["topic", "summary"]) == {"deal_size": 50000}
+
+def test_unparseable_output_falls_back_to_a_general_answer():
+    response = parse_response("Sorry, I could not do that", Response)
+    assert (response.topic, response.summary, response.source, response.tools_used) == ("General", "Sorry, I could not do that", [], [])
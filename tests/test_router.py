@@ -0,0 +1,51 @@
+import pytest
+from router import match_direct_tool, parse_amount
+
+@pytest.mark.parametrize("text, amount", [
+    ("Quote $55,000 for a vip customer", 55000),
+    ("quote 75k", 75000),
+    ("quote 1.2m for a premium customer", 1200000),
+    ("deal size 75000, high urgency", 75000),
+    ("budget is 40,000 dollars", 40000),
+    ("quote 3 million", 3000000)
+])
+def test_amounts_with_a_money_marker(text, amount):
+    assert parse_amount(text) == amount
+
+@pytest.mark.parametrize("text", [
+    "quote for 2 cranes at 80k",
+    "quote for a 50 ton crane next week",
+    "quote 80k or 90k",
+    "quote for customer abc"
+])
+def test_missing_or_ambiguous_amounts(text):
+    assert parse_amount(text) is None
+
+def test_ambiguous_quotes_go_to_the_agent():
+    assert match_direct_tool("quote for 2 cranes at 80k")[1] is None
+    assert match_direct_tool("quote for a 50 ton crane next week")[1] is None
+    tool, tool_input, _ = match_direct_tool("Quote $80k for a vip customer")
+    assert tool == "quotation" and tool_input["base_price"] == 80000
+
+def test_whole_amounts_are_ints():
+    assert parse_amount("deal size 60k") == 60000
+    assert isinstance(parse_amount("deal size 60k"), int)
+    assert parse_amount("price 12.5") == 12.5
+
+@pytest.mark.parametrize("message", [
+    "Why did we lose the deal with Acme in proposal_sent?",
+    "what is the qualified deal count in the pipeline",
+    "Explain the closed_won deal stage",
+    "The deal with Acme is unqualified and at risk",
+    "Assess the deal moving from qualified to negotiation",
+    "We signed the deal in negotiation yesterday",
+    '{"deal_id": "D-42"}'
+])
+def test_messages_that_are_not_a_deal_status_go_to_the_agent(message):
+    assert match_direct_tool(message)[1] is None
+
+def test_a_deal_status_takes_the_fast_path():
+    tool, tool_input, _ = match_direct_tool("The deal with Acme is stuck in negotiation, inactive for 20 days, and they mentioned a competitor")
+    assert tool == "pipeline_manager"
+    assert tool_input == {"stage": "negotiation", "inactive_days": 20, "competitor_mentioned": True}
+    assert match_direct_tool('{"deal_id": "D-42", "stage": "negotiation"}')[0] == "pipeline_manager"
@@ -0,0 +1,36 @@
+from datetime import date, timedelta
+from sales_analytics import SalesAnalytics
+
+def make_analytics(tmp_path) -> SalesAnalytics:
+    return SalesAnalytics(str(tmp_path / "analytics.db"))
+
+def test_an_updated_deal_replaces_its_earlier_contribution(tmp_path):
+    analytics = make_analytics(tmp_path)
+    today = date.today().isoformat()
+    deal = {"deal_id": "D1", "status": "lost", "stage": "proposal", "lost_reason": "price", "closed_at": today}
+    assert analytics.record_deals([deal]) == 1
+    assert analytics.record_deals([deal]) == 0
+    assert analytics.record_deals([dict(deal, status="won", value=120000, days_to_close=10)]) == 1
+    for view in (analytics.view(), analytics.view(30)):
+        assert (view["won"], view["lost"]) == (1, 0)
+        assert view["lost_reasons"] == {}
+        assert view["stage_win_rates"] == {"proposal": {"won": 1, "lost": 0, "win_rate": 1.0}}
+
+def test_moving_the_close_date_moves_the_deal_between_windows(tmp_path):
+    analytics = make_analytics(tmp_path)
+    deal = {"deal_id": "D1", "status": "won", "value": 5000, "closed_at": date.today().isoformat()}
+    analytics.record_deals([deal])
+    analytics.record_deals([dict(deal, closed_at=(date.today() - timedelta(days=60)).isoformat())])
+    assert analytics.view(30)["won"] == 0
+    assert analytics.view(90)["won"] == 1
+    assert analytics.view()["won"] == 1
+
+def test_undated_deals_are_only_in_all_time_figures(tmp_path):
+    analytics = make_analytics(tmp_path)
+    analytics.record_deals([{"deal_id": "D1", "status": "won", "value": 5000}])
+    assert analytics.view()["won"] == 1
+    window = analytics.view(30)
+    assert window["won"] == 0
+    assert window["undated"] == 1
+    # Totals survive a restart
+    assert make_analytics(tmp_path).view(30)["undated"] == 1
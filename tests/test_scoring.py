@@ -0,0 +1,50 @@
+import itertools
+from config import Config
+from scoring import get_lead_scorer, score_leads
+from tools import calculate_lead_score
+
+def baseline_score(lead_info):
+    """The per-lead arithmetic the compiled table replaced."""
+    scoring_config = Config.LEAD_SCORING
+    deal_size = lead_info.get("deal_size", 0)
+    if deal_size >= scoring_config["deal_size"]["thresholds"]["high"]:
+        size_score = 1.0
+    elif deal_size >= scoring_config["deal_size"]["thresholds"]["medium"]:
+        size_score = 0.6
+    else:
+        size_score = 0.3
+    score = size_score * scoring_config["deal_size"]["weight"]
+    score += scoring_config["urgency"]["values"].get(lead_info.get("urgency", "low").lower(), 0.3) * scoring_config["urgency"]["weight"]
+    score += scoring_config["past_behavior"]["values"].get(lead_info.get("past_behavior", "neutral").lower(), 0.5) * scoring_config["past_behavior"]["weight"]
+    return round(score * 100, 2)
+
+def baseline_segment(score):
+    return next(name for name, bound in sorted(Config.LEAD_SEGMENTS.items(), key=lambda item: -item[1]) if score >= bound)
+
+def leads():
+    thresholds = Config.LEAD_SCORING["deal_size"]["thresholds"]
+    sizes = [0, thresholds["medium"] - 1, thresholds["medium"], thresholds["high"] - 0.5, thresholds["high"], 10 ** 7]
+    urgencies = list(Config.LEAD_SCORING["urgency"]["values"]) + ["HIGH", "someday"]
+    behaviors = list(Config.LEAD_SCORING["past_behavior"]["values"]) + ["Positive", "unknown"]
+    for deal_size, urgency, behavior in itertools.product(sizes, urgencies, behaviors):
+        yield {"deal_size": deal_size, "urgency": urgency, "past_behavior": behavior}
+    # Missing fields use the baseline defaults
+    yield {}
+    yield {"deal_size": thresholds["high"]}
+
+def test_table_scores_match_the_baseline_arithmetic():
+    scorer = get_lead_scorer()
+    for lead in leads():
+        expected = baseline_score(lead)
+        assert scorer.score_one(lead) == expected == calculate_lead_score(lead), lead
+        assert scorer.segment(expected) == baseline_segment(expected)
+
+def test_batch_scores_match_single_lead_scores():
+    batch = list(leads())
+    scored = score_leads(batch)
+    assert scored["score"].tolist() == [baseline_score(lead) for lead in batch]
+    assert scored["segment"].tolist() == [baseline_segment(baseline_score(lead)) for lead in batch]
+
+def test_missing_deal_sizes_score_like_zero_in_batches():
+    scored = score_leads({"deal_size": [None], "urgency": ["high"], "past_behavior": ["positive"]})
+    assert scored["score"].tolist() == [baseline_score({"deal_size": 0, "urgency": "high", "past_behavior": "positive"})]
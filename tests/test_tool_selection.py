@@ -0,0 +1,22 @@
+from tool_selection import get_tool_selector
+
+def test_every_tool_the_query_needs_is_bound():
+    selection = get_tool_selector().select("Research Acme Corp and then score them as a lead with deal size 120k")
+    assert {"web_search", "lead_qualifier"} <= set(selection.names)
+
+def test_generic_words_do_not_bind_unrelated_tools():
+    selection = get_tool_selector().select("Why do we keep losing deals on price?")
+    assert "sales_coach" in selection.names
+    assert "save_text_to_file" not in selection.names
+    assert len(selection.names) <= 3
+
+def test_companions_past_max_tools_fall_back_to_every_tool():
+    # save_text_to_file and quotation both match; the research companions make four tools
+    selector = get_tool_selector()
+    selection = selector.select("Save this quotation to a file")
+    assert selection.fallback
+    assert selection.names == selector.names
+
+def test_vague_queries_bind_every_tool():
+    selection = get_tool_selector().select("what about the other one?")
+    assert selection.fallback
@@ -0,0 +1,60 @@
+import pytest
+from langchain_core.tools import Tool
+import tracing
+
+DEAL_STATUS = "The deal with Acme is stuck in negotiation, inactive for 20 days, and they mentioned a competitor"
+
+@pytest.fixture
+def traced(monkeypatch):
+    monkeypatch.setattr(tracing, "_enabled", True)
+
+def metric_lines(prefix):
+    return [line for line in tracing.render_metrics().splitlines() if line.startswith(prefix)]
+
+def test_disabled_tracing_records_nothing(monkeypatch):
+    monkeypatch.setattr(tracing, "_enabled", False)
+    before = tracing.render_metrics()
+    with tracing.trace_request() as trace:
+        with tracing.span("parse", "disabled_check"):
+            pass
+        tracing.record_cache_event("response", "hit")
+    assert trace.timings() is None
+    assert tracing.span("parse") is tracing._NOOP_SPAN
+    assert tracing.render_metrics() == before
+
+def test_spans_cache_events_and_tools_reach_the_trace_and_metrics(traced):
+    tool = tracing.instrument_tool(Tool(name="traced_tool", func=lambda query: query.upper(), description="Test tool."))
+    assert tracing.instrument_tool(tool).func is tool.func
+    with tracing.trace_request() as trace:
+        with tracing.span("parse", "traced_parse"):
+            pass
+        with pytest.raises(ValueError):
+            with tracing.span("parse", "traced_failure"):
+                raise ValueError("bad output")
+        assert tool.run("crane") == "CRANE"
+        tracing.record_cache_event("traced_cache", "miss")
+        trace.route = "traced_route"
+
+    timings = trace.timings()
+    assert [(span["kind"], span["name"]) for span in timings["spans"]] == [
+        ("parse", "traced_parse"), ("parse", "traced_failure"), ("tool", "traced_tool")
+    ]
+    assert timings["spans"][1]["error"] is True
+    assert timings["cache"] == {"traced_cache": "miss"}
+    assert metric_lines('crm_requests_total{route="traced_route"}') == ['crm_requests_total{route="traced_route"} 1']
+    assert metric_lines('crm_span_errors_total{kind="parse",name="traced_failure"}') == ['crm_span_errors_total{kind="parse",name="traced_failure"} 1']
+    assert metric_lines('crm_span_duration_seconds_count{kind="tool",name="traced_tool"}') == ['crm_span_duration_seconds_count{kind="tool",name="traced_tool"} 1']
+    assert metric_lines('crm_cache_events_total{cache="traced_cache",outcome="miss"}') == ['crm_cache_events_total{cache="traced_cache",outcome="miss"} 1']
+
+def test_api_requests_report_timings_and_metrics(traced):
+    import app as flask_app
+
+    client = flask_app.app.test_client()
+    payload = client.post("/api/ask", json={"message": DEAL_STATUS, "include_timings": True}).get_json()
+    assert payload["route"] == "fast_path"
+    kinds = {span["kind"] for span in payload["timings"]["spans"]}
+    assert {"route", "tool"} <= kinds
+
+    metrics = client.get("/metrics")
+    assert metrics.content_type.startswith("text/plain")
+    assert any(line.startswith('crm_requests_total{route="fast_path"}') for line in metrics.get_data(as_text=True).splitlines())
@@ -0,0 +1,152 @@
+import json
+import math
+import re
+import threading
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from config import Config
+from memory import estimate_tokens
+
+# Picks the few tools relevant to a query so only their schemas are bound to the model call.
+# A BM25 index over each tool's name, description and configured keywords; no model involved.
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do for from has have i in is it me my of on or our please "
+    "the this to us we what with you your".split()
+)
+
+def _stem(word: str) -> str:
+    # Just enough folding that "quotes"/"quoted"/"quoting" and "deals"/"deal" meet
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(word) > len(suffix) + 3 and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word
+
+def tokenize(text: str) -> List[str]:
+    return [_stem(word) for word in _WORD.findall(text.lower()) if word not in STOPWORDS]
+
+def tool_schema_tokens(tool: Any) -> int:
+    """Estimated prompt tokens a tool adds to every model call it is bound to (its function schema)."""
+    from langchain_core.utils.function_calling import convert_to_openai_tool
+
+    return estimate_tokens(json.dumps(convert_to_openai_tool(tool)))
+
+class ToolSelection:
+    """The tools chosen for one query and what binding only them saves."""
+
+    __slots__ = ("names", "scores", "fallback", "tokens_bound", "tokens_saved")
+
+    def __init__(self, names: Tuple[str, ...], scores: Dict[str, float], fallback: bool, tokens_bound: int, tokens_saved: int):
+        self.names = names
+        self.scores = scores
+        self.fallback = fallback
+        self.tokens_bound = tokens_bound
+        self.tokens_saved = tokens_saved
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "tools": list(self.names),
+            "fallback": self.fallback,
+            "tokens_bound": self.tokens_bound,
+            "tokens_saved": self.tokens_saved,
+            "scores": {name: round(score, 3) for name, score in self.scores.items()}
+        }
+
+class ToolSelector:
+    """
+    Ranks tools against a query with BM25 and keeps every tool scoring at least `min_score`,
+    best first, up to `max_tools`. `companions` adds tools that are used together, such as
+    research tools for save_text_to_file. When no tool reaches `min_score`, or the companions
+    take the subset past `max_tools`, every tool is kept, so a poor match never hides the tool
+    the model needed.
+    """
+
+    def __init__(self, tools: Sequence[Any], settings: Dict[str, Any]):
+        self.tools = list(tools)
+        self.names = tuple(tool.name for tool in self.tools)
+        self.max_tools = settings["max_tools"]
+        self.min_score = settings["min_score"]
+        self.companions = settings.get("companions", {})
+        keywords = settings.get("keywords", {})
+        documents = [
+            tokenize(f"{tool.name.replace('_', ' ')} {tool.description} {keywords.get(tool.name, '')}")
+            for tool in self.tools
+        ]
+        self._term_counts = [Counter(document) for document in documents]
+        self._lengths = [len(document) for document in documents]
+        self._average_length = sum(self._lengths) / len(self._lengths) if self._lengths else 1.0
+        frequency = Counter(term for counts in self._term_counts for term in counts)
+        total = len(documents)
+        self._idf = {term: math.log(1 + (total - n + 0.5) / (n + 0.5)) for term, n in frequency.items()}
+        self._k1 = settings.get("k1", 1.2)
+        self._b = settings.get("b", 0.75)
+        self._schema_tokens: Optional[Dict[str, int]] = None
+        self._schema_lock = threading.Lock()
+        # Queries repeat across the steps of one agent run (and across users), so selections are memoized
+        self.select = lru_cache(maxsize=settings.get("cache_size", 1024))(self._select)
+
+    def schema_tokens(self) -> Dict[str, int]:
+        if self._schema_tokens is None:
+            with self._schema_lock:
+                if self._schema_tokens is None:
+                    self._schema_tokens = {tool.name: tool_schema_tokens(tool) for tool in self.tools}
+        return self._schema_tokens
+
+    def scores(self, query: str) -> Dict[str, float]:
+        terms = [term for term in tokenize(query) if term in self._idf]
+        scores = {}
+        for name, counts, length in zip(self.names, self._term_counts, self._lengths):
+            score = 0.0
+            for term in terms:
+                tf = counts.get(term, 0)
+                if tf:
+                    norm = self._k1 * (1 - self._b + self._b * length / self._average_length)
+                    score += self._idf[term] * tf * (self._k1 + 1) / (tf + norm)
+            if score > 0:
+                scores[name] = score
+        return scores
+
+    def _select(self, query: str) -> ToolSelection:
+        scores = self.scores(query)
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        chosen = {name for name in ranked[:self.max_tools] if scores[name] >= self.min_score}
+        for name in list(chosen):
+            chosen.update(self.companions.get(name, ()))
+        fallback = not chosen or len(chosen) > self.max_tools
+        if fallback:
+            chosen = set(self.names)
+        names = tuple(name for name in self.names if name in chosen)
+        tokens = self.schema_tokens()
+        bound = sum(tokens[name] for name in names)
+        return ToolSelection(names, scores, fallback, bound, sum(tokens.values()) - bound)
+
+    def tools_for(self, selection: ToolSelection) -> List[Any]:
+        return [tool for tool in self.tools if tool.name in selection.names]
+
+_selector: Optional[ToolSelector] = None
+_selector_lock = threading.Lock()
+
+def get_tool_selector() -> ToolSelector:
+    """Shared selector over tools.TOOLS, built on first use."""
+    global _selector
+    if _selector is None:
+        with _selector_lock:
+            if _selector is None:
+                from tools import TOOLS
+
+                _selector = ToolSelector(TOOLS, Config.TOOL_SELECTION)
+    return _selector
+
+def main() -> None:
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Show which tools would be bound for a query")
+    arg_parser.add_argument("query", nargs="+")
+    args = arg_parser.parse_args()
+    print(json.dumps(get_tool_selector().select(" ".join(args.query)).to_dict(), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,41 @@
-from langchain_community.tools import WikipediaQueryRun, DuckDuckGoSearchRun
-from langchain_community.utilities import WikipediaAPIWrapper
-from langchain.tools import Tool
+from langchain_core.tools import Tool
 from datetime import datetime, timedelta
+from functools import lru_cache
 import random
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from itertools import islice
+import heapq
 import json
+import os
 from config import Config
+from compiled_config import get_snapshot
+from cache import ToolResultCache
+from record_writer import BufferedRecordWriter, get_writer
+from scoring import get_lead_scorer, score_leads
+from pipeline_scan import scan_pipeline
+from crm_store import STORE_SOURCE_PREFIX, get_crm_store
+from crm_client import get_crm_client
+from sales_analytics import get_sales_analytics
+from followup_scheduler import followup_key, get_followup_scheduler, recipient_for
+# The pricing helpers moved to quotation_docs; they stay importable from here
+from quotation_docs import build_quotation, calculate_adjusted_price, render_quotation_documents, select_quotation_template
 
 # --- Utility Tools ---
 
+def _output_writers(filename: str) -> List[BufferedRecordWriter]:
+    settings = dict(Config.OUTPUT_WRITER)
+    write_jsonl = settings.pop("write_jsonl")
+    writers = [get_writer(filename, "text", **settings)]
+    if write_jsonl:
+        writers.append(get_writer(os.path.splitext(filename)[0] + ".jsonl", "jsonl", **settings))
+    return writers
+
 def save_to_txt(data: str, filename: str = "research_output.txt") -> dict:
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    formatted_text = f"--- Research Output ---\nTimestamp: {timestamp}\n\n{data}\n\n"
-    with open(filename, "a", encoding="utf-8") as f:
-        f.write(formatted_text)
+    # Queued for the background writer so the tool returns without waiting on file I/O
+    record = {"timestamp": timestamp, "data": data}
+    for writer in _output_writers(filename):
+        writer.write(record)
     summary = f"Data successfully saved to {filename} at {timestamp}."
     return {
         "summary": summary,
@@ -32,10 +54,42 @@ save_tool = Tool(
     )
 )
 
-search = DuckDuckGoSearchRun()
+# The search clients (and langchain_community) are imported on the first search, not at startup
+@lru_cache(maxsize=None)
+def _duckduckgo():
+    from langchain_community.tools import DuckDuckGoSearchRun
+
+    return DuckDuckGoSearchRun()
+
+@lru_cache(maxsize=None)
+def _wikipedia():
+    from langchain_community.tools import WikipediaQueryRun
+    from langchain_community.utilities import WikipediaAPIWrapper
+
+    return WikipediaQueryRun(api_wrapper=WikipediaAPIWrapper(top_k_results=1, doc_content_chars_max=2000))
+
+# Upstream lookups behind the search tools; replace an entry with a stub to run offline
+SEARCH_BACKENDS = {
+    "web_search": lambda query: _duckduckgo().run(query),
+    "wikipedia": lambda query: _wikipedia().run(query)
+}
+
+def _tool_cache(name: str) -> ToolResultCache:
+    settings = Config.TOOL_CACHE[name]
+    persist_dir = Config.TOOL_CACHE.get("persist_dir")
+    return ToolResultCache(
+        name,
+        ttl=settings["ttl"],
+        max_entries=settings["max_entries"],
+        persist_path=os.path.join(persist_dir, f"{name}.jsonl") if persist_dir else None,
+        compact_factor=Config.TOOL_CACHE["compact_factor"]
+    )
+
+search_cache = _tool_cache("web_search")
+wiki_cache = _tool_cache("wikipedia")
 
 def search_summary(query: str) -> dict:
-    result = search.run(query)
+    result = search_cache.get_or_call(query, SEARCH_BACKENDS["web_search"])
     if isinstance(result, list):
         summary = "\n".join(str(item) for item in result)
     else:
@@ -58,9 +112,8 @@ search_tool = Tool(
     )
 )
 
-api_wrapper = WikipediaAPIWrapper(top_k_results=1, doc_content_chars_max=2000)
 def wiki_summary(query: str) -> dict:
-    result = wiki_tool.run(query)
+    result = wiki_cache.get_or_call(query, SEARCH_BACKENDS["wikipedia"])
     return {
         "summary": f"### Wikipedia Summary for '{query}':\n{result}",
         "topic": "Wikipedia Search",
@@ -78,64 +131,122 @@ wiki_tool = Tool(
     )
 )
 
+# --- CRM Store Lookups ---
+
+def _store_limit(args: Dict[str, Any]) -> int:
+    settings = Config.CRM_STORE
+    return max(1, min(int(args.get("limit", settings["default_limit"])), settings["max_limit"]))
+
+def _store_source(table: str, record_id: Any = None) -> List[str]:
+    return [f"{STORE_SOURCE_PREFIX}{table}" + (f"/{record_id}" if record_id is not None else "")]
+
+def _lookup_record(table: str, record_id: Any) -> Optional[Dict[str, Any]]:
+    # The CRM API when it is enabled (cached and batched by the shared client), otherwise the local store
+    if Config.CRM_CLIENT["enabled"]:
+        return get_crm_client().get_record(table, record_id)
+    return get_crm_store().get(table, record_id)
+
+def _lookup_records(table: str, record_ids: List[Any]) -> Dict[str, Dict[str, Any]]:
+    if not record_ids:
+        # Nothing to look up, so don't open (or create) the store or call the API
+        return {}
+    if Config.CRM_CLIENT["enabled"]:
+        return get_crm_client().get_records(table, record_ids)
+    store = get_crm_store()
+    records = {str(record_id): store.get(table, record_id) for record_id in record_ids}
+    return {record_id: record for record_id, record in records.items() if record is not None}
+
+def _with_stored_record(args: Dict[str, Any], table: str, key: str) -> Dict[str, Any]:
+    """Fill in a tool input that names a stored record by id; fields given in the input take precedence."""
+    if args.get(key) is None:
+        return args
+    record = _lookup_record(table, args[key])
+    if record is None:
+        raise ValueError(f"No CRM record with {key} '{args[key]}'")
+    return {**record, **args}
+
 # --- CRM/Agentic Tools ---
 
 def calculate_lead_score(lead_info: Dict[str, Any]) -> float:
     """Calculate a normalized lead score based on configured weights and thresholds."""
-    score = 0.0
-    scoring_config = Config.LEAD_SCORING
-    
-    # Deal size scoring
-    deal_size = lead_info.get("deal_size", 0)
-    if deal_size >= scoring_config["deal_size"]["thresholds"]["high"]:
-        size_score = 1.0
-    elif deal_size >= scoring_config["deal_size"]["thresholds"]["medium"]:
-        size_score = 0.6
-    else:
-        size_score = 0.3
-    score += size_score * scoring_config["deal_size"]["weight"]
-    
-    # Urgency scoring
-    urgency = lead_info.get("urgency", "low").lower()
-    urgency_score = scoring_config["urgency"]["values"].get(urgency, 0.3)
-    score += urgency_score * scoring_config["urgency"]["weight"]
-    
-    # Past behavior scoring
-    behavior = lead_info.get("past_behavior", "neutral").lower()
-    behavior_score = scoring_config["past_behavior"]["values"].get(behavior, 0.5)
-    score += behavior_score * scoring_config["past_behavior"]["weight"]
-    
-    return round(score * 100, 2)
+    return get_lead_scorer().score_one(lead_info)
 
-def lead_qualifier_tool(lead_info: Dict[str, Any]) -> Dict[str, Any]:
-    """Enhanced lead qualification with detailed analysis and recommendations."""
-    score = calculate_lead_score(lead_info)
-    
-    # Determine segment
-    if score >= 70:
-        segment = "hot"
-        priority = "high"
-        recommended_actions = [
+LEAD_SEGMENT_ACTIONS = {
+    "hot": (
+        "high",
+        [
             "Schedule immediate follow-up",
             "Prepare customized proposal",
             "Alert senior sales representative"
         ]
-    elif score >= 40:
-        segment = "warm"
-        priority = "medium"
-        recommended_actions = [
+    ),
+    "warm": (
+        "medium",
+        [
             "Schedule follow-up within 48 hours",
             "Send relevant case studies",
             "Prepare standard proposal"
         ]
-    else:
-        segment = "cold"
-        priority = "low"
-        recommended_actions = [
+    ),
+    "cold": (
+        "low",
+        [
             "Add to nurture campaign",
             "Schedule follow-up in 1 week",
             "Send company information"
         ]
+    )
+}
+
+def lead_qualifier_tool(lead_info: Dict[str, Any]) -> Dict[str, Any]:
+    """Enhanced lead qualification with detailed analysis and recommendations."""
+    if isinstance(lead_info.get("filter"), dict):
+        return _qualify_stored_leads(lead_info)
+    lead_info = _with_stored_record(lead_info, "leads", "lead_id")
+    scorer = get_lead_scorer()
+    score = scorer.score_one(lead_info)
+    
+    # Determine segment
+    segment = scorer.segment(score)
+    return _lead_qualification_result(lead_info, score, segment)
+
+def _vectorizable_lead(lead_info: Dict[str, Any]) -> bool:
+    # Leads the per-lead scorer would reject (e.g. a string deal_size) keep its exact behavior
+    deal_size = lead_info.get("deal_size", 0)
+    return (
+        isinstance(deal_size, (int, float)) and not isinstance(deal_size, bool)
+        and isinstance(lead_info.get("urgency", "low"), str)
+        and isinstance(lead_info.get("past_behavior", "neutral"), str)
+    )
+
+def lead_qualifier_bulk(leads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Qualify many leads at once; scores come from one vectorized pass instead of per-lead scoring."""
+    results: List[Optional[Dict[str, Any]]] = [None] * len(leads)
+    # Stored leads are fetched with one bulk lookup and scored with the rest; filters and
+    # unknown ids go through lead_qualifier_tool
+    stored = _lookup_records("leads", [
+        lead["lead_id"] for lead in leads if lead.get("lead_id") is not None and "filter" not in lead
+    ])
+    resolved = []
+    for lead in leads:
+        if lead.get("lead_id") is None and "filter" not in lead:
+            resolved.append(lead)
+        elif "filter" not in lead and str(lead["lead_id"]) in stored:
+            resolved.append({**stored[str(lead["lead_id"])], **lead})
+        else:
+            resolved.append(None)
+    vectorizable = [i for i, lead in enumerate(resolved) if lead is not None and _vectorizable_lead(lead)]
+    if vectorizable:
+        scored = score_leads([resolved[i] for i in vectorizable])
+        for i, score, segment in zip(vectorizable, scored["score"], scored["segment"]):
+            results[i] = _lead_qualification_result(resolved[i], float(score), str(segment))
+    for i, result in enumerate(results):
+        if result is None:
+            results[i] = lead_qualifier_tool(leads[i])
+    return results
+
+def _lead_qualification_result(lead_info: Dict[str, Any], score: float, segment: str) -> Dict[str, Any]:
+    priority, recommended_actions = LEAD_SEGMENT_ACTIONS[segment]
     
     analysis = {
         "deal_size_analysis": f"Deal size: ${lead_info.get('deal_size', 0):,}",
@@ -143,8 +254,10 @@ def lead_qualifier_tool(lead_info: Dict[str, Any]) -> Dict[str, Any]:
         "historical_engagement": lead_info.get("past_behavior", "neutral").capitalize()
     }
     
-    summary = (
-        f"### Lead Qualification Results\n"
+    summary = "### Lead Qualification Results\n"
+    if "lead_id" in lead_info:
+        summary += f"**Lead:** {lead_info.get('name', lead_info['lead_id'])} ({lead_info['lead_id']})\n"
+    summary += (
         f"**Score:** {score}/100\n"
         f"**Segment:** {segment.capitalize()} ({priority.capitalize()} Priority)\n\n"
         f"**Analysis:**\n"
@@ -159,7 +272,51 @@ def lead_qualifier_tool(lead_info: Dict[str, Any]) -> Dict[str, Any]:
         "summary": summary,
         "topic": "Lead Qualification",
         "tools_used": ["lead_qualifier"],
-        "source": []
+        "source": _store_source("leads", lead_info["lead_id"]) if "lead_id" in lead_info else []
+    }
+
+# Stored leads scored per score_leads call when a filter is qualified
+LEAD_SCORING_CHUNK = 20000
+
+def _qualify_stored_leads(args: Dict[str, Any]) -> Dict[str, Any]:
+    """Score the stored leads matching args["filter"] and list the best ones."""
+    store = get_crm_store()
+    limit = _store_limit(args)
+    records = store.iter_records("leads", args["filter"], chunk_size=LEAD_SCORING_CHUNK)
+    # No column orders leads by score, so every match is scored a chunk at a time and only the best are kept
+    top: List[Tuple[float, int, str, Dict[str, Any]]] = []
+    matching = 0
+    while True:
+        leads = list(islice(records, LEAD_SCORING_CHUNK))
+        if not leads:
+            break
+        scored = score_leads(leads)
+        for score, segment, lead in zip(scored["score"], scored["segment"], leads):
+            # Ties keep the earlier lead; the negated position also stops comparisons reaching the dicts
+            item = (float(score), -matching, str(segment), lead)
+            matching += 1
+            if len(top) < limit:
+                heapq.heappush(top, item)
+            elif item > top[0]:
+                heapq.heapreplace(top, item)
+    ranked = [(score, segment, lead) for score, _, segment, lead in sorted(top, reverse=True)]
+    
+    summary = (
+        f"### Lead Qualification Results\n"
+        f"**Matching Leads:** {matching:,}\n"
+    )
+    if ranked:
+        summary += "\n**Top Leads:**\n" + "\n".join(
+            f"- {lead.get('name', lead['lead_id'])} ({lead['lead_id']}): {float(score)}/100, "
+            f"{str(segment).capitalize()} ({LEAD_SEGMENT_ACTIONS[str(segment)][0].capitalize()} Priority)"
+            for score, segment, lead in ranked
+        )
+    
+    return {
+        "summary": summary,
+        "topic": "Lead Qualification",
+        "tools_used": ["lead_qualifier"],
+        "source": _store_source("leads")
     }
 
 lead_qualifier = Tool(
@@ -167,30 +324,25 @@ lead_qualifier = Tool(
     func=lead_qualifier_tool,
     description=(
         "Advanced lead scoring and qualification system. "
-        "Input: a dictionary with keys: deal_size (int), urgency (str: 'high'/'medium'/'low'), past_behavior (str: 'positive'/'neutral'/'negative'). "
+        "Input: a dictionary with keys: deal_size (int), urgency (str: 'high'/'medium'/'low'), past_behavior (str: 'positive'/'neutral'/'negative'); "
+        "or lead_id (str) to qualify a stored lead; or filter (dict, e.g. {'owner': 'sam', 'min_deal_size': 50000}) and limit (int) to rank stored leads. "
         "Returns detailed qualification analysis with score, segment, and recommendations."
     )
 )
 
 def generate_followup_message(template_key: str, context: Dict[str, Any]) -> Dict[str, str]:
     """Generate a personalized follow-up message based on template and context."""
-    template_config = Config.FOLLOWUP_TEMPLATES.get(
-        template_key,
-        Config.FOLLOWUP_TEMPLATES["general"]
-    )
-    
-    # Extract context variables
-    name = context.get("name", "Valued Customer")
-    custom_message = context.get("custom_message", "")
-    interaction_type = context.get("interaction_type", "last interaction")
-    
-    # Format template
-    message = template_config["template"].format(
-        name=name,
-        custom_message=custom_message,
-        interaction_type=interaction_type,
-        delay_days=template_config["delay_days"]
-    )
+    snapshot = get_snapshot()
+    if template_key not in snapshot.followup_templates:
+        template_key = "general"
+    template_config = snapshot.followup_templates[template_key]
+    
+    # Render the template compiled with the config snapshot
+    message = snapshot.followup_messages[template_key].render({
+        "name": context.get("name", "Valued Customer"),
+        "custom_message": context.get("custom_message", ""),
+        "interaction_type": context.get("interaction_type", "last interaction")
+    })
     
     return {
         "subject": template_config["subject"],
@@ -231,6 +383,25 @@ def followup_tool(args: Dict[str, Any]) -> Dict[str, Any]:
         f"**Delay:** {followup_content['delay_days']} days"
     )
     
+    if args.get("schedule") and Config.FOLLOWUP_SCHEDULER["enabled"]:
+        recipient = recipient_for(lead_context)
+        channel = args.get("channel") or Config.FOLLOWUP_SCHEDULER["default_channel"]
+        if recipient is None:
+            summary += "\n**Status:** Not scheduled (the lead has no email or lead_id to send to)"
+        else:
+            followup_id, created = get_followup_scheduler().schedule(
+                recipient,
+                followup_content["subject"],
+                followup_content["message"],
+                next_followup.timestamp(),
+                channel=channel,
+                # Requesting the same message again is a no-op; a different message is scheduled too
+                key=followup_key(channel, recipient, template_key, next_followup.strftime("%Y-%m-%d"), followup_content["message"]),
+                payload={"lead_context": lead_context, "template": template_key}
+            )
+            status = "Scheduled" if created else "Already scheduled"
+            summary += f"\n**Status:** {status} (#{followup_id} via {channel})"
+    
     return {
         "summary": summary,
         "topic": "Follow-up",
@@ -243,64 +414,16 @@ followup = Tool(
     func=followup_tool,
     description=(
         "Smart follow-up system with templating and scheduling. "
-        "Input: a dictionary with keys: lead_context (dict with 'name', 'custom_message'), last_interaction (str). "
-        "Returns personalized message and scheduling recommendations."
+        "Input: a dictionary with keys: lead_context (dict with 'name', 'custom_message', optional 'email' or 'lead_id'), last_interaction (str), "
+        "optional schedule (bool) and optional channel (str, e.g. 'email'). "
+        "Returns the personalized message. Only when schedule is true, and the lead has an 'email' or 'lead_id', "
+        "is the message also queued to be sent on the follow-up date."
     )
 )
 
-def select_quotation_template(deal_context: Dict[str, Any]) -> str:
-    """Select the most appropriate quotation template based on deal context."""
-    deal_size = deal_context.get("base_price", 0)
-    customer_type = deal_context.get("customer_type", "regular")
-    
-    if deal_size >= 100000 or customer_type == "vip":
-        return "enterprise"
-    elif deal_size >= 50000 or customer_type == "premium":
-        return "premium"
-    return "standard"
-
-def calculate_adjusted_price(base_price: float, deal_context: Dict[str, Any]) -> float:
-    """Calculate adjusted price based on various factors."""
-    pricing_factors = Config.QUOTATION_SETTINGS["pricing_factors"]
-    
-    # Apply urgency multiplier
-    urgency = deal_context.get("urgency", "medium").lower()
-    urgency_multiplier = pricing_factors["urgency_multiplier"].get(urgency, 1.0)
-    
-    # Apply customer type discount
-    customer_type = deal_context.get("customer_type", "regular").lower()
-    customer_multiplier = pricing_factors["customer_type_discount"].get(customer_type, 1.0)
-    
-    # Calculate final price
-    adjusted_price = base_price * urgency_multiplier * customer_multiplier
-    return round(adjusted_price, 2)
-
 def quotation_tool(deal_context: Dict[str, Any]) -> Dict[str, Any]:
     """Enhanced quotation generation system with smart template selection and pricing."""
-    base_price = deal_context.get("base_price") or deal_context.get("deal_size") or 10000
-    template_key = select_quotation_template(deal_context)
-    template_config = Config.QUOTATION_SETTINGS["templates"][template_key]
-    
-    # Calculate adjusted price
-    final_price = calculate_adjusted_price(base_price, deal_context)
-    
-    # Generate quotation details
-    quotation_details = {
-        "template_name": template_config["name"],
-        "customer_type": deal_context.get("customer_type", "regular").capitalize(),
-        "base_price": base_price,
-        "final_price": final_price,
-        "terms": template_config["terms"],
-        "delivery": template_config["delivery"],
-        "validity": "30 days",
-        "special_notes": []
-    }
-    
-    # Add special notes based on context
-    if deal_context.get("urgency") == "high":
-        quotation_details["special_notes"].append("Expedited delivery available")
-    if deal_context.get("customer_type") == "vip":
-        quotation_details["special_notes"].append("Premium support included")
+    quotation_details = build_quotation(deal_context)
     
     summary = (
         f"### Quotation Details\n"
@@ -315,11 +438,22 @@ def quotation_tool(deal_context: Dict[str, Any]) -> Dict[str, Any]:
     if quotation_details["special_notes"]:
         summary += "\n**Special Notes:**\n" + "\n".join(f"- {note}" for note in quotation_details["special_notes"])
     
+    # Optionally render the quotation as documents, e.g. {"formats": ["html", "pdf"]} or {"formats": "pdf"}
+    source = []
+    formats = deal_context.get("formats")
+    if isinstance(formats, str):
+        formats = [formats]
+    if formats:
+        os.makedirs(Config.QUOTATION_DOCS["output_dir"], exist_ok=True)
+        documents = render_quotation_documents(deal_context, Config.QUOTATION_DOCS["output_dir"], formats)
+        source = list(documents["files"].values())
+        summary += f"\n\n**Documents:** {', '.join(source)}"
+    
     return {
         "summary": summary,
         "topic": "Quotation Generation",
         "tools_used": ["quotation"],
-        "source": []
+        "source": source
     }
 
 quotation = Tool(
@@ -327,14 +461,15 @@ quotation = Tool(
     func=quotation_tool,
     description=(
         "Advanced quotation generation system with smart template selection and dynamic pricing. "
-        "Input: a dictionary with keys: base_price (float), urgency (str), customer_type (str). "
+        "Input: a dictionary with keys: base_price (float), urgency (str), customer_type (str), "
+        "and optional customer (str) and formats ('html', 'pdf' or a list of both) to also render quotation documents. "
         "Returns detailed quotation with pricing analysis and special terms."
     )
 )
 
 def calculate_deal_risk(deal_status: Dict[str, Any]) -> Dict[str, Any]:
     """Calculate deal risk based on various factors."""
-    risk_factors = Config.RISK_FACTORS
+    risk_factors = get_snapshot().risk_factors
     risk_score = 0
     risk_reasons = []
     
@@ -367,6 +502,9 @@ def calculate_deal_risk(deal_status: Dict[str, Any]) -> Dict[str, Any]:
 
 def pipeline_manager_tool(deal_status: Dict[str, Any]) -> Dict[str, Any]:
     """Enhanced pipeline management with risk assessment and action recommendations."""
+    if isinstance(deal_status.get("filter"), dict):
+        return _scan_stored_deals(deal_status)
+    deal_status = _with_stored_record(deal_status, "deals", "deal_id")
     current_stage = deal_status.get("stage", "lead")
     risk_assessment = calculate_deal_risk(deal_status)
     
@@ -379,13 +517,17 @@ def pipeline_manager_tool(deal_status: Dict[str, Any]) -> Dict[str, Any]:
             "Consider escalation to senior sales"
         ])
     else:
-        stage_idx = Config.PIPELINE_STAGES.index(current_stage)
-        if stage_idx < len(Config.PIPELINE_STAGES) - 1:
-            next_stage = Config.PIPELINE_STAGES[stage_idx + 1]
+        next_stages = get_snapshot().next_stage
+        if current_stage not in next_stages:
+            raise ValueError(f"'{current_stage}' is not a pipeline stage")
+        next_stage = next_stages[current_stage]
+        if next_stage is not None:
             next_actions.append(f"Prepare for {next_stage.replace('_', ' ').title()} stage")
     
-    summary = (
-        f"### Pipeline Status Update\n"
+    summary = "### Pipeline Status Update\n"
+    if "deal_id" in deal_status:
+        summary += f"**Deal:** {deal_status.get('name', deal_status['deal_id'])} ({deal_status['deal_id']})\n"
+    summary += (
         f"**Current Stage:** {current_stage.replace('_', ' ').title()}\n"
         f"**Risk Score:** {risk_assessment['risk_score']}\n"
         f"**Status:** {'At Risk' if risk_assessment['is_at_risk'] else 'Healthy'}\n"
@@ -399,7 +541,17 @@ def pipeline_manager_tool(deal_status: Dict[str, Any]) -> Dict[str, Any]:
         "summary": summary,
         "topic": "Pipeline Analysis",
         "tools_used": ["pipeline_manager"],
-        "source": []
+        "source": _store_source("deals", deal_status["deal_id"]) if "deal_id" in deal_status else []
+    }
+
+def _scan_stored_deals(args: Dict[str, Any]) -> Dict[str, Any]:
+    """Risk-scan the stored deals matching args["filter"]."""
+    result = scan_pipeline(get_crm_store().iter_records("deals", args["filter"]), top_k=_store_limit(args))
+    return {
+        "summary": _pipeline_scan_summary(result),
+        "topic": "Pipeline Analysis",
+        "tools_used": ["pipeline_manager"],
+        "source": _store_source("deals")
     }
 
 pipeline_manager = Tool(
@@ -407,37 +559,118 @@ pipeline_manager = Tool(
     func=pipeline_manager_tool,
     description=(
         "Advanced pipeline management system with risk assessment and action planning. "
-        "Input: a dictionary with deal status information including stage, inactive_days, price_sensitivity, etc. "
+        "Input: a dictionary with deal status information including stage, inactive_days, price_sensitivity, etc.; "
+        "or deal_id (str) to assess a stored deal; or filter (dict, e.g. {'stage': 'negotiation', 'min_inactive_days': 14}) and limit (int) to scan stored deals. "
         "Returns comprehensive pipeline analysis with risk assessment and next steps."
     )
 )
 
-def analyze_deal_patterns(deals: List[Dict[str, Any]]) -> Dict[str, Any]:
+def pipeline_scanner_tool(args: Any) -> Dict[str, Any]:
+    """Bulk risk scan over an entire deal book with top at-risk deals and per-stage totals."""
+    if isinstance(args, str):
+        args = json.loads(args) if args.strip().startswith(("{", "[")) else {"source": args.strip()}
+    if isinstance(args, list):
+        args = {"source": args}
+    source = args.get("source") or args.get("deals")
+    if not source:
+        return {
+            "summary": "Please provide a deal file (CSV or JSONL) or a list of deals to scan.",
+            "topic": "Pipeline Risk Scan",
+            "tools_used": ["pipeline_scanner"],
+            "source": []
+        }
+    result = scan_pipeline(source, top_k=int(args.get("top_k", 10)))
+    return {
+        "summary": _pipeline_scan_summary(result),
+        "topic": "Pipeline Risk Scan",
+        "tools_used": ["pipeline_scanner"],
+        "source": [source] if isinstance(source, str) else []
+    }
+
+def _pipeline_scan_summary(result: Dict[str, Any]) -> str:
+    summary = (
+        f"### Pipeline Risk Scan\n"
+        f"**Deals Scanned:** {result['deals_scanned']:,}\n"
+        f"**At Risk:** {result['at_risk']:,}\n"
+    )
+    if result["top_at_risk"]:
+        summary += "\n**Top At-Risk Deals:**\n" + "\n".join(
+            f"- {deal.get('name') or deal.get('deal_id', 'Unnamed deal')} "
+            f"({deal.get('stage', 'lead').replace('_', ' ').title()}, ${deal.get('value', 0):,}): "
+            f"risk {deal['risk_score']} - {'; '.join(deal['risk_reasons'])}"
+            for deal in result["top_at_risk"]
+        ) + "\n"
+    summary += "\n**By Stage:**\n" + "\n".join(
+        f"- {stage.replace('_', ' ').title()}: {totals['deals']:,} deals, {totals['at_risk']:,} at risk, "
+        f"avg risk {totals['avg_risk_score']}"
+        for stage, totals in result["stages"].items() if totals["deals"]
+    )
+    return summary
+
+pipeline_scanner = Tool(
+    name="pipeline_scanner",
+    func=pipeline_scanner_tool,
+    description=(
+        "Bulk pipeline risk scanner for the whole deal book. "
+        "Input: a path to a CSV/JSONL deal file, or a dictionary with keys: source (file path or list of deal dicts), top_k (int). "
+        "Returns the most at-risk deals and per-stage risk totals."
+    )
+)
+
+def analyze_deal_patterns(deals: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
     """Analyze patterns in successful and lost deals."""
-    win_patterns = Config.SALES_COACHING["win_patterns"]
-    quick_wins = []
-    high_value_wins = []
+    win_patterns = get_snapshot().win_patterns
+    quick_wins = 0
+    high_value_wins = 0
     
     for deal in deals:
         if deal.get("status") == "won":
             # Analyze quick wins
             if deal.get("days_to_close", float("inf")) <= win_patterns["quick_close"]["days_to_close"]:
-                quick_wins.append(deal)
+                quick_wins += 1
             
             # Analyze high value wins
             if deal.get("value", 0) >= win_patterns["high_value"]["deal_size_threshold"]:
-                high_value_wins.append(deal)
+                high_value_wins += 1
     
     return {
-        "quick_wins": len(quick_wins),
-        "high_value_wins": len(high_value_wins),
+        "quick_wins": quick_wins,
+        "high_value_wins": high_value_wins,
         "quick_win_factors": win_patterns["quick_close"]["key_factors"],
         "high_value_factors": win_patterns["high_value"]["key_factors"]
     }
 
 def sales_coach_tool(input_data: Any) -> Dict[str, Any]:
     """Enhanced sales coaching system with pattern analysis and targeted recommendations."""
-    coaching_rules = Config.SALES_COACHING
+    coaching_rules = get_snapshot().sales_coaching
+    
+    if isinstance(input_data, dict) and input_data.get("deal_id") is not None:
+        # Coach on why this stored deal was lost
+        deal = _with_stored_record(input_data, "deals", "deal_id")
+        result = sales_coach_tool(str(deal.get("lost_reason", "")))
+        result["source"] = _store_source("deals", deal["deal_id"])
+        return result
+    
+    if isinstance(input_data, dict) and (input_data.get("history") or input_data.get("window_days") is not None):
+        # Running totals over every closed deal, so no scan however long the history
+        window_days = input_data.get("window_days")
+        view = get_sales_analytics().view(int(window_days) if window_days is not None else None)
+        return {
+            "summary": _history_summary(view),
+            "topic": "Sales Coaching",
+            "tools_used": ["sales_coach"],
+            "source": _store_source("deals")
+        }
+    
+    if isinstance(input_data, dict) and isinstance(input_data.get("filter"), dict):
+        # Only won deals contribute to the patterns, so let the status index narrow the scan
+        deals = get_crm_store().iter_records("deals", {"status": "won", **input_data["filter"]})
+        return {
+            "summary": _pattern_summary(analyze_deal_patterns(deals)),
+            "topic": "Sales Coaching",
+            "tools_used": ["sales_coach"],
+            "source": _store_source("deals")
+        }
     
     if isinstance(input_data, str):
         # Process single deal feedback
@@ -463,23 +696,8 @@ def sales_coach_tool(input_data: Any) -> Dict[str, Any]:
     if isinstance(input_data, list) and input_data:
         # Analyze deal patterns
         patterns = analyze_deal_patterns(input_data)
-        
-        summary = "### Sales Pattern Analysis\n"
-        if patterns["quick_wins"] > 0:
-            summary += (
-                f"\n**Quick Win Patterns** ({patterns['quick_wins']} deals):\n"
-                "Key Success Factors:\n"
-                + "\n".join(f"- {factor.replace('_', ' ').title()}" for factor in patterns["quick_win_factors"])
-            )
-        
-        if patterns["high_value_wins"] > 0:
-            summary += (
-                f"\n**High Value Win Patterns** ({patterns['high_value_wins']} deals):\n"
-                "Key Success Factors:\n"
-                + "\n".join(f"- {factor.replace('_', ' ').title()}" for factor in patterns["high_value_factors"])
-            )
         return {
-            "summary": summary,
+            "summary": _pattern_summary(patterns),
             "topic": "Sales Coaching",
             "tools_used": ["sales_coach"],
             "source": []
@@ -492,12 +710,72 @@ def sales_coach_tool(input_data: Any) -> Dict[str, Any]:
         "source": []
     }
 
+def _pattern_summary(patterns: Dict[str, Any]) -> str:
+    return "### Sales Pattern Analysis\n" + _win_pattern_sections(patterns)
+
+def _win_pattern_sections(patterns: Dict[str, Any]) -> str:
+    summary = ""
+    if patterns["quick_wins"] > 0:
+        summary += (
+            f"\n**Quick Win Patterns** ({patterns['quick_wins']} deals):\n"
+            "Key Success Factors:\n"
+            + "\n".join(f"- {factor.replace('_', ' ').title()}" for factor in patterns["quick_win_factors"])
+        )
+    
+    if patterns["high_value_wins"] > 0:
+        summary += (
+            f"\n**High Value Win Patterns** ({patterns['high_value_wins']} deals):\n"
+            "Key Success Factors:\n"
+            + "\n".join(f"- {factor.replace('_', ' ').title()}" for factor in patterns["high_value_factors"])
+        )
+    return summary
+
+def _history_summary(view: Dict[str, Any]) -> str:
+    win_patterns = get_snapshot().win_patterns
+    title = f"Sales Pattern Analysis (Last {view['window_days']} Days)" if view["window_days"] else "Sales Pattern Analysis (All Time)"
+    note = ""
+    if view["window_days"] and view["undated"]:
+        note = f"\n\n_Note: {view['undated']:,} closed deals have no close date, so they are only in the all-time figures._"
+    if not view["closed"]:
+        return f"### {title}\nNo closed deals recorded yet." + note
+    summary = (
+        f"### {title}\n"
+        f"**Closed Deals:** {view['closed']:,} ({view['won']:,} won, {view['lost']:,} lost, {view['win_rate']:.0%} win rate)\n"
+        "\n**Win Rate by Stage:**\n"
+        + "\n".join(
+            f"- {stage.replace('_', ' ').title()}: {rates['win_rate']:.0%} ({rates['won']:,}/{rates['won'] + rates['lost']:,})"
+            for stage, rates in view["stage_win_rates"].items()
+        )
+    )
+    if view["won"]:
+        summary += "\n\n**Days to Close (won deals):**\n" + "\n".join(
+            f"- {label}: {count:,}" for label, count in view["days_to_close"].items() if count
+        )
+        summary += "\n\n**Won Deal Value:** " + ", ".join(
+            f"{name} ${value:,.0f}" for name, value in view["value_quantiles"].items() if value is not None
+        )
+    if view["lost_reasons"]:
+        reason, count = next(iter(view["lost_reasons"].items()))
+        summary += f"\n\n**Top Lost Reason:** {reason.capitalize()} ({count:,} deals)"
+    patterns = {
+        "quick_wins": view["quick_wins"],
+        "high_value_wins": view["high_value_wins"],
+        "quick_win_factors": win_patterns["quick_close"]["key_factors"],
+        "high_value_factors": win_patterns["high_value"]["key_factors"]
+    }
+    return summary + "\n" + _win_pattern_sections(patterns) + note
+
 sales_coach = Tool(
     name="sales_coach",
     func=sales_coach_tool,
     description=(
         "Advanced sales coaching system with pattern analysis and targeted recommendations. "
-        "Input: either a string describing a specific situation or a list of deal dictionaries for pattern analysis. "
+        "Input: either a string describing a specific situation or a list of deal dictionaries for pattern analysis; "
+        "or a dictionary with deal_id (str) to coach on a stored lost deal, filter (dict) to analyze stored deals, "
+        "or window_days (int, e.g. 30 or 90; or history: true for all time) for win rates and patterns over closed deals. "
         "Returns actionable coaching insights and recommendations."
     )
-)
\ No newline at end of file
+)
+
+# Every tool the agent can call, in the order they are offered to the model
+TOOLS = [search_tool, wiki_tool, save_tool, lead_qualifier, followup, quotation, pipeline_manager, pipeline_scanner, sales_coach]
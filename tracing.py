@@ -0,0 +1,339 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from config import Config
+
+# Read on every instrumented call; when False each hook returns after a single check
+_enabled: bool = Config.TRACING["enabled"]
+
+def enabled() -> bool:
+    return _enabled
+
+def set_enabled(value: bool) -> None:
+    global _enabled
+    _enabled = value
+
+# --- Metrics ---
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f"{self.name}{_format_labels(key)} {value:g}" for key, value in values)
+        return lines
+
+class Gauge:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f"{self.name}{_format_labels(key)} {value:g}" for key, value in values)
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float]):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = sorted(buckets)
+        self._series: Dict[LabelKey, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts, then +Inf count, then sum
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        for key, values in series:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {cumulative:g}")
+            total = cumulative + values[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {total:g}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {values[-1]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {total:g}")
+        return lines
+
+_buckets = Config.TRACING["latency_buckets"]
+
+REQUESTS = Counter("crm_requests_total", "Requests handled, by route.")
+REQUEST_SECONDS = Histogram("crm_request_duration_seconds", "End-to-end request latency, by route.", _buckets)
+SPAN_SECONDS = Histogram("crm_span_duration_seconds", "Latency of instrumented operations, by kind and name.", _buckets)
+SPAN_ERRORS = Counter("crm_span_errors_total", "Instrumented operations that raised, by kind and name.")
+LLM_TOKENS = Counter("crm_llm_tokens_total", "LLM tokens reported by the model, by direction.")
+CACHE_EVENTS = Counter("crm_cache_events_total", "Cache lookups, by cache and outcome.")
+TOOL_SELECTIONS = Counter("crm_tool_selections_total", "Model calls by tool selection outcome (subset or fallback to all tools).")
+TOOL_TOKENS_SAVED = Counter("crm_tool_schema_tokens_saved_total", "Estimated prompt tokens saved by binding only the selected tools.")
+LLM_QUEUE_DEPTH = Gauge("crm_llm_queue_depth", "Model calls waiting for admission, by lane.")
+LLM_IN_FLIGHT = Gauge("crm_llm_in_flight", "Model calls currently admitted.")
+LLM_CONCURRENCY_LIMIT = Gauge("crm_llm_concurrency_limit", "Current adaptive limit on concurrent model calls.")
+LLM_RATE_LIMITED = Counter("crm_llm_rate_limited_total", "Model calls rejected with a quota error (429), by lane.")
+
+METRICS = [
+    REQUESTS, REQUEST_SECONDS, SPAN_SECONDS, SPAN_ERRORS, LLM_TOKENS, CACHE_EVENTS, TOOL_SELECTIONS, TOOL_TOKENS_SAVED,
+    LLM_QUEUE_DEPTH, LLM_IN_FLIGHT, LLM_CONCURRENCY_LIMIT, LLM_RATE_LIMITED
+]
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines: List[str] = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# --- Request Traces ---
+
+class Trace:
+    """Spans and cache outcomes recorded while serving one request."""
+
+    __slots__ = ("start", "spans", "cache", "tokens", "tools", "_lock")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.cache: Dict[str, str] = {}
+        self.tokens = {"input": 0, "output": 0}
+        self.tools: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    def add_span(self, kind: str, name: str, start: float, duration: float, **attrs: Any) -> None:
+        span = {"kind": kind, "name": name, "start_ms": round((start - self.start) * 1000, 3), "duration_ms": round(duration * 1000, 3)}
+        span.update(attrs)
+        with self._lock:
+            self.spans.append(span)
+
+    def breakdown(self) -> Dict[str, Any]:
+        """Per-request timing summary for the JSON response."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["start_ms"])
+        by_kind: Dict[str, float] = {}
+        for span in spans:
+            by_kind[span["kind"]] = round(by_kind.get(span["kind"], 0.0) + span["duration_ms"], 3)
+        return {
+            "total_ms": round((time.perf_counter() - self.start) * 1000, 3),
+            "by_kind": by_kind,
+            "spans": spans,
+            "cache": dict(self.cache),
+            "tokens": dict(self.tokens),
+            "tools": self.tools
+        }
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("crm_trace", default=None)
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+class RequestTrace:
+    """Handle yielded by trace_request; `route` labels the request metrics."""
+
+    __slots__ = ("trace", "route")
+
+    def __init__(self, trace: Optional[Trace]):
+        self.trace = trace
+        # Overwritten by the handler once the request is answered
+        self.route = "error"
+
+    def timings(self) -> Optional[Dict[str, Any]]:
+        return self.trace.breakdown() if self.trace is not None else None
+
+@contextmanager
+def trace_request() -> Iterator[RequestTrace]:
+    """Collect spans for the current request and record request metrics on exit."""
+    if not _enabled:
+        yield RequestTrace(None)
+        return
+    trace = Trace()
+    handle = RequestTrace(trace)
+    token = _current_trace.set(trace)
+    try:
+        yield handle
+    finally:
+        _current_trace.reset(token)
+        REQUESTS.inc(route=handle.route)
+        REQUEST_SECONDS.observe(time.perf_counter() - trace.start, route=handle.route)
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc: Any) -> bool:
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+class _Span:
+    __slots__ = ("kind", "name", "start")
+
+    def __init__(self, kind: str, name: str):
+        self.kind = kind
+        self.name = name
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> bool:
+        _record_span(self.kind, self.name, self.start, time.perf_counter() - self.start, error=exc_type is not None)
+        return False
+
+def _record_span(kind: str, name: str, start: float, duration: float, error: bool = False, **attrs: Any) -> None:
+    SPAN_SECONDS.observe(duration, kind=kind, name=name)
+    if error:
+        SPAN_ERRORS.inc(kind=kind, name=name)
+        attrs["error"] = True
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(kind, name, start, duration, **attrs)
+
+def span(kind: str, name: str = "") -> Any:
+    """Time a block as a span, e.g. `with span("parse", "agent_output"): ...`. A shared no-op when disabled."""
+    if not _enabled:
+        return _NOOP_SPAN
+    return _Span(kind, name or kind)
+
+def record_cache_event(cache: str, outcome: str) -> None:
+    if not _enabled:
+        return
+    CACHE_EVENTS.inc(cache=cache, outcome=outcome)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.cache[cache] = outcome
+
+def record_tool_selection(tools: List[str], fallback: bool, tokens_saved: int) -> None:
+    """Count one model call's tool selection; the request's trace accumulates the tokens saved."""
+    if not _enabled:
+        return
+    TOOL_SELECTIONS.inc(outcome="fallback" if fallback else "subset")
+    TOOL_TOKENS_SAVED.inc(tokens_saved)
+    trace = _current_trace.get()
+    if trace is not None:
+        with trace._lock:
+            if trace.tools is None:
+                trace.tools = {"bound": tools, "fallback": fallback, "model_calls": 0, "tokens_saved": 0}
+            trace.tools["model_calls"] += 1
+            trace.tools["tokens_saved"] += tokens_saved
+
+# --- Instrumentation Hooks ---
+
+def instrument_tool(tool: Any) -> Any:
+    """Wrap a LangChain Tool's func in a "tool" span. Idempotent."""
+    func = tool.func
+    if func is None or getattr(func, "__wrapped__", None) is not None:
+        return tool
+    name = tool.name
+
+    @wraps(func)
+    def traced(*args: Any, **kwargs: Any) -> Any:
+        if not _enabled:
+            return func(*args, **kwargs)
+        with _Span("tool", name):
+            return func(*args, **kwargs)
+
+    tool.func = traced
+    return tool
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Records an "llm" span with token usage for every model call of an agent run."""
+
+    def __init__(self, trace: Optional[Trace]):
+        self.trace = trace
+        self._starts: Dict[UUID, float] = {}
+
+    def on_chat_model_start(self, serialized: Any, messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized: Any, prompts: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._starts[run_id] = time.perf_counter()
+
+    def _finish(self, run_id: UUID, error: bool, tokens: Optional[Dict[str, int]] = None) -> None:
+        start = self._starts.pop(run_id, None)
+        if start is None:
+            return
+        duration = time.perf_counter() - start
+        attrs: Dict[str, Any] = {}
+        if tokens:
+            attrs["tokens"] = tokens
+            for direction, count in tokens.items():
+                LLM_TOKENS.inc(count, direction=direction)
+                if self.trace is not None:
+                    self.trace.tokens[direction] += count
+        SPAN_SECONDS.observe(duration, kind="llm", name="chat_model")
+        if error:
+            SPAN_ERRORS.inc(kind="llm", name="chat_model")
+            attrs["error"] = True
+        if self.trace is not None:
+            self.trace.add_span("llm", "chat_model", start, duration, **attrs)
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        tokens = {"input": 0, "output": 0}
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    tokens["input"] += usage.get("input_tokens", 0)
+                    tokens["output"] += usage.get("output_tokens", 0)
+        self._finish(run_id, error=False, tokens=tokens if any(tokens.values()) else None)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, error=True)
+
+def run_config() -> Dict[str, Any]:
+    """RunnableConfig for AgentExecutor.invoke/ainvoke/astream; empty when tracing is disabled."""
+    if not _enabled:
+        return {}
+    return {"callbacks": [TracingCallbackHandler(_current_trace.get())]}